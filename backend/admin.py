@@ -1,182 +1,131 @@
-from flask import Blueprint, jsonify, render_template, request, session, redirect, url_for
-import mysql.connector
-import os
+from flask import Blueprint, Response, current_app, jsonify, render_template, request, session, redirect, url_for, stream_with_context
 import datetime
+import logging
+import json
 import uuid
+import threading
 from functools import wraps
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from breaker import CircuitOpenError
+from outbox import wake_worker, queue_stats
+from mailer import get_mailer, from_address, TRANSPORT_SMTP
+from pagination import parse_page_args, parse_date, parse_end_date, PaginationError
+from export import EXPORT_RESOURCES, stream_ndjson, stream_csv
+from stats import stats_cache
+from retention import purge_expired, recent_runs
+from storage import ARCHIVE_COLUMNS, get_storage
+from replicas import needs_primary, READ_CONSISTENCY_HEADER, READ_YOUR_WRITES_COOKIE
+from search import search, SEARCH_RESOURCES, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from conditional import etagged, compress_response
+from changes import current_cursor, table_version, decode_cursor, changes_since, stream_changes, notify_commit, ChangesCursorError
+from changes import DASHBOARD_LIVE_UPDATES, CHANGES_POLL_INTERVAL
 
 load_dotenv()
 
-admin_bp = Blueprint('admin', __name__)
+log = logging.getLogger(__name__)
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST'),
-        user=os.getenv('MYSQL_USER'),
-        password=os.getenv('MYSQL_PASSWORD'),
-        database=os.getenv('MYSQL_DB'),
-        autocommit=False
-    )
+admin_bp = Blueprint('admin', __name__)
+admin_bp.after_request(compress_response)
 
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()  # Use a regular cursor, not a dictionary cursor
-
-    # Create tables with MySQL-compatible schema
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS enquiries (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(255),
-        email VARCHAR(255),
-        message TEXT,
-        ticket_no VARCHAR(50) UNIQUE,
-        expires_at DATETIME,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS quotations (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        ticket_no VARCHAR(50) UNIQUE,
-        company VARCHAR(255),
-        name VARCHAR(255),
-        email VARCHAR(255),
-        phone VARCHAR(50),
-        product VARCHAR(255),
-        quantity VARCHAR(50),
-        delivery VARCHAR(255),
-        message TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        expires_at DATETIME
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS loi_submissions (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        company_name VARCHAR(255),
-        rep_name VARCHAR(255),
-        email VARCHAR(255),
-        phone VARCHAR(50),
-        product VARCHAR(255),
-        quantity VARCHAR(50),
-        submission_date DATETIME,
-        loi_data TEXT
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS admin_users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        username VARCHAR(255) UNIQUE NOT NULL,
-        password VARCHAR(255) NOT NULL
-    )
-    ''')
-    
-    cursor.execute("SELECT COUNT(*) FROM admin_users")
-    if cursor.fetchone()[0] == 0:  # This now works with a regular cursor
-        cursor.execute("INSERT INTO admin_users (username, password) VALUES (%s, %s)", 
-                      ("admin", "password123"))
-    
-    conn.commit()
-    conn.close()
+    # Migrations (MySQL) or the embedded schema (SQLite), plus the first admin user
+    get_storage().initialize()
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+def ensure_schema():
+    """Run init_db() once per process; later calls cost nothing"""
+    global _schema_checked
+    if _schema_checked:
+        return
+    with _schema_lock:
+        if not _schema_checked:
+            init_db()
+            _schema_checked = True
+
+def generate_ticket_no(prefix):
+    """Mint a ticket number such as QUOTE-20250501-AB123"""
+    date_prefix = datetime.datetime.now().strftime('%Y%m%d')
+    return f"{prefix}-{date_prefix}-{str(uuid.uuid4())[:5].upper()}"
+
+# How long submissions are kept before the retention job purges them
+ENQUIRY_TTL = datetime.timedelta(days=30)
+QUOTATION_TTL = datetime.timedelta(days=7)
+
+def after_commit(resource, products=(None,), notification=None):
+    """Side effects of committed inserts: wake the mailer, count them, tell live dashboards"""
+    if notification:
+        wake_worker()
+    for product in products:
+        stats_cache.bump(resource, product)
+    notify_commit()
+
+def enquiry_row(name, email, message, ticket_no=None):
+    return {'name': name, 'email': email, 'message': message,
+            'ticket_no': ticket_no or generate_ticket_no('ENQ'),
+            'expires_at': datetime.datetime.now() + ENQUIRY_TTL}
+
+def quotation_row(company, name, email, phone, product, quantity, delivery, message, ticket_no=None):
+    return {'ticket_no': ticket_no or generate_ticket_no('QUOTE'), 'company': company, 'name': name,
+            'email': email, 'phone': phone, 'product': product, 'quantity': quantity,
+            'delivery': delivery, 'message': message,
+            'expires_at': datetime.datetime.now() + QUOTATION_TTL}
+
+def loi_row(company_name, rep_name, email, phone, product, quantity, loi_data):
+    return {'company_name': company_name, 'rep_name': rep_name, 'email': email, 'phone': phone,
+            'product': product, 'quantity': quantity, 'submission_date': datetime.datetime.now(),
+            'loi_data': json.dumps(loi_data, default=str)}
+
+def record_rows(table, rows, products, notification=None):
+    """Insert submission rows, then run the after-commit side effects
 
-def record_enquiry(name, email, message):
-    """Record a contact form enquiry"""
+    `notification` holds enqueue_email() arguments; the email is queued in
+    the same transaction as the rows so neither is committed alone.
+    """
+    get_storage().insert(table, rows, notification)
+    after_commit(table, products, notification)
+
+def record_enquiries_batch(enquiries, notification=None):
+    """Insert several enquiries (each with a pre-allocated `ticket_no`) in one transaction
+
+    CircuitOpenError propagates, so the caller can answer 503 rather than 500.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        date_prefix = datetime.datetime.now().strftime('%Y%m%d')
-        ticket_no = f"ENQ-{date_prefix}-{str(uuid.uuid4())[:5].upper()}"
-        expires_at = datetime.datetime.now() + datetime.timedelta(days=30)
-        
-        cursor.execute(
-            """INSERT INTO enquiries 
-            (name, email, message, ticket_no, expires_at)
-            VALUES (%s, %s, %s, %s, %s)""",
-            (name, email, message, ticket_no, expires_at)
-        )
-        
-        conn.commit()
+        rows = [enquiry_row(e['name'], e['email'], e['message'], e['ticket_no']) for e in enquiries]
+        record_rows('enquiries', rows, [None] * len(rows), notification)
         return True
-    except Exception as e:
-        print(f"Error recording enquiry: {str(e)}")
+    except CircuitOpenError:
+        raise
+    except Exception:
+        log.exception("Error recording enquiry batch")
         return False
-    finally:
-        if conn.is_connected():
-            conn.close()
 
-def record_loi_submission(company_name, rep_name, email, phone, product, quantity, loi_data):
-    """Record an LOI submission"""
+def record_quotations_batch(quotations, notification=None):
+    """Insert several quote requests (each with a pre-allocated `ticket_no`) in one transaction
+
+    CircuitOpenError propagates, as for record_enquiries_batch.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO loi_submissions 
-            (company_name, rep_name, email, phone, product, quantity, submission_date, loi_data)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (company_name, rep_name, email, phone, product, quantity, 
-             datetime.datetime.now(), str(loi_data)))
-        
-        conn.commit()
+        rows = [quotation_row(q['company'], q['name'], q['email'], q['phone'], q['product'],
+                              q['quantity'], q['delivery'], q['message'], q['ticket_no']) for q in quotations]
+        record_rows('quotations', rows, [row['product'] for row in rows], notification)
         return True
-    except Exception as e:
-        print(f"Error recording LOI submission: {str(e)}")
+    except CircuitOpenError:
+        raise
+    except Exception:
+        log.exception("Error recording quotation batch")
         return False
-    finally:
-        if conn.is_connected():
-            conn.close()
-
-def record_quotation(company, name, email, phone, product, quantity, delivery, message):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        date_prefix = datetime.datetime.now().strftime('%Y%m%d')
-        ticket_no = f"QUOTE-{date_prefix}-{str(uuid.uuid4())[:5].upper()}"
-        expires_at = datetime.datetime.now() + datetime.timedelta(days=7)
-        
-        cursor.execute(
-            """INSERT INTO quotations 
-            (ticket_no, company, name, email, phone, product, quantity, delivery, message, expires_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (ticket_no, company, name, email, phone, product, quantity, delivery, message, expires_at)
-        )
-        
-        conn.commit()
-        return ticket_no
-    except Exception as e:
-        print(f"Error recording quotation: {str(e)}")
-        return None
-    finally:
-        if conn.is_connected():
-            conn.close()
 
 # Function to clean up expired quotations
 def cleanup_expired_quotations():
-    """Remove quotations that have expired"""
+    """Remove quotations that have expired (the retention job does this on a schedule)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        now = datetime.datetime.now()
-        # Changed ? to %s for MySQL compatibility
-        cursor.execute("DELETE FROM quotations WHERE expires_at < %s", (now,))
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
-        
-        return deleted_count
-    except Exception as e:
-        print(f"Error cleaning up expired quotations: {str(e)}")
+        return purge_expired('quotations')
+    except Exception:
+        log.exception("Error cleaning up expired quotations")
         return 0
 
 # Login required decorator
@@ -188,6 +137,17 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def replica_reads(f):
+    """Serve a read-only route from a replica, unless the client needs its own recent writes"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if needs_primary(request.headers.get(READ_CONSISTENCY_HEADER), request.cookies.get(READ_YOUR_WRITES_COOKIE)):
+            return f(*args, **kwargs)
+        # Chosen here, outside @etagged, so the ETag and the body come from the same copy
+        with get_storage().replicas.reading():
+            return f(*args, **kwargs)
+    return decorated_function
+
 # Admin routes
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -196,16 +156,7 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Use %s placeholders for MySQL instead of ? (which is for SQLite)
-        cursor.execute("SELECT * FROM admin_users WHERE username = %s AND password = %s", 
-                      (username, password))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user:
+        if get_storage().check_login(username, password):
             session['admin_logged_in'] = True
             session['admin_username'] = username
             return redirect(url_for('admin.dashboard'))
@@ -223,114 +174,176 @@ def logout():
 @admin_bp.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('admin_dashboard.html')
+    return render_template('admin_dashboard.html', live_updates=DASHBOARD_LIVE_UPDATES,
+                           poll_interval=CHANGES_POLL_INTERVAL)
 
 @admin_bp.route('/api/stats')
 @login_required
+@etagged()
 def get_stats():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get total enquiries
-    cursor.execute("SELECT COUNT(*) FROM enquiries")
-    total_enquiries = cursor.fetchone()[0]
-    
-    # Get total quotations
-    cursor.execute("SELECT COUNT(*) FROM quotations")
-    total_quotations = cursor.fetchone()[0]
-    
-    # Get total LOI submissions
-    cursor.execute("SELECT COUNT(*) FROM loi_submissions")
-    total_lois = cursor.fetchone()[0]
-    
-    conn.close()
+    # Served from an in-process snapshot that refreshes itself in the
+    # background; every table is scanned once per refresh, not per request.
+    stats = stats_cache.get()
     
     return jsonify({
-        'total_enquiries': total_enquiries,
-        'total_quotations': total_quotations,
-        'total_lois': total_lois
+        'total_enquiries': stats['enquiries']['total'],
+        'total_quotations': stats['quotations']['total'],
+        'total_lois': stats['loi_submissions']['total'],
+        'enquiries': stats['enquiries'],
+        'quotations': stats['quotations'],
+        'loi_submissions': stats['loi_submissions']
     })
 
+@admin_bp.route('/api/pool-stats')
+@login_required
+def get_pool_stats():
+    storage = get_storage()
+    return jsonify(dict(storage.pool_stats(), replicas=storage.replicas.snapshot()))
+
+@admin_bp.route('/api/retention-runs')
+@login_required
+def get_retention_runs():
+    try:
+        return jsonify(recent_runs()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/api/outbox')
+@login_required
+def get_outbox_stats():
+    try:
+        return jsonify(queue_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Query parameters that filter on the indexed generated columns
+LOI_FILTERS = ('bank_swift_code', 'delivery_port', 'payment_terms')
+# Query parameters that filter archived rows, where the table has the column
+ARCHIVE_FILTERS = ('email', 'ticket_no')
+
 # Add new route for LOI submissions
 @admin_bp.route('/api/loi-submissions')
 @login_required
+@replica_reads
+@etagged(lambda: table_version('loi_submissions'))
 def get_loi_submissions():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)  # Use dictionary cursor here
-    
-    cursor.execute("SELECT * FROM loi_submissions ORDER BY submission_date DESC LIMIT 50")
-    submissions = cursor.fetchall()  # Already returns dictionaries
-    
-    conn.close()
-    
-    return jsonify(submissions)
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    filters = {name: request.args[name] for name in LOI_FILTERS if request.args.get(name)}
+
+    try:
+        # Each row arrives already rendered as JSON by the database, with
+        # loi_data embedded as-is, so Python never parses the payloads
+        submissions = get_storage().loi_page(page, filters)
+        body = '{"items": [%s], "next_cursor": %s}' % (
+            ', '.join(submissions['items']),
+            json.dumps(submissions['next_cursor'])
+        )
+        return Response(body, mimetype='application/json'), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 # Routes to view detailed data
 @admin_bp.route('/api/enquiries', methods=['GET'])
 @login_required  # Added login_required decorator
+@replica_reads
+@etagged(lambda: table_version('enquiries'))
 def get_enquiries():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)  # Use dictionary cursor
-        
-        cursor.execute("SELECT * FROM enquiries ORDER BY timestamp DESC")
-        enquiries = cursor.fetchall()
-        
-        conn.close()
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        enquiries = get_storage().list_page('enquiries', 'timestamp', page)
         return jsonify(enquiries), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @admin_bp.route('/api/quotations', methods=['GET'])
 @login_required  # Added login_required decorator
+@replica_reads
+@etagged(lambda: table_version('quotations'))
 def get_quotations():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)  # Use dictionary cursor
-        
-        # Clean up expired quotations first
-        cleanup_expired_quotations()
-        
-        # Fetch all quotations
-        cursor.execute("SELECT * FROM quotations ORDER BY timestamp DESC")
-        quotations = cursor.fetchall()
-        
-        conn.close()
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Fetch one page of quotations, newest first
+        quotations = get_storage().list_page('quotations', 'timestamp', page)
         return jsonify(quotations), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Rows the retention job has moved out of the hot tables
+@admin_bp.route('/api/archive/<resource>', methods=['GET'])
+@login_required
+@replica_reads
+def get_archive(resource):
+    if resource not in ARCHIVE_COLUMNS:
+        return jsonify({"error": f"Unknown resource: {resource}"}), 404
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    filters = {name: request.args[name] for name in ARCHIVE_FILTERS
+               if request.args.get(name) and name in ARCHIVE_COLUMNS[resource]}
+
+    try:
+        return jsonify(get_storage().archive_page(resource, page, filters)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Bulk export, streamed row by row so memory stays flat for any table size
+@admin_bp.route('/api/export/<resource>', methods=['GET'])
+@login_required
+def export_data(resource):
+    if resource != 'all' and resource not in EXPORT_RESOURCES:
+        return jsonify({"error": f"Unknown resource: {resource}"}), 404
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+    if export_format == 'csv' and resource == 'all':
+        return jsonify({"error": "CSV export needs a single resource"}), 400
+
+    try:
+        date_from = parse_date(request.args['from'], 'from') if request.args.get('from') else None
+        date_to = parse_end_date(request.args['to'], 'to') if request.args.get('to') else None
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"{resource}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if export_format == 'csv':
+        return Response(stream_csv(resource, date_from, date_to),
+                        mimetype='text/csv', headers=headers)
+
+    resources = list(EXPORT_RESOURCES) if resource == 'all' else [resource]
+    return Response(stream_ndjson(resources, date_from, date_to),
+                    mimetype='application/x-ndjson', headers=headers)
+
 # This route is duplicated, keeping it for backward compatibility
 @admin_bp.route('/api/quotations')
 @login_required
+@replica_reads
 def get_quotations_admin():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)  # Use dictionary cursor
-    
-    # Clean up expired quotations first
-    cleanup_expired_quotations()
-    
     # Get active quotations
-    cursor.execute("SELECT * FROM quotations ORDER BY timestamp DESC LIMIT 50")
-    quotations = cursor.fetchall()
-    
-    conn.close()
+    quotations = get_storage().recent_quotations(50)
     
     return jsonify(quotations)
 
 # Keep the existing route for backward compatibility but mark it as deprecated
 @admin_bp.route('/api/quotations/search/<int:ticket_no>', methods=['GET'])
 @login_required
+@replica_reads
 def search_quotation_by_id(ticket_no):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Changed ? to %s for MySQL compatibility
-        cursor.execute("SELECT * FROM quotations WHERE id = %s", (ticket_no,))
-        quotation = cursor.fetchone()
-        
-        conn.close()
+        quotation = get_storage().find_quotation('id', ticket_no)
         
         if quotation:
             return jsonify(quotation), 200
@@ -342,16 +355,11 @@ def search_quotation_by_id(ticket_no):
 # Add new route to search by ticket number
 @admin_bp.route('/api/quotations/search/ticket/<ticket_no>', methods=['GET'])
 @login_required
+@replica_reads
 def search_quotation(ticket_no):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Search by ticket_no field
-        cursor.execute("SELECT * FROM quotations WHERE ticket_no = %s", (ticket_no,))
-        quotation = cursor.fetchone()
-        
-        conn.close()
+        quotation = get_storage().find_quotation('ticket_no', ticket_no)
         
         if quotation:
             return jsonify(quotation), 200
@@ -360,33 +368,84 @@ def search_quotation(ticket_no):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Incremental feed for the dashboard: only rows inserted or deleted since a cursor
+@admin_bp.route('/api/changes', methods=['GET'])
+@login_required
+def get_changes():
+    since = request.args.get('since')
+    try:
+        if not since:
+            # First call: nothing to diff yet, just hand out a starting point
+            return jsonify({"cursor": current_cursor(), "inserted": {}, "deleted": [], "has_more": False}), 200
+        return jsonify(changes_since(since)), 200
+    except ChangesCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# The same feed pushed as server-sent events
+@admin_bp.route('/api/changes/stream', methods=['GET'])
+@login_required
+def stream_changes_route():
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = since or current_cursor()
+        decode_cursor(since)  # reject a bad cursor before committing to a stream
+    except ChangesCursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    dumps = current_app.json.dumps
+    response = Response(stream_with_context(stream_changes(since, dumps)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let proxies pass events through immediately
+    return response
+
+# Unified search: ticket prefix, company, name, email and product
+@admin_bp.route('/api/search', methods=['GET'])
+@login_required
+@replica_reads
+def search_submissions():
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"error": "Missing search text"}), 400
+
+    resources = request.args.get('resources')
+    resources = resources.split(',') if resources else list(SEARCH_RESOURCES)
+    unknown = [name for name in resources if name not in SEARCH_RESOURCES]
+    if unknown:
+        return jsonify({"error": f"Unknown resource: {', '.join(unknown)}"}), 400
+
+    try:
+        limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    if limit < 1:
+        return jsonify({"error": "Invalid limit"}), 400
+    limit = min(limit, SEARCH_MAX_LIMIT)
+
+    try:
+        return jsonify({"results": search(text, resources, limit)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Email configuration
 def send_email(to_email, subject, html_content):
     """Send an email using SMTP with HTML content"""
     try:
-        smtp_server = os.getenv('SMTP_SERVER')
-        smtp_port = int(os.getenv('SMTP_PORT', 587))
-        smtp_username = os.getenv('SMTP_USERNAME')
-        smtp_password = os.getenv('SMTP_PASSWORD')
-        from_email = os.getenv('FROM_EMAIL')
-        
         # Create message
         msg = MIMEMultipart('alternative')
-        msg['From'] = from_email
+        msg['From'] = from_address(TRANSPORT_SMTP)
         msg['To'] = to_email
         msg['Subject'] = subject
         
-        # Attach HTML contentm   
+        # Attach HTML content
         msg.attach(MIMEText(html_content, 'html'))
         
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls() 
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
+        # Send over the shared, already-authenticated session
+        get_mailer(TRANSPORT_SMTP).send(msg)
         
-        print("✅ Email sent successfully!")
+        log.info("Email sent", extra={'fields': {'transport': TRANSPORT_SMTP}})
         return True
-    except Exception as e:
-        print(f"❌ Error sending email: {str(e)}")
-        return False
\ No newline at end of file
+    except Exception:
+        log.exception("Error sending email")
+        return False
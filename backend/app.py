@@ -1,33 +1,53 @@
 from flask import Flask, request, jsonify, render_template, session, redirect, url_for, send_from_directory
 from flask_cors import CORS
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
+import logging
 from dotenv import load_dotenv
-from admin import record_loi_submission, record_enquiry, record_quotation, admin_bp, send_email, init_db
+from admin import record_enquiries_batch, record_quotations_batch, admin_bp, init_db, ensure_schema, generate_ticket_no
+from outbox import start_worker
+from retention import start_scheduler
+import notifications
+import metrics
+import logs
+import breaker
+from breaker import CircuitOpenError, UNAVAILABLE
+from notifications import contact_batch_notification, quote_batch_notification
+import submissions
+from submissions import InvalidSubmission, RECIPIENT_EMAIL
+from idempotency import idempotent
+from ratelimit import rate_limited
+from mailer import TRANSPORT_NOTIFICATION
+from replicas import read_your_writes_cookie
+from storage import get_storage
 
 # Load environment variables
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
-# Configure CORS
+# JSON log lines written off the request thread, with a request id each
+logs.init_app(app)
+
+# Configure CORS (asgi.py applies the same rules to the paths it serves)
+CORS_ORIGINS = [
+    "http://localhost:8080",
+    "http://localhost:3000",
+    "http://127.0.0.1:3000",
+    "http://localhost:5173",
+    "http://127.0.0.1:5173",
+    "https://www.roodan.ae",
+    "https://roodan.ae"
+]
+CORS_EXPOSE_HEADERS = ["Access-Control-Allow-Origin", "Retry-After", "X-Request-ID"]
 CORS(app, resources={
     r"/api/*": {
-        "origins": [
-            "http://localhost:8080",
-            "http://localhost:3000",
-            "http://127.0.0.1:3000",
-            "http://localhost:5173",
-            "http://127.0.0.1:5173",
-            "https://www.roodan.ae",
-            "https://roodan.ae"
-        ],
+        "origins": CORS_ORIGINS,
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Accept", "Authorization", "X-Requested-With"],
+        "allow_headers": ["Content-Type", "Accept", "Authorization", "X-Requested-With", "Idempotency-Key", "X-Request-ID"],
         "supports_credentials": True,
-        "expose_headers": ["Access-Control-Allow-Origin"]
+        "expose_headers": CORS_EXPOSE_HEADERS
 
     }
 })
@@ -39,38 +59,36 @@ app.config['SESSION_TYPE'] = 'filesystem'
 # Register admin blueprint
 app.register_blueprint(admin_bp, url_prefix='/admin')
 
-# Initialize database
-with app.app_context():
+# Compile the notification email templates once, up front
+notifications.init_app(app)
+
+# Request timing and the /metrics endpoint
+metrics.init_app(app)
+
+# Schema setup is a deploy step, not something every worker does at import:
+#   flask --app app init-db    (or: python migrate.py up)
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply pending migrations and seed the admin user"""
     init_db()
+    print("Database initialized")
 
-# Email configuration
-EMAIL_HOST = os.getenv("EMAIL_HOST", "mail.roodan.ae")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT", "465"))
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-RECIPIENT_EMAIL = "test@roodan.ae"
+# Opt-in for hosts without a deploy hook: migrate once per process on the
+# first request instead of at import time.
+AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', '').lower() in ('1', 'true', 'yes')
 
-# Function to Send Emails (renamed to send_email_notification to avoid conflict)
-def send_email_notification(sender_email, subject, body):
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER  # Must use your verified sender email for SMTP
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Reply-To'] = sender_email  # Sets user's email for reply
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Connect to SMTP server with SSL for security
-        with smtplib.SMTP_SSL(EMAIL_HOST, EMAIL_PORT) as server:
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.send_message(msg)
-
-        print("✅ Email sent successfully!")
-        return True
-    except Exception as e:
-        print(f"❌ Error sending email: {str(e)}")
-        return False
+# Largest array accepted by the batch endpoints
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
 
+@app.before_request
+def start_background_workers():
+    # Started on first request rather than at import so that each forked
+    # gunicorn/Passenger worker gets its own threads.
+    start_worker()
+    start_scheduler()
+    metrics.start_flusher()
+    if AUTO_MIGRATE:
+        ensure_schema()
 
 @app.before_request
 def handle_options_request():
@@ -78,336 +96,176 @@ def handle_options_request():
         response = app.make_response('')
         response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With, Idempotency-Key'
         response.headers['Access-Control-Allow-Credentials'] = 'true'
         return response
 
+@app.after_request
+def read_your_writes(response):
+    # A client that has just submitted reads from the primary for a while
+    # (see admin.replica_reads), so it sees its submission even while the
+    # replicas catch up
+    if (request.method == 'POST' and request.path.startswith('/api/') and response.status_code < 300
+            and len(get_storage().replicas)):
+        name, value, max_age = read_your_writes_cookie()
+        response.set_cookie(name, value, max_age=max_age, httponly=True, samesite='Lax')
+    return response
+
+@app.errorhandler(CircuitOpenError)
+def dependency_unavailable(e):
+    # A breaker is open: answer at once and say when to come back
+    response = jsonify({"error": UNAVAILABLE})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.route('/health')
+def health():
+    """Liveness, plus the circuit breakers of this process's dependencies"""
+    breakers = breaker.snapshot()
+    degraded = any(state['state'] != breaker.CLOSED for state in breakers.values())
+    return jsonify({"status": "degraded" if degraded else "ok", "breakers": breakers}), 200
+
 @app.route('/')
 def index():
     return render_template('admin_login.html')
 
-@app.route('/api/contact', methods=['POST'])
-def contact():
+def submit(build):
+    """Shared body of the single-submission views; `build` is from submissions.py"""
     try:
-        data = request.get_json()
-        name = data.get('name')
-        email = data.get('email')
-        message = data.get('message')
-
-        if not all([name, email, message]):
-            return jsonify({"error": "Missing required fields"}), 400
-
-        if not record_enquiry(name, email, message):
-            return jsonify({"error": "Failed to record enquiry"}), 500
-
-        # Create HTML email with tables for better organization
-        subject = "New Contact Form Submission"
-        
-        # Create HTML content with tables
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                h2 {{ color: #333; }}
-            </style>
-        </head>
-        <body>
-            <h1>New Contact Form Submission</h1>
-            
-            <h2>Contact Information</h2>
-            <table>
-                <tr>
-                    <th>Field</th>
-                    <th>Value</th>
-                </tr>
-                <tr>
-                    <td>Name</td>
-                    <td>{name}</td>
-                </tr>
-                <tr>
-                    <td>Email</td>
-                    <td>{email}</td>
-                </tr>
-            </table>
-            
-            <h2>Message</h2>
-            <table>
-                <tr>
-                    <th>Field</th>
-                    <th>Value</th>
-                </tr>
-                <tr>
-                    <td>Message</td>
-                    <td>{message}</td>
-                </tr>
-            </table>
-        </body>
-        </html>
-        """
-        
-        # Create plain text version for email clients that don't support HTML
-        plain_text = f"""
-        New contact form submission received:
-        
-        Name: {name}
-        Email: {email}
-        Message: {message}
-        """
-        
-        # Send HTML email
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_USER
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Reply-To'] = email
-        
-        # Attach both plain text and HTML versions
-        msg.attach(MIMEText(plain_text, 'plain'))
-        msg.attach(MIMEText(html_content, 'html'))
-        
-        # Send the email
-        try:
-            with smtplib.SMTP_SSL(EMAIL_HOST, EMAIL_PORT) as server:
-                server.login(EMAIL_USER, EMAIL_PASSWORD)
-                server.send_message(msg)
-            print("Email sent successfully")
-        except Exception as e:
-            print(f"Failed to send email: {str(e)}")
-            # Continue anyway, as the submission was recorded
-
-        return jsonify({"message": "Message sent successfully"}), 200
+        submission = build(request.get_json())
+        if not submissions.record(submission):
+            return jsonify({"error": submission.failure}), 500
+        return jsonify(submission.reply), 200
+    except InvalidSubmission as e:
+        return jsonify({"error": str(e)}), 400
+    except CircuitOpenError as e:
+        return dependency_unavailable(e)
     except Exception as e:
+        log.exception("Error in submission")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/contact', methods=['POST'])
+@rate_limited()
+@idempotent
+def contact():
+    return submit(submissions.contact)
+
 @app.route('/api/quote-request', methods=['POST'])
+@rate_limited()
+@idempotent
 def quote_request():
+    return submit(submissions.quote_request)
+
+@app.route('/api/loi-submission', methods=['POST'])
+@rate_limited()
+@idempotent
+def loi_submission():
+    return submit(submissions.loi_submission)
+
+def split_batch(data, required):
+    """Validate a batch payload; returns (valid [(index, item)], results) or an error response"""
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": "Expected a non-empty array of records"}), 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return None, (jsonify({"error": f"At most {BATCH_MAX_ITEMS} records per batch"}), 400)
+
+    valid = []
+    results = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({"index": index, "status": "rejected", "error": "Record must be an object"})
+            continue
+        missing = [field for field in required if not item.get(field)]
+        if missing:
+            results.append({"index": index, "status": "rejected",
+                            "error": f"Missing required fields: {', '.join(missing)}"})
+            continue
+        valid.append((index, item))
+        results.append(None)  # filled in once the batch is stored
+    return (valid, results), None
+
+def batch_response(valid, results, tickets):
+    for (index, _), ticket_no in zip(valid, tickets):
+        results[index] = {"index": index, "status": "accepted", "ticket_no": ticket_no}
+    return jsonify({
+        "accepted": len(valid),
+        "rejected": len(results) - len(valid),
+        "results": results
+    }), 200 if valid else 400
+
+def batch_cost():
+    """A batch spends one rate-limit token per record, in either payload shape split_batch accepts"""
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
+    return len(items) if isinstance(items, list) and items else 1
+
+@app.route('/api/contact/batch', methods=['POST'])
+@rate_limited(cost=batch_cost)
+@idempotent
+def contact_batch():
     try:
-        data = request.get_json()
-        print("Received payload:", data)  # Debugging: Log the received payload
-
-        # Map incoming keys to expected keys
-        company = data.get('companyName', '')
-        name = data.get('representativeName', '')
-        email = data.get('email', '')
-        phone = data.get('phone', '')
-        product = data.get('productName', '')
-        quantity = data.get('quantity', '')
-        delivery = data.get('deliveryPort', '')
-        observations = data.get('observations', '')
-        payment_terms = data.get('paymentTerms', '')
-        bank_name = data.get('bankName', '')
-        bank_swift_code = data.get('bankSwiftCode', '')
-        bank_address = data.get('bankAddress', '')
-        account_name = data.get('accountName', '')
-        account_number = data.get('accountNumber', '')
-        bank_officer_name = data.get('bankOfficerName', '')
-        bank_officer_title = data.get('bankOfficerTitle', '')
-        bank_phone = data.get('bankPhone', '')
-
-        # Record the quotation request and get ticket number
-        ticket_no = record_quotation(company, name, email, phone, product, quantity, delivery, observations)
-        if not ticket_no:
-            return jsonify({"error": "Failed to record quotation request"}), 500
-
-        # Create email content
-        subject = f"New Quote Request - Ticket #{ticket_no}"
-
-        # HTML content with separate tables for each section
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                h2 {{ color: #333; }}
-            </style>
-        </head>
-        <body>
-            <h1>New Quote Request Received</h1>
-            
-            <h2>Buyer Information</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Company Name</td><td>{company or 'N/A'}</td></tr>
-                <tr><td>Representative Name</td><td>{name or 'N/A'}</td></tr>
-                <tr><td>Email</td><td>{email or 'N/A'}</td></tr>
-                <tr><td>Phone</td><td>{phone or 'N/A'}</td></tr>
-            </table>
-            
-            <h2>Product Details</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Product</td><td>{product or 'N/A'}</td></tr>
-                <tr><td>Quantity</td><td>{quantity or 'N/A'}</td></tr>
-                <tr><td>Delivery Port</td><td>{delivery or 'N/A'}</td></tr>
-                <tr><td>Observations</td><td>{observations or 'N/A'}</td></tr>
-            </table>
-            
-            <h2>Payment Details</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Payment Terms</td><td>{payment_terms or 'N/A'}</td></tr>
-            </table>
-            
-            <h2>Buyer Bank Information</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Bank Name</td><td>{bank_name or 'N/A'}</td></tr>
-                <tr><td>Bank SWIFT Code</td><td>{bank_swift_code or 'N/A'}</td></tr>
-                <tr><td>Bank Address</td><td>{bank_address or 'N/A'}</td></tr>
-                <tr><td>Account Name</td><td>{account_name or 'N/A'}</td></tr>
-                <tr><td>Account Number</td><td>{account_number or 'N/A'}</td></tr>
-                <tr><td>Bank Officer Name</td><td>{bank_officer_name or 'N/A'}</td></tr>
-                <tr><td>Bank Officer Title</td><td>{bank_officer_title or 'N/A'}</td></tr>
-                <tr><td>Bank Phone</td><td>{bank_phone or 'N/A'}</td></tr>
-            </table>
-        </body>
-        </html>
-        """
-
-        # Plain text content
-        plain_text = f"""
-        New Quote Request Received:
-
-        Buyer Information:
-        - Company Name: {company or 'N/A'}
-        - Representative Name: {name or 'N/A'}
-        - Email: {email or 'N/A'}
-        - Phone: {phone or 'N/A'}
-
-        Product Details:
-        - Product: {product or 'N/A'}
-        - Quantity: {quantity or 'N/A'}
-        - Delivery Port: {delivery or 'N/A'}
-        - Observations: {observations or 'N/A'}
-
-        Payment Details:
-        - Payment Terms: {payment_terms or 'N/A'}
-
-        Buyer Bank Information:
-        - Bank Name: {bank_name or 'N/A'}
-        - Bank SWIFT Code: {bank_swift_code or 'N/A'}
-        - Bank Address: {bank_address or 'N/A'}
-        - Account Name: {account_name or 'N/A'}
-        - Account Number: {account_number or 'N/A'}
-        - Bank Officer Name: {bank_officer_name or 'N/A'}
-        - Bank Officer Title: {bank_officer_title or 'N/A'}
-        - Bank Phone: {bank_phone or 'N/A'}
-        """
-
-        # Send HTML email
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_USER
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Reply-To'] = email
-
-        # Attach both plain text and HTML versions
-        msg.attach(MIMEText(plain_text, 'plain'))
-        msg.attach(MIMEText(html_content, 'html'))
-
-        # Send the email
-        try:
-            with smtplib.SMTP_SSL(EMAIL_HOST, EMAIL_PORT) as server:
-                server.login(EMAIL_USER, EMAIL_PASSWORD)
-                server.send_message(msg)
-            print("Email sent successfully")
-        except Exception as e:
-            print(f"Failed to send email: {str(e)}")
-            return jsonify({"error": "Failed to send email"}), 500
-
-        return jsonify({
-            "message": "Quote request submitted successfully",
-            "ticket_no": ticket_no
-        }), 200
+        batch, error = split_batch(request.get_json(), ['name', 'email', 'message'])
+        if error:
+            return error
+        valid, results = batch
+
+        enquiries = [
+            {'ticket_no': generate_ticket_no('ENQ'), 'name': item['name'],
+             'email': item['email'], 'message': item['message']}
+            for _, item in valid
+        ]
+        if enquiries:
+            # One transaction, one multi-row INSERT and one summary email
+            notification = dict(
+                contact_batch_notification(enquiries),
+                transport=TRANSPORT_NOTIFICATION,
+                to_email=RECIPIENT_EMAIL,
+            )
+            if not record_enquiries_batch(enquiries, notification=notification):
+                return jsonify({"error": "Failed to record enquiries"}), 500
+
+        return batch_response(valid, results, [e['ticket_no'] for e in enquiries])
+    except CircuitOpenError:
+        raise
     except Exception as e:
-        print(f"Error in quote request: {str(e)}")
+        log.exception("Error in contact batch")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/loi-submission', methods=['POST'])
-def loi_submission():
+@app.route('/api/quote-request/batch', methods=['POST'])
+@rate_limited(cost=batch_cost)
+@idempotent
+def quote_request_batch():
     try:
-        data = request.get_json()
-        print("Received LOI submission payload:", data)  # Debugging: Log the payload
-
-        # Extract user details from the payload
-        company_name = data.get('companyName')
-        rep_name = data.get('representativeName')
-        email = data.get('email')
-        phone = data.get('phone')
-        product = data.get('productName')
-        quantity = data.get('quantity')
-        loi_data = data  # Store the entire payload as JSON for future reference
-
-        # Record the LOI submission in the database
-        success = record_loi_submission(company_name, rep_name, email, phone, product, quantity, loi_data)
-        if not success:
-            return jsonify({"error": "Failed to record LOI submission"}), 500
-
-        # Create email content in table format
-        subject = f"New LOI Submission from {company_name}"
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                h2 {{ color: #333; }}
-            </style>
-        </head>
-        <body>
-            <h1>New LOI Submission Received</h1>
-            
-            <h2>Company Information</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Company Name</td><td>{company_name}</td></tr>
-                <tr><td>Representative Name</td><td>{rep_name}</td></tr>
-                <tr><td>Email</td><td>{email}</td></tr>
-                <tr><td>Phone</td><td>{phone}</td></tr>
-                <tr><td>Product</td><td>{product}</td></tr>
-                <tr><td>Quantity</td><td>{quantity}</td></tr>
-            </table>
-            
-            <h2>Bank Information</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Bank Name</td><td>{data.get('bankName', 'N/A')}</td></tr>
-                <tr><td>Bank SWIFT Code</td><td>{data.get('bankSwiftCode', 'N/A')}</td></tr>
-                <tr><td>Bank Address</td><td>{data.get('bankAddress', 'N/A')}</td></tr>
-                <tr><td>Account Name</td><td>{data.get('accountName', 'N/A')}</td></tr>
-                <tr><td>Account Number</td><td>{data.get('accountNumber', 'N/A')}</td></tr>
-                <tr><td>Bank Officer Name</td><td>{data.get('bankOfficerName', 'N/A')}</td></tr>
-                <tr><td>Bank Officer Title</td><td>{data.get('bankOfficerTitle', 'N/A')}</td></tr>
-                <tr><td>Bank Phone</td><td>{data.get('bankPhone', 'N/A')}</td></tr>
-            </table>
-            
-            <h2>Additional Information</h2>
-            <table>
-                <tr><th>Field</th><th>Value</th></tr>
-                <tr><td>Observations</td><td>{data.get('observations', 'N/A')}</td></tr>
-                <tr><td>Specifications</td><td>{data.get('specifications', 'N/A')}</td></tr>
-            </table>
-        </body>
-        </html>
-        """
-
-        # Send the email
-        email_sent = send_email(email, subject, html_content)
-        if not email_sent:
-            return jsonify({"error": "Failed to send email"}), 500
-
-        return jsonify({"message": "LOI submission recorded successfully"}), 200
+        batch, error = split_batch(request.get_json(), ['companyName', 'email', 'productName'])
+        if error:
+            return error
+        valid, results = batch
+
+        # Allocate every ticket number before the insert
+        quotations = [
+            {'ticket_no': generate_ticket_no('QUOTE'),
+             'company': item.get('companyName', ''), 'name': item.get('representativeName', ''),
+             'email': item.get('email', ''), 'phone': item.get('phone', ''),
+             'product': item.get('productName', ''), 'quantity': item.get('quantity', ''),
+             'delivery': item.get('deliveryPort', ''), 'message': item.get('observations', '')}
+            for _, item in valid
+        ]
+        if quotations:
+            notification = dict(
+                quote_batch_notification([(q['ticket_no'], item) for q, (_, item) in zip(quotations, valid)]),
+                transport=TRANSPORT_NOTIFICATION,
+                to_email=RECIPIENT_EMAIL,
+            )
+            if not record_quotations_batch(quotations, notification=notification):
+                return jsonify({"error": "Failed to record quotation requests"}), 500
+
+        return batch_response(valid, results, [q['ticket_no'] for q in quotations])
+    except CircuitOpenError:
+        raise
     except Exception as e:
-        print(f"Error in LOI submission: {str(e)}")
+        log.exception("Error in quote request batch")
         return jsonify({"error": str(e)}), 500
 
 # Admin redirect
@@ -0,0 +1,386 @@
+"""ASGI entry point for the public submission endpoints
+
+    pip install uvicorn aiomysql
+    uvicorn asgi:application --workers 2
+
+Serves POST /api/contact, /api/quote-request and /api/loi-submission (and
+their CORS preflights) with the same request and response contract as the
+Flask views, since both build replies with submissions.py. A submission
+waiting on the database holds a coroutine instead of a WSGI worker thread,
+so one process keeps hundreds in flight. Route these three paths here and
+everything else to passenger_wsgi.py; any other path gets a 404.
+
+Emails are not sent from the request either way: the submission queues
+them in the outbox in the same transaction and the outbox worker thread
+delivers them after we have responded.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+from werkzeug.http import dump_cookie
+
+try:
+    import aiomysql
+except ImportError:  # optional; the thread pool below is used without it
+    aiomysql = None
+
+# Importing the Flask app compiles the email templates and settles the CORS
+# origins; its background workers are started from lifespan startup below.
+from app import AUTO_MIGRATE, CORS_ORIGINS, CORS_EXPOSE_HEADERS
+from admin import after_commit, ensure_schema
+from breaker import CircuitOpenError, UNAVAILABLE, get_breaker
+from db_pool import POOL_SIZE, MYSQL_CONNECT_TIMEOUT, MYSQL_READ_TIMEOUT
+from idempotency import KEY_REUSED, make_key, store as idempotency_store
+from logs import request_id_from, log_access
+from outbox import enqueue_statement, start_worker
+from ratelimit import over_limit, client_ip_from, TOO_MANY_REQUESTS, SERVER_BUSY
+from replicas import read_your_writes_cookie
+from retention import start_scheduler
+from storage import STORAGE_BACKEND, get_storage, insert_statement
+import metrics
+import submissions
+from submissions import InvalidSubmission
+
+log = logging.getLogger(__name__)
+
+# Submissions in flight per process; beyond this they are shed with 503
+ASGI_MAX_CONCURRENT = int(os.getenv('ASGI_MAX_CONCURRENT', '500'))
+# "aiomysql" (async MySQL pool), "threads" (the storage backend on a thread
+# pool) or "auto": aiomysql for MySQL when it is installed
+ASGI_DB_DRIVER = os.getenv('ASGI_DB_DRIVER', 'auto')
+# Connections in the aiomysql pool
+ASGI_DB_POOL_SIZE = int(os.getenv('ASGI_DB_POOL_SIZE', '20'))
+# Largest request body read; bigger ones get 413
+ASGI_MAX_BODY_BYTES = int(os.getenv('ASGI_MAX_BODY_BYTES', str(1024 * 1024)))
+
+ROUTES = {
+    '/api/contact': submissions.contact,
+    '/api/quote-request': submissions.quote_request,
+    '/api/loi-submission': submissions.loi_submission,
+}
+
+
+def aiomysql_unavailable(e):
+    """db_pool.unavailable for aiomysql's (PyMySQL's) errors"""
+    if isinstance(e, aiomysql.OperationalError):
+        # Client error codes 2000-2999: cannot connect, server gone away, lost connection
+        return bool(e.args) and isinstance(e.args[0], int) and 2000 <= e.args[0] < 3000
+    return isinstance(e, OSError)
+
+
+class AioMySQLDatabase:
+    """Submission inserts over an aiomysql connection pool
+
+    Shares the "mysql" circuit breaker with the synchronous pool, since
+    both talk to the same server.
+    """
+
+    def __init__(self, size=ASGI_DB_POOL_SIZE):
+        self.size = size
+        self.breaker = get_breaker('mysql')
+        self._pool = None
+
+    async def start(self):
+        self._pool = await aiomysql.create_pool(
+            host=os.getenv('MYSQL_HOST'),
+            user=os.getenv('MYSQL_USER'),
+            password=os.getenv('MYSQL_PASSWORD') or '',
+            db=os.getenv('MYSQL_DB'),
+            minsize=1,
+            maxsize=self.size,
+            autocommit=False,
+            connect_timeout=MYSQL_CONNECT_TIMEOUT,
+        )
+
+    async def insert(self, table, rows, notification=None):
+        """Same statements and transaction as Storage.insert, within MYSQL_READ_TIMEOUT"""
+        with self.breaker.call(aiomysql_unavailable):
+            await asyncio.wait_for(self._insert(table, rows, notification), MYSQL_READ_TIMEOUT)
+
+    async def _insert(self, table, rows, notification):
+        sql, params = insert_statement(table, rows)
+        async with self._pool.acquire() as conn:
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.executemany(sql, params)
+                    if notification:
+                        await cursor.execute(*enqueue_statement(**notification))
+                await conn.commit()
+            except BaseException:
+                # Also on timeout, when the connection may be mid-result:
+                # closing it discards the transaction and keeps it out of the pool
+                conn.close()
+                raise
+
+    async def close(self):
+        self._pool.close()
+        await self._pool.wait_closed()
+
+
+class ThreadedDatabase:
+    """The configured storage backend, run on a thread pool sized to its connections"""
+
+    def __init__(self, size=POOL_SIZE):
+        self._executor = ThreadPoolExecutor(size, thread_name_prefix='asgi-db')
+
+    async def start(self):
+        pass
+
+    async def insert(self, table, rows, notification=None):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, get_storage().insert, table, rows, notification)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def make_database(driver=ASGI_DB_DRIVER):
+    if driver == 'auto':
+        driver = 'aiomysql' if STORAGE_BACKEND == 'mysql' and aiomysql is not None else 'threads'
+    if driver == 'aiomysql':
+        if aiomysql is None:
+            raise RuntimeError("ASGI_DB_DRIVER=aiomysql needs `pip install aiomysql`")
+        return AioMySQLDatabase()
+    if driver == 'threads':
+        return ThreadedDatabase()
+    raise ValueError(f"Unknown ASGI_DB_DRIVER: {driver}")
+
+
+_database = None
+_starting = None
+_in_flight = 0
+
+
+async def _start():
+    global _database
+    # The same per-process background work the Flask app starts on its first request
+    start_worker()
+    start_scheduler()
+    metrics.start_flusher()
+    if AUTO_MIGRATE:
+        await asyncio.get_running_loop().run_in_executor(None, ensure_schema)
+    database = make_database()
+    await database.start()
+    _database = database
+    return database
+
+
+async def get_database():
+    """Start up once per process: on lifespan startup, or the first request without it"""
+    global _starting
+    if _starting is None:
+        _starting = asyncio.ensure_future(_start())
+    try:
+        return await _starting
+    except Exception:
+        _starting = None
+        raise
+
+
+async def shutdown():
+    global _database, _starting
+    if _database is not None:
+        await _database.close()
+    _database = _starting = None
+
+
+def parse_json(content_type, body, silent=False):
+    """request.get_json() as the Flask views see it, including its errors"""
+    mimetype = content_type.split(';', 1)[0].strip().lower()
+    if not (mimetype == 'application/json'
+            or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        if silent:
+            return None
+        raise UnsupportedMediaType("Did not attempt to load JSON data because the request"
+                                   " Content-Type was not 'application/json'.")
+    try:
+        return json.loads(body)
+    except ValueError:
+        if silent:
+            return None
+        raise BadRequest()
+
+
+def json_body(value):
+    # Flask's compact, key-sorted jsonify output
+    return (json.dumps(value, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def cors_headers(origin):
+    if origin not in CORS_ORIGINS:
+        return []
+    return [('Access-Control-Allow-Origin', origin),
+            ('Access-Control-Allow-Credentials', 'true'),
+            ('Access-Control-Expose-Headers', ', '.join(CORS_EXPOSE_HEADERS)),
+            ('Vary', 'Origin')]
+
+
+def preflight_headers(origin):
+    # Mirrors app.handle_options_request
+    return [('Access-Control-Allow-Origin', origin or '*'),
+            ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Requested-With, Idempotency-Key'),
+            ('Access-Control-Allow-Credentials', 'true')]
+
+
+async def read_body(receive):
+    """The request body, or None once it passes ASGI_MAX_BODY_BYTES"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionResetError("Client disconnected")
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > ASGI_MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def submit(build, headers, body):
+    """(status, reply, extra headers) for one submission; mirrors app.submit"""
+    try:
+        submission = build(parse_json(headers.get('content-type', ''), body))
+    except InvalidSubmission as e:
+        return 400, {"error": str(e)}, []
+    except Exception as e:
+        log.exception("Error in submission")
+        return 500, {"error": str(e)}, []
+
+    try:
+        database = await get_database()
+        await database.insert(submission.table, submission.rows, submission.notification)
+    except CircuitOpenError as e:
+        return 503, {"error": UNAVAILABLE}, [('Retry-After', str(e.retry_after))]
+    except Exception:
+        log.exception("Error recording %s", submission.table)
+        return 500, {"error": submission.failure}, []
+    after_commit(submission.table, submission.products, submission.notification)
+    return 200, submission.reply, []
+
+
+async def handle(scope, receive, headers):
+    """(status, reply, extra headers) for a POST to one of ROUTES"""
+    path = scope['path']
+    forwarded = headers.get('x-forwarded-for')
+    remote_addr = scope['client'][0] if scope.get('client') else None
+    access_route = [hop.strip() for hop in forwarded.split(',')] if forwarded else [remote_addr]
+    ip = client_ip_from(access_route, remote_addr)
+    retry_after = over_limit(ip)
+    if retry_after is not None:
+        return 429, {"error": TOO_MANY_REQUESTS}, [('Retry-After', str(retry_after))]
+
+    body = await read_body(receive)
+    if body is None:
+        return 413, {"error": "Request body too large"}, []
+
+    scoped = make_key(path, ip, headers.get('idempotency-key'),
+                      parse_json(headers.get('content-type', ''), body, silent=True))
+    if scoped is None:
+        return await submit(ROUTES[path], headers, body)
+    key, fingerprint = scoped
+
+    # begin() blocks while another request holds the key, so not on the loop
+    loop = asyncio.get_running_loop()
+    try:
+        action, stored = await loop.run_in_executor(None, idempotency_store.begin, key, fingerprint)
+    except CircuitOpenError as e:
+        return 503, {"error": UNAVAILABLE}, [('Retry-After', str(e.retry_after))]
+    if action == 'mismatch':
+        return 422, {"error": KEY_REUSED}, []
+    if action == 'replay':
+        reply, status = stored
+        return status, reply, [('Idempotent-Replayed', 'true')]
+
+    reply = status = None
+    try:
+        status, result, extra = await submit(ROUTES[path], headers, body)
+        if 200 <= status < 300:
+            reply = result
+        return status, result, extra
+    finally:
+        await loop.run_in_executor(None, idempotency_store.finish, key, reply, status)
+
+
+async def send_response(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def http(scope, receive, send):
+    global _in_flight
+    started = time.perf_counter()
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    request_id = request_id_from(headers.get('x-request-id', ''))
+    method = scope['method']
+    path = scope['path']
+    origin = headers.get('origin')
+    extra = []
+    body = b''
+
+    if path not in ROUTES:
+        status, reply = 404, {"error": "Not found"}
+    elif method == 'OPTIONS':
+        status, reply, extra = 200, None, preflight_headers(origin)
+    elif method != 'POST':
+        status, reply, extra = 405, {"error": "Method not allowed"}, [('Allow', 'OPTIONS, POST')]
+    elif _in_flight >= ASGI_MAX_CONCURRENT:
+        status, reply, extra = 503, {"error": SERVER_BUSY}, [('Retry-After', '1')]
+    else:
+        _in_flight += 1
+        try:
+            status, reply, extra = await handle(scope, receive, headers)
+        finally:
+            _in_flight -= 1
+        if status < 300 and len(get_storage().replicas):
+            # Read-your-writes, as app.read_your_writes
+            name, value, max_age = read_your_writes_cookie()
+            extra = extra + [('Set-Cookie', dump_cookie(name, value, max_age=max_age, httponly=True,
+                                                        samesite='Lax'))]
+        extra = extra + cors_headers(origin)
+
+    if reply is None:
+        response_headers = [('Content-Type', 'text/html; charset=utf-8')]
+    else:
+        body = json_body(reply)
+        response_headers = [('Content-Type', 'application/json')]
+    response_headers += [('Content-Length', str(len(body))), ('X-Request-ID', request_id)] + extra
+    await send_response(send, status, response_headers, body)
+
+    elapsed = time.perf_counter() - started
+    route = path if path in ROUTES else 'unmatched'
+    metrics.observe('http_request_duration_seconds', elapsed, route=route, method=method, status=str(status))
+    log_access(method, path, route if path in ROUTES else None, status, elapsed * 1000, request_id)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await get_database()
+            except Exception as e:
+                log.exception("ASGI startup failed")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        await http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
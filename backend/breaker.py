@@ -0,0 +1,165 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Consecutive outage errors that open a breaker, and how long it then fails
+# calls fast before letting a probe through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+UNAVAILABLE = "Service temporarily unavailable, please try again shortly"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{name} is unavailable, retrying in {self.retry_after}s")
+
+
+class CircuitBreaker:
+    """Fails calls to one dependency fast while it is down
+
+    Closed, calls go through and consecutive outage errors are counted; at
+    the threshold the breaker opens and calls raise CircuitOpenError without
+    touching the dependency. After reset_timeout it is half-open: one probe
+    call goes through while the rest still fail fast. The probe's success
+    closes the breaker, its failure opens it again, and a probe that never
+    reports back is replaced after another reset_timeout.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._times_opened = 0
+        self._rejected = 0
+        self._last_error = None
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self._state == CLOSED:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - now
+                if remaining > 0:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = HALF_OPEN
+                self._probe_started = now
+                log.info("Circuit %s half-open, probing", self.name)
+            elif self._state == HALF_OPEN:
+                waited = now - self._probe_started
+                if waited <= self.reset_timeout:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self._probe_started = now
+
+    def success(self):
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            if self._state != CLOSED:
+                log.warning("Circuit %s closed, dependency recovered", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_started = None
+
+    def failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) if error is not None else None
+            if self._state == OPEN:
+                return
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                log.warning("Circuit %s opened after %d failures: %s", self.name, self._failures, error)
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                self._times_opened += 1
+
+    @contextmanager
+    def guard(self, unavailable):
+        """Record the block's outcome; `unavailable(e)` tells outages from other errors"""
+        try:
+            yield
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # Any answer from the dependency, even an error, shows it is up
+            if unavailable(e):
+                self.failure(e)
+            else:
+                self.success()
+            raise
+        self.success()
+
+    @contextmanager
+    def call(self, unavailable):
+        """allow() then guard(): wrap one call to the dependency"""
+        self.allow()
+        with self.guard(unavailable):
+            yield
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'times_opened': self._times_opened,
+                'rejected': self._rejected,
+                'last_error': self._last_error,
+            }
+            if self._state == OPEN:
+                snapshot['retry_in'] = round(max(0.0, self._opened_at + self.reset_timeout - time.monotonic()), 3)
+            return snapshot
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The process-wide breaker for a dependency, created on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def snapshot():
+    """State of every breaker this process has created, for the health endpoint"""
+    return {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())}
+
+
+def _after_fork_in_child():
+    # A lock held by another thread at fork time would never be released
+    global _breakers_lock
+    _breakers_lock = threading.Lock()
+    for breaker in _breakers.values():
+        breaker._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
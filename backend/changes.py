@@ -0,0 +1,167 @@
+import base64
+import datetime
+import json
+import os
+import threading
+import time
+
+# Plain module import: storage imports this module too
+import storage
+
+# Tables in the feed (resource name == table name)
+CHANGE_RESOURCES = ('enquiries', 'quotations', 'loi_submissions')
+# Most rows returned per table in one delta
+CHANGES_MAX_ROWS = int(os.getenv('CHANGES_MAX_ROWS', '200'))
+# How long deletes stay visible to clients holding an old cursor
+CHANGES_TOMBSTONE_DAYS = int(os.getenv('CHANGES_TOMBSTONE_DAYS', '7'))
+# How often an open stream checks the database for commits made by other
+# worker processes (commits in this process wake it immediately)
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', '2'))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+# Streams end after this long and the browser reconnects with Last-Event-ID.
+# Under a sync server (gunicorn sync workers, Passenger) an open stream holds
+# a worker thread the whole time, and the reconnect takes it again, so each
+# dashboard tab on SSE effectively pins one.
+SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', '300'))
+# How the dashboard follows the feed: "poll" asks /admin/api/changes every
+# CHANGES_POLL_INTERVAL seconds and holds no worker between requests; "sse"
+# streams, and is only worth it with workers to spare (see SSE_MAX_DURATION)
+DASHBOARD_LIVE_UPDATES = os.getenv('DASHBOARD_LIVE_UPDATES', 'poll')
+CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', '30'))
+
+
+class ChangesCursorError(ValueError):
+    """Raised for a malformed `since` cursor"""
+
+
+def encode_cursor(positions):
+    raw = json.dumps(positions, sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        positions = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {key: int(positions[key]) for key in CHANGE_RESOURCES + ('deleted',)}
+    except Exception:
+        raise ChangesCursorError("Invalid cursor")
+
+
+def record_tombstones(cursor, resource, row_ids):
+    """Note deleted rows in the caller's transaction"""
+    now = datetime.datetime.now()
+    expires_at = now + datetime.timedelta(days=CHANGES_TOMBSTONE_DAYS)
+    cursor.executemany(
+        "INSERT INTO deleted_rows (resource, row_id, deleted_at, expires_at) VALUES (%s, %s, %s, %s)",
+        [(resource, row_id, now, expires_at) for row_id in row_ids]
+    )
+
+
+def current_cursor():
+    """Cursor positioned at the newest row of every table"""
+    conn = storage.get_storage().connection()
+    try:
+        cursor = conn.cursor()
+        # MAX(id) on a primary key is a single index lookup
+        cursor.execute(
+            " UNION ALL ".join(f"SELECT '{table}', COALESCE(MAX(id), 0) FROM {table}"
+                               for table in CHANGE_RESOURCES + ('deleted_rows',))
+        )
+        positions = {name: int(max_id) for name, max_id in cursor.fetchall()}
+    finally:
+        conn.close()
+    positions['deleted'] = positions.pop('deleted_rows')
+    return encode_cursor(positions)
+
+
+def table_version(table):
+    """Token that changes whenever rows are added to or purged from `table`
+
+    Two primary-key MAX() lookups: the newest row and the newest tombstone
+    (rows are never updated in place, so nothing else changes a page).
+    """
+    conn = storage.get_storage().read_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT (SELECT COALESCE(MAX(id), 0) FROM {table}), "
+                       "(SELECT COALESCE(MAX(id), 0) FROM deleted_rows)")
+        newest, deleted = cursor.fetchone()
+    finally:
+        conn.close()
+    return f"{newest}.{deleted}"
+
+
+def changes_since(cursor_token, limit=CHANGES_MAX_ROWS):
+    """Rows inserted and deleted after the cursor, plus the cursor to use next"""
+    positions = decode_cursor(cursor_token)
+    inserted = {}
+    has_more = False
+
+    conn = storage.get_storage().connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        for table in CHANGE_RESOURCES:
+            # Primary-key range scan: cost depends on new rows only
+            cursor.execute(f"SELECT * FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+                           (positions[table], limit))
+            rows = cursor.fetchall()
+            if rows:
+                positions[table] = rows[-1]['id']
+                has_more = has_more or len(rows) == limit
+            inserted[table] = rows
+
+        cursor.execute("SELECT id, resource, row_id FROM deleted_rows WHERE id > %s ORDER BY id LIMIT %s",
+                       (positions['deleted'], limit))
+        tombstones = cursor.fetchall()
+    finally:
+        conn.close()
+
+    if tombstones:
+        positions['deleted'] = tombstones[-1]['id']
+        has_more = has_more or len(tombstones) == limit
+    deleted = [{'resource': t['resource'], 'id': t['row_id']} for t in tombstones]
+    return {
+        'inserted': inserted,
+        'deleted': deleted,
+        'cursor': encode_cursor(positions),
+        'has_more': has_more,
+        'empty': not deleted and not any(inserted.values()),
+    }
+
+
+# Commits in this process wake open streams straight away
+_commit_condition = threading.Condition()
+
+
+def notify_commit():
+    with _commit_condition:
+        _commit_condition.notify_all()
+
+
+def wait_for_commit(timeout):
+    with _commit_condition:
+        _commit_condition.wait(timeout)
+
+
+def stream_changes(cursor_token, dumps):
+    """Server-sent events: one `changes` event per non-empty delta
+
+    Each event's id is the cursor after it, so a reconnecting EventSource
+    resumes from Last-Event-ID without missing or repeating rows.
+    """
+    started = last_sent = time.monotonic()
+    yield "retry: 3000\n\n"
+    while time.monotonic() - started < SSE_MAX_DURATION:
+        delta = changes_since(cursor_token)
+        now = time.monotonic()
+        if not delta['empty']:
+            cursor_token = delta['cursor']
+            yield f"id: {cursor_token}\nevent: changes\ndata: {dumps(delta)}\n\n"
+            last_sent = now
+            if delta['has_more']:
+                continue
+        elif now - last_sent >= SSE_HEARTBEAT_INTERVAL:
+            yield ": heartbeat\n\n"
+            last_sent = now
+        wait_for_commit(SSE_POLL_INTERVAL)
@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import logging
+import os
+from functools import wraps
+
+from flask import Response, current_app, request
+
+log = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain')
+ENCODINGS = ('br', 'gzip')
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()[:32]
+
+
+def _matches(tag):
+    """True if the client already holds `tag`, in any content coding"""
+    client_tags = request.if_none_match
+    return any(client_tags.contains(candidate)
+               for candidate in [tag] + [f"{tag}-{encoding}" for encoding in ENCODINGS])
+
+
+def _not_modified(tag):
+    response = Response(status=304)
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def etagged(version=None):
+    """Answer GETs with a strong ETag and 304 Not Modified when nothing changed
+
+    `version` is a cheap callable that changes whenever the data does; the
+    ETag is derived from it and the query string, so a match skips the view
+    entirely. Without it the ETag is a digest of the rendered body, which
+    still saves the transfer.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            tag = None
+            if version is not None:
+                try:
+                    tag = _digest(version(), request.full_path)
+                except Exception:
+                    log.exception("Error reading data version")
+                if tag is not None and _matches(tag):
+                    return _not_modified(tag)
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if tag is None:
+                tag = _digest(response.get_data())
+                if _matches(tag):
+                    return _not_modified(tag)
+            response.set_etag(tag)
+            # Private data: let the browser cache it, but revalidate every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request hook: gzip or brotli-encode larger text bodies"""
+    if (response.status_code != 200
+            or response.is_streamed  # exports and event streams flush as they go
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = _choose_encoding() if len(data) >= COMPRESS_MIN_SIZE else None
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+
+    # A strong ETag names exact bytes, so each coding gets its own tag
+    tag, weak = response.get_etag()
+    if tag:
+        response.set_etag(f"{tag}-{encoding}", weak)
+    return response
@@ -0,0 +1,355 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from dotenv import load_dotenv
+from mysql.connector.errors import ConnectionTimeoutError, ReadTimeoutError, WriteTimeoutError
+
+from breaker import get_breaker
+from metrics import InstrumentedCursor, observe
+
+load_dotenv()
+
+# Pool configuration (all optional, tuned through the environment)
+POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', '10'))
+POOL_RECYCLE = float(os.getenv('MYSQL_POOL_RECYCLE', '1800'))
+POOL_PING_INTERVAL = float(os.getenv('MYSQL_POOL_PING_INTERVAL', '30'))
+
+# Socket timeouts, in whole seconds (mysql.connector takes integers): the
+# TCP connect and handshake, waiting for a result, and sending a statement.
+# Together with the pool's checkout timeout they bound every query, so a
+# hung server costs a request seconds rather than a worker forever.
+MYSQL_CONNECT_TIMEOUT = int(os.getenv('MYSQL_CONNECT_TIMEOUT', '5'))
+MYSQL_READ_TIMEOUT = int(os.getenv('MYSQL_READ_TIMEOUT', '30'))
+MYSQL_WRITE_TIMEOUT = int(os.getenv('MYSQL_WRITE_TIMEOUT', '10'))
+
+# Read replicas as host or host:port, comma separated; they share the
+# primary's credentials and database name. Read-only admin routes use them.
+MYSQL_REPLICA_HOSTS = [host.strip() for host in os.getenv('MYSQL_REPLICA_HOSTS', '').split(',') if host.strip()]
+REPLICA_POOL_SIZE = int(os.getenv('MYSQL_REPLICA_POOL_SIZE', str(POOL_SIZE)))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+def connect(host=None, port=None):
+    """Open a fresh, unpooled connection (for long-lived work such as exports)
+
+    To the primary, MYSQL_HOST, unless `host` names a replica.
+    """
+    options = {'port': port} if port else {}
+    return mysql.connector.connect(
+        host=host or os.getenv('MYSQL_HOST'),
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD'),
+        database=os.getenv('MYSQL_DB'),
+        autocommit=False,
+        connection_timeout=MYSQL_CONNECT_TIMEOUT,
+        read_timeout=MYSQL_READ_TIMEOUT,
+        write_timeout=MYSQL_WRITE_TIMEOUT,
+        **options,
+    )
+
+
+def unavailable(e):
+    """True when an error means the server is down or unreachable, not that a statement failed"""
+    if isinstance(e, (ConnectionTimeoutError, ReadTimeoutError, WriteTimeoutError)):
+        return True
+    if isinstance(e, mysql.connector.Error):
+        # 2000-2999 are client errors: cannot connect, server gone away, lost connection
+        return 2000 <= (e.errno or 0) < 3000
+    return isinstance(e, OSError)
+
+
+def replica_lag(conn):
+    """Seconds a replica trails its source, None when replication is not running"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except mysql.connector.Error:
+        # Before MySQL 8.0.22
+        cursor.execute("SHOW SLAVE STATUS")
+    rows = cursor.fetchall()
+    lags = [row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master')) for row in rows]
+    if not lags or None in lags:
+        return None
+    return max(lags)
+
+
+class GuardedCursor:
+    """Reports the outcome of each statement to the pool's circuit breaker"""
+
+    def __init__(self, cursor, breaker):
+        self._cursor = cursor
+        self._breaker = breaker
+
+    def execute(self, *args, **kwargs):
+        with self._breaker.guard(unavailable):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with self._breaker.guard(unavailable):
+            return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PooledConnection:
+    """Wraps a raw connection so that close() hands it back to the pool"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.breaker is not None:
+            cursor = GuardedCursor(cursor, self._pool.breaker)
+        return InstrumentedCursor(cursor)
+
+    def is_connected(self):
+        # Answers "is this handle still checked out" without a server round
+        # trip; dead sessions are caught by the health check on checkout.
+        return not self._released
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for code paths that raise before reaching close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """A small fixed-size, fork-aware pool of MySQL connections
+
+    With a circuit breaker, checkouts fail fast with CircuitOpenError while
+    it is open instead of queueing behind a server that is not answering.
+    """
+
+    def __init__(self, connect=connect, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, ping_interval=POOL_PING_INTERVAL, breaker=None):
+        self._connect = connect
+        self.breaker = breaker
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        # Idle entries are (raw_connection, created_at, last_used_at)
+        self._idle = deque()
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+
+    def _check_fork(self):
+        # Connections inherited from the parent share its sockets: drop them
+        # without closing (closing would also tear down the parent's session).
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _is_healthy(self, raw, created_at, last_used_at):
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            self._recycled += 1
+            return False
+        if now - last_used_at < self.ping_interval:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            self._failed_health_checks += 1
+            return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _open(self):
+        if self.breaker is None:
+            return self._connect()
+        with self.breaker.guard(unavailable):
+            return self._connect()
+
+    def get_connection(self):
+        """Check a connection out of the pool, waiting up to the timeout"""
+        if self.breaker is not None:
+            self.breaker.allow()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            self._check_fork()
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    observe('db_pool_checkout_seconds', time.monotonic() - start, outcome='timeout')
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            entry = self._idle.pop() if self._idle else None
+
+        try:
+            raw = None
+            while entry is not None:
+                raw, created_at, last_used_at = entry
+                if self._is_healthy(raw, created_at, last_used_at):
+                    break
+                self._discard(raw)
+                raw = None
+                with self._cond:
+                    entry = self._idle.pop() if self._idle else None
+            if raw is None:
+                raw = self._open()
+                created_at = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            observe('db_pool_checkout_seconds', time.monotonic() - start, outcome='error')
+            raise
+
+        observe('db_pool_checkout_seconds', time.monotonic() - start, outcome='ok')
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                elapsed = time.monotonic() - start
+                self._waits += 1
+                self._wait_time_total += elapsed
+                self._wait_time_max = max(self._wait_time_max, elapsed)
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at):
+        with self._cond:
+            if self._pid != os.getpid():
+                # Checked out before a fork; the new pool never counted it
+                return
+        healthy = True
+        try:
+            # Never hand the next caller a half-finished transaction
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+        if not healthy:
+            self._discard(raw)
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((raw, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        """Return counters useful for sizing the pool"""
+        with self._cond:
+            self._check_fork()
+            return {
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time_total, 6),
+                'wait_time_max': round(self._wait_time_max, 6),
+                'wait_time_avg': round(self._wait_time_total / self._waits, 6) if self._waits else 0.0,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'failed_health_checks': self._failed_health_checks,
+            }
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones are closed on release)"""
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(breaker=get_breaker('mysql'))
+    return _pool
+
+
+def get_connection():
+    return get_pool().get_connection()
+
+
+_replica_pools = None
+
+
+def get_replica_pools():
+    """{host: pool} for MYSQL_REPLICA_HOSTS, each with its own breaker, created on first use"""
+    global _replica_pools
+    if _replica_pools is None:
+        with _pool_lock:
+            if _replica_pools is None:
+                pools = {}
+                for address in MYSQL_REPLICA_HOSTS:
+                    host, _, port = address.partition(':')
+                    pools[address] = ConnectionPool(
+                        connect=functools.partial(connect, host=host, port=int(port) if port else None),
+                        size=REPLICA_POOL_SIZE, breaker=get_breaker(f"mysql:{address}"))
+                _replica_pools = pools
+    return _replica_pools
+
+
+def _after_fork_in_child():
+    # Recreate the lock too: another thread may have held it at fork time
+    global _pool_lock
+    _pool_lock = threading.Lock()
+    for pool in [_pool, *(_replica_pools or {}).values()]:
+        if pool is not None:
+            pool._cond = threading.Condition()
+            pool._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,111 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+
+from storage import get_storage
+
+# Rows pulled from the server per round trip while streaming
+EXPORT_CHUNK_SIZE = 1000
+
+# Exportable resources: table and the column date filters apply to
+EXPORT_RESOURCES = {
+    'enquiries': ('enquiries', 'timestamp'),
+    'quotations': ('quotations', 'timestamp'),
+    'loi-submissions': ('loi_submissions', 'submission_date'),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(resource, date_from=None, date_to=None):
+    """Yield lists of rows straight off an unbuffered, server-side cursor
+
+    A dedicated connection is used so a long export never holds a pool slot,
+    and rows are read from the socket a chunk at a time rather than all at
+    once, so memory stays flat regardless of table size.
+    """
+    table, ts_column = EXPORT_RESOURCES[resource]
+    where = []
+    params = []
+    if date_from:
+        where.append(f"{ts_column} >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append(f"{ts_column} < %s")
+        params.append(date_to)
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+
+    conn = get_storage().stream_connection()
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # Closing mid-stream (client went away) simply drops the connection
+        conn.close()
+
+
+def stream_ndjson(resources, date_from=None, date_to=None):
+    """One JSON object per line; a `_type` field tells resources apart"""
+    for resource in resources:
+        for rows in iter_rows(resource, date_from, date_to):
+            yield ''.join(
+                json.dumps(dict(row, _type=resource), default=_json_default) + '\n'
+                for row in rows
+            )
+
+
+def export_columns(resource):
+    """Column names of a resource's table, for the header of an export with no rows"""
+    table, _ = EXPORT_RESOURCES[resource]
+    conn = get_storage().connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {table} WHERE 1 = 0")
+        cursor.fetchall()
+        return [column[0] for column in cursor.description]
+    finally:
+        conn.close()
+
+
+def stream_csv(resource, date_from=None, date_to=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for rows in iter_rows(resource, date_from, date_to):
+        if not header_written:
+            writer.writerow(rows[0].keys())
+            header_written = True
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row.values()])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if not header_written:
+        writer.writerow(export_columns(resource))
+        yield buffer.getvalue()
@@ -0,0 +1,194 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify
+
+from ratelimit import client_ip
+from storage import get_storage
+
+# How long a response is replayed for, and how many are kept per process
+# (the in-process store only)
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '900'))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '10000'))
+# A claimed key whose request has not finished after this long (the worker
+# died) can be claimed again; until then retries wait for its response
+IDEMPOTENCY_LEASE = float(os.getenv('IDEMPOTENCY_LEASE', '60'))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv('IDEMPOTENCY_POLL_INTERVAL', '0.1'))
+# Also dedupe identical payloads sent without an Idempotency-Key header
+IDEMPOTENCY_HASH_PAYLOADS = os.getenv('IDEMPOTENCY_HASH_PAYLOADS', 'true').lower() in ('1', 'true', 'yes')
+
+KEY_REUSED = "Idempotency-Key was already used with a different request body"
+
+
+class IdempotencyStore:
+    """Bounded, in-process TTL store of finished responses, for tests
+
+    Each worker process has its own, so a retry landing on another worker is
+    not deduplicated; deployments use DatabaseIdempotencyStore.
+
+    Entries are kept in insertion order so both expiry and LRU-style
+    eviction pop from the front. A key that is still being processed holds
+    an Event so a concurrent retry waits for the first response instead of
+    doing the work a second time.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_entries=IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, fingerprint, body, status)
+        self._in_flight = {}  # key -> (Event, fingerprint)
+
+    def _evict(self, now):
+        while self._entries:
+            key, (expires_at, _, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def begin(self, key, fingerprint=None):
+        """Return ('replay', (body, status)), ('mismatch', None) or ('run', None) after claiming the key"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._evict(now)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[1] != fingerprint:
+                        return 'mismatch', None
+                    return 'replay', entry[2:]
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    self._in_flight[key] = (threading.Event(), fingerprint)
+                    return 'run', None
+                event, claimed = in_flight
+                if claimed != fingerprint:
+                    return 'mismatch', None
+            event.wait(30)
+
+    def finish(self, key, body=None, status=None):
+        """Store the response (or just release the key when body is None)"""
+        with self._lock:
+            in_flight = self._in_flight.pop(key, None)
+            if body is not None and in_flight is not None:
+                self._entries[key] = (time.monotonic() + self.ttl, in_flight[1], body, status)
+                self._entries.move_to_end(key)
+                self._evict(time.monotonic())
+        if in_flight is not None:
+            in_flight[0].set()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DatabaseIdempotencyStore:
+    """Finished responses in the idempotency_keys table, shared by every worker
+
+    A request claims its key by inserting the row before doing the work; a
+    concurrent retry, in any process, finds the row without a response and
+    polls until the first request finishes or its lease runs out. Expired
+    rows are removed by the retention job.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, lease=IDEMPOTENCY_LEASE, poll_interval=IDEMPOTENCY_POLL_INTERVAL):
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def begin(self, key, fingerprint=None):
+        """Return ('replay', (body, status)), ('mismatch', None) or ('run', None) after claiming the key"""
+        key_hash, fingerprint = self._hash(key), fingerprint or ''
+        while True:
+            now = datetime.datetime.now()
+            claimed, row = get_storage().claim_idempotency_key(
+                key_hash, fingerprint, now, now + datetime.timedelta(seconds=self.lease))
+            if claimed:
+                return 'run', None
+            if row is None:
+                continue
+            if row['request_hash'] != fingerprint:
+                return 'mismatch', None
+            if row['status'] is not None:
+                return 'replay', (json.loads(row['response_body']), row['status'])
+            time.sleep(self.poll_interval)
+
+    def finish(self, key, body=None, status=None):
+        """Store the response (or just release the key when body is None)"""
+        if body is None:
+            get_storage().finish_idempotency_key(self._hash(key))
+        else:
+            get_storage().finish_idempotency_key(
+                self._hash(key), status, json.dumps(body, default=str),
+                datetime.datetime.now() + datetime.timedelta(seconds=self.ttl))
+
+
+store = DatabaseIdempotencyStore()
+
+
+def payload_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def make_key(path, client, header, payload):
+    """(key, payload fingerprint) for a submission, None if it is not deduplicated
+
+    The key is the Idempotency-Key header if given, otherwise a hash of the
+    JSON payload, scoped to the client and path so two clients choosing the
+    same key never see each other's responses.
+    """
+    fingerprint = payload_hash(payload)
+    if header:
+        return f"{client}:{path}:key:{header}", fingerprint
+    if not IDEMPOTENCY_HASH_PAYLOADS or payload is None:
+        return None
+    return f"{client}:{path}:hash:{fingerprint}", fingerprint
+
+
+def request_key():
+    return make_key(request.path, client_ip(), request.headers.get('Idempotency-Key'),
+                    request.get_json(silent=True))
+
+
+def idempotent(f):
+    """Replay the first successful response for repeated submissions
+
+    Only 2xx responses are remembered: a failed attempt may be retried. A
+    key reused with a different payload is refused with 422.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scoped = request_key()
+        if scoped is None:
+            return f(*args, **kwargs)
+        key, fingerprint = scoped
+
+        action, stored = store.begin(key, fingerprint)
+        if action == 'mismatch':
+            return jsonify({"error": KEY_REUSED}), 422
+        if action == 'replay':
+            body, status = stored
+            response = jsonify(body)
+            response.status_code = status
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        body = status = None
+        try:
+            result = f(*args, **kwargs)
+            response, status = result if isinstance(result, tuple) else (result, result.status_code)
+            if 200 <= status < 300:
+                body = response.get_json()
+            return result
+        finally:
+            store.finish(key, body, status)
+    return decorated_function
@@ -0,0 +1,208 @@
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Records waiting for the writer thread; beyond this they are dropped
+# (and counted) rather than blocking a request
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Fraction of fast, successful requests that get an access log line;
+# errors and slow requests are always logged
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+LOG_SLOW_REQUEST_MS = float(os.getenv('LOG_SLOW_REQUEST_MS', '1000'))
+# Any field whose name contains one of these is replaced before it is written,
+# as is the value after such a name in the message or traceback text
+# ("bank" covers an LOI's bankName, bankAddress, bankOfficerName, bankPhone...)
+LOG_REDACT_KEYS = [key.strip().lower() for key in
+                   os.getenv('LOG_REDACT_KEYS', 'password,secret,token,authorization,account,iban,swift,card,bank')
+                   .split(',') if key.strip()]
+
+REDACTED = '[REDACTED]'
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# name: value or name=value, as in a dict repr, JSON, a query string or kwargs
+_NAMED_VALUE = re.compile(
+    r"""(?P<name>["']?(?P<key>[A-Za-z_][\w-]*)["']?\s*[:=]\s*)"""
+    r"""(?P<value>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[^\s,;&}\])]+)""")
+
+
+def sensitive(key):
+    return any(part in str(key).lower() for part in LOG_REDACT_KEYS)
+
+
+def redact(value):
+    """Copy of `value` with sensitive dict entries (and named values in strings) masked, at any depth"""
+    if isinstance(value, dict):
+        return {key: REDACTED if sensitive(key) else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def redact_text(text):
+    """`text` with the value after each sensitive name masked"""
+    return _NAMED_VALUE.sub(
+        lambda match: match['name'] + REDACTED if sensitive(match['key']) else match[0], text)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; `extra={'fields': {...}}` adds keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': redact_text(record.getMessage()),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_info:
+            entry['exc'] = redact_text(self.formatException(record.exc_info))
+        elif record.exc_text:
+            entry['exc'] = redact_text(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a writer thread; never waits on a full queue
+
+    The writer (a QueueListener) is started lazily in whichever process is
+    logging, so forked workers get their own thread and queue.
+    """
+
+    def __init__(self, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid != os.getpid():
+                if self._listener_pid is not None:
+                    # Forked: the parent's queue and thread are not ours
+                    self.queue = queue.Queue(self.maxsize)
+                writer = logging.StreamHandler(sys.stdout)
+                writer.setFormatter(JSONFormatter())
+                self._listener = logging.handlers.QueueListener(self.queue, writer)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # Resolve everything tied to this thread (message args, traceback,
+        # request id) now; JSON encoding happens on the writer thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context() and not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id')
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"Dropped {dropped} log records: queue full"}))
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+
+
+_handler = None
+
+
+def configure_logging():
+    """Route every logger through the non-blocking JSON handler (once)"""
+    global _handler
+    if _handler is not None:
+        return _handler
+    _handler = NonBlockingQueueHandler()
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    atexit.register(_handler.stop)
+    return _handler
+
+
+access_log = logging.getLogger('access')
+
+
+def request_id_from(incoming):
+    """The caller's X-Request-ID if it is well formed, otherwise a new one"""
+    return incoming if incoming and _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+def log_access(method, path, route, status, duration_ms, request_id=None):
+    """One access log line; fast successful requests are sampled"""
+    notable = status >= 400 or duration_ms >= LOG_SLOW_REQUEST_MS
+    if not notable and random.random() >= LOG_SAMPLE_RATE:
+        return
+    extra = {
+        'fields': {
+            'method': method,
+            'path': path,
+            'route': route,
+            'status': status,
+            'duration_ms': round(duration_ms, 2),
+            'sampled': not notable and LOG_SAMPLE_RATE < 1,
+        },
+    }
+    if request_id:
+        extra['request_id'] = request_id
+    level = logging.WARNING if status >= 500 else logging.INFO
+    access_log.log(level, "%s %s %s", method, path, status, extra=extra)
+
+
+def init_app(app):
+    """JSON logging plus a request id and a (sampled) access log line per request"""
+    configure_logging()
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request_id_from(request.headers.get('X-Request-ID', ''))
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = g.pop('log_started', None)
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        if started is not None:
+            log_access(request.method, request.path, request.url_rule.rule if request.url_rule else None,
+                       response.status_code, (time.perf_counter() - started) * 1000)
+        return response
@@ -0,0 +1,249 @@
+import os
+import smtplib
+import socket
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from breaker import get_breaker
+from metrics import timed
+
+load_dotenv()
+
+# Session settings
+SMTP_CONNECT_TIMEOUT = float(os.getenv('SMTP_CONNECT_TIMEOUT', '10'))
+SMTP_SEND_TIMEOUT = float(os.getenv('SMTP_SEND_TIMEOUT', '30'))
+# Ceiling on one message, reconnect and retry included; the session is cut
+# when it passes, however slowly the server keeps answering
+SMTP_TOTAL_TIMEOUT = float(os.getenv('SMTP_TOTAL_TIMEOUT', '60'))
+# Skip the NOOP liveness probe if the session was used this recently
+SMTP_NOOP_INTERVAL = float(os.getenv('SMTP_NOOP_INTERVAL', '15'))
+# Close sessions idle for longer than this; most servers drop them anyway
+SMTP_MAX_IDLE = float(os.getenv('SMTP_MAX_IDLE', '240'))
+# Start a fresh session after this many messages (provider per-session caps)
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.getenv('SMTP_MAX_MESSAGES_PER_SESSION', '100'))
+# Set to false only for local SMTP sinks (benchmarks, development)
+SMTP_TLS = os.getenv('SMTP_TLS', 'true').lower() in ('1', 'true', 'yes')
+
+
+def unavailable(e):
+    """True when the mail server is down or unreachable, not when it refused one message"""
+    if isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code == 421
+    # Other SMTPExceptions (refused recipients, bad credentials) are OSErrors too
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+def retryable(e):
+    """True when a send failed because the session died, so a new session may succeed"""
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        # 421 is how servers say "session over"
+        return e.smtp_code == 421
+    # A permanent refusal (recipients, 554 on DATA) would only be refused again
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+class Mailer:
+    """A reusable, authenticated SMTP session for one mail server
+
+    The session is opened on first use and kept alive between sends; a NOOP
+    probe detects sessions the server has dropped, and a failed send on a
+    stale session is retried once over a new connection. With a circuit
+    breaker, sends fail fast with CircuitOpenError while the server is down.
+    """
+
+    def __init__(self, host, port, username, password, use_ssl=False, starttls=False,
+                 connect_timeout=SMTP_CONNECT_TIMEOUT, send_timeout=SMTP_SEND_TIMEOUT,
+                 total_timeout=SMTP_TOTAL_TIMEOUT, name='smtp', breaker=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.total_timeout = total_timeout
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self._server = None
+        self._pid = None
+        self._last_used = 0.0
+        self._sent_on_session = 0
+        self.connects = 0
+
+    def _open(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.connect_timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.connect_timeout)
+            if self.starttls:
+                server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        # The connect timeout covers the handshake; sends get their own budget
+        if server.sock is not None:
+            server.sock.settimeout(self.send_timeout)
+        self._server = server
+        self._pid = os.getpid()
+        self._last_used = time.monotonic()
+        self._sent_on_session = 0
+        self.connects += 1
+
+    def _close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _drop(self):
+        """Close a broken session's socket; no QUIT, the server is not listening"""
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _session(self):
+        """Return a live session, reconnecting when needed"""
+        if self._server is not None and self._pid != os.getpid():
+            # Inherited across fork: the parent still owns that socket
+            self._server = None
+        if self._server is not None:
+            idle = time.monotonic() - self._last_used
+            if idle > SMTP_MAX_IDLE or self._sent_on_session >= SMTP_MAX_MESSAGES_PER_SESSION:
+                self._close()
+            elif idle > SMTP_NOOP_INTERVAL:
+                try:
+                    if self._server.noop()[0] != 250:
+                        self._close()
+                except Exception:
+                    self._drop()
+        if self._server is None:
+            self._open()
+        return self._server
+
+    def _abort(self):
+        """Cut the current session from the watchdog thread; the blocked send fails at once"""
+        server = self._server
+        if server is not None and server.sock is not None:
+            try:
+                server.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _deliver(self, msg):
+        deadline = time.monotonic() + self.total_timeout
+        watchdog = threading.Timer(self.total_timeout, self._abort)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            with timed('smtp_send_duration_seconds', transport=self.name):
+                try:
+                    self._session().send_message(msg)
+                except Exception as e:
+                    if not retryable(e):
+                        raise
+                    self._drop()
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"SMTP send took longer than {self.total_timeout}s") from e
+                    self._session().send_message(msg)
+        except Exception as e:
+            if unavailable(e):
+                # Never reuse a session that failed mid-conversation
+                self._drop()
+            raise
+        finally:
+            watchdog.cancel()
+        self._last_used = time.monotonic()
+        self._sent_on_session += 1
+
+    def _send_one(self, msg):
+        if self.breaker is None:
+            return self._deliver(msg)
+        with self.breaker.call(unavailable):
+            return self._deliver(msg)
+
+    def send(self, msg):
+        """Send one message over the shared session"""
+        with self._lock:
+            self._send_one(msg)
+
+    def send_many(self, messages):
+        """Send a backlog over one session; returns an exception (or None) per message"""
+        results = []
+        with self._lock:
+            for msg in messages:
+                try:
+                    self._send_one(msg)
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+# Transports: "notification" is the internal mailbox on EMAIL_HOST (SSL),
+# "smtp" is the STARTTLS relay configured through SMTP_SERVER.
+TRANSPORT_NOTIFICATION = 'notification'
+TRANSPORT_SMTP = 'smtp'
+
+_mailers = {}
+_mailers_lock = threading.Lock()
+
+
+def _build_mailer(transport):
+    if transport == TRANSPORT_NOTIFICATION:
+        return Mailer(os.getenv('EMAIL_HOST', 'mail.roodan.ae'), int(os.getenv('EMAIL_PORT', '465')),
+                      os.getenv('EMAIL_USER'), os.getenv('EMAIL_PASSWORD'), use_ssl=SMTP_TLS, name=transport,
+                      breaker=get_breaker(f"mail:{transport}"))
+    if transport == TRANSPORT_SMTP:
+        return Mailer(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT', 587)),
+                      os.getenv('SMTP_USERNAME'), os.getenv('SMTP_PASSWORD'), starttls=SMTP_TLS, name=transport,
+                      breaker=get_breaker(f"mail:{transport}"))
+    raise ValueError(f"Unknown mail transport: {transport}")
+
+
+def get_mailer(transport):
+    """Return the process-wide mailer for a transport"""
+    mailer = _mailers.get(transport)
+    if mailer is None:
+        with _mailers_lock:
+            mailer = _mailers.get(transport)
+            if mailer is None:
+                mailer = _mailers[transport] = _build_mailer(transport)
+    return mailer
+
+
+def from_address(transport):
+    """The envelope sender each transport is authorised to use"""
+    if transport == TRANSPORT_NOTIFICATION:
+        return os.getenv('EMAIL_USER')
+    return os.getenv('FROM_EMAIL')
+
+
+def _after_fork_in_child():
+    # Sessions and locks inherited from the parent are not ours to use
+    global _mailers_lock
+    _mailers_lock = threading.Lock()
+    _mailers.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,298 @@
+import atexit
+import glob
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, request, session, g
+
+log = logging.getLogger(__name__)
+
+# Directory shared by every worker process; each writes its own snapshot
+# there and /metrics sums them. A worker's file goes when it exits (or, if it
+# was killed, at the next scrape), so the totals reset like any restarted
+# process's would. Unset: /metrics reports this process only.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Bearer token for scrapers; without one only a logged-in admin can read /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': "Time to produce a response, by route, method and status",
+    'db_pool_checkout_seconds': "Time to check a connection out of the pool, including waits",
+    'db_query_duration_seconds': "Cursor execute time, by table, operation and outcome",
+    'smtp_send_duration_seconds': "Time to hand one message to the mail server, by transport and outcome",
+}
+
+
+class Registry:
+    """Histograms for one process, keyed by (name, sorted label pairs)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name, seconds, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += seconds
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[name, list(labels), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self._histograms.items()]
+
+
+registry = Registry()
+# Snapshot file for this process; a new one after fork so children never
+# overwrite (or inherit) the parent's counts
+_snapshot_name = None
+
+
+def _new_snapshot_name():
+    return f"{os.getpid()}-{time.time_ns()}.json"
+
+
+def _snapshot_pid(path):
+    try:
+        return int(os.path.basename(path).split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+def _remove_snapshot():
+    """Delete this process's snapshot; its counts leave the totals"""
+    if METRICS_DIR and _snapshot_name:
+        try:
+            os.remove(os.path.join(METRICS_DIR, _snapshot_name))
+        except FileNotFoundError:
+            pass
+
+
+def _after_fork_in_child():
+    global registry, _snapshot_name
+    registry = Registry()
+    _snapshot_name = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_remove_snapshot)
+
+
+def observe(name, seconds, **labels):
+    registry.observe(name, seconds, labels)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the block, labelled outcome=ok or error"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        registry.observe(name, time.perf_counter() - start, dict(labels, outcome=outcome))
+
+
+# Table and statement type for db_query_duration_seconds
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+`?(\w+)', re.IGNORECASE)
+
+
+def describe_query(sql):
+    match = _TABLE.search(sql)
+    operation = sql.lstrip(' \n(').split(None, 1)[0].upper() if sql.strip() else ''
+    return (match.group(1) if match else 'none'), operation
+
+
+class InstrumentedCursor:
+    """Times execute/executemany; everything else passes straight through"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        table, operation = describe_query(sql)
+        with timed('db_query_duration_seconds', table=table, operation=operation):
+            return self._cursor.execute(sql, params, *args, **kwargs)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        table, operation = describe_query(sql)
+        with timed('db_query_duration_seconds', table=table, operation=operation):
+            return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR"""
+    global _snapshot_name
+    if not METRICS_DIR:
+        return
+    _snapshot_name = _snapshot_name or _new_snapshot_name()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, _snapshot_name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def collect():
+    """Histograms summed over every process that has written a snapshot"""
+    if METRICS_DIR:
+        flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+            pid = _snapshot_pid(path)
+            if pid is not None and not _pid_alive(pid):
+                # A worker that died without cleaning up after itself
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # being replaced right now; picked up next scrape
+    else:
+        snapshots = [registry.snapshot()]
+
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, counts, total, count in snapshot:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            entry = merged.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+    return merged
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """Prometheus text exposition format"""
+    merged = collect()
+    lines = []
+    for name, help_text in HISTOGRAMS.items():
+        series = sorted((labels, entry) for (metric, labels), entry in merged.items() if metric == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_label_text(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsFlusher(threading.Thread):
+    """Writes this process's snapshot every METRICS_FLUSH_INTERVAL seconds"""
+
+    def __init__(self, interval=METRICS_FLUSH_INTERVAL):
+        super().__init__(name='metrics-flusher', daemon=True)
+        self.interval = interval
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                flush()
+            except Exception:
+                log.exception("Error writing metrics snapshot")
+
+
+_flusher = None
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def start_flusher():
+    """Start the snapshot writer once per process (only with METRICS_DIR)"""
+    global _flusher, _flusher_pid
+    if not METRICS_DIR:
+        return
+    if _flusher is not None and _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher is None or _flusher_pid != os.getpid():
+            _flusher = MetricsFlusher()
+            _flusher_pid = os.getpid()
+            _flusher.start()
+
+
+def _authorized():
+    if METRICS_TOKEN:
+        header = request.headers.get('Authorization', '')
+        if hmac.compare_digest(header.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return True
+    return bool(session.get('admin_logged_in'))
+
+
+def init_app(app):
+    """Time every request and serve /metrics"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            observe('http_request_duration_seconds', time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not _authorized():
+            return Response("Unauthorized\n", status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer'})
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,147 @@
+import datetime
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+
+from dotenv import load_dotenv
+from db_pool import connect
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Migration files are named NNNN_description.sql and applied in that order.
+# A NNNN_description.py file is used when data has to be transformed in
+# Python; it defines upgrade(conn).
+MIGRATION_FILE = re.compile(r'^(\d{4})_[a-z0-9_]+\.(sql|py)$')
+
+
+class MigrationError(Exception):
+    """Raised when the migration files or the database history are inconsistent"""
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Return [(version, name, path)] sorted by version"""
+    migrations = []
+    seen = set()
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = match.group(1)
+        if version in seen:
+            raise MigrationError(f"Duplicate migration version {version}")
+        seen.add(version)
+        migrations.append((version, filename, os.path.join(directory, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    """Split a migration file into statements, dropping -- comments"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    statements = [statement.strip() for statement in '\n'.join(lines).split(';')]
+    return [statement for statement in statements if statement]
+
+
+def load_python_migration(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(f"migration_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _checksum(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _ensure_history_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(16) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME NOT NULL
+    )
+    ''')
+
+
+def applied_migrations(conn):
+    """Return {version: checksum} for migrations already applied"""
+    cursor = conn.cursor()
+    _ensure_history_table(cursor)
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def pending_migrations(conn, directory=MIGRATIONS_DIR):
+    applied = applied_migrations(conn)
+    pending = []
+    for version, name, path in discover_migrations(directory):
+        if version in applied:
+            if applied[version] != _checksum(path):
+                raise MigrationError(f"Migration {name} was edited after being applied")
+            continue
+        pending.append((version, name, path))
+    return pending
+
+
+def apply_migrations(conn=None, target=None, directory=MIGRATIONS_DIR):
+    """Apply pending migrations up to and including `target`; returns their names
+
+    MySQL commits DDL implicitly, so each migration is recorded as soon as
+    its statements have run; a failure leaves earlier migrations applied.
+    """
+    own_conn = conn is None
+    conn = conn or connect()
+    # DDL on a large table can take far longer than any query
+    conn.read_timeout = None
+    try:
+        applied = []
+        cursor = conn.cursor()
+        for version, name, path in pending_migrations(conn, directory):
+            if target is not None and version > target:
+                break
+            if path.endswith('.py'):
+                load_python_migration(path).upgrade(conn)
+            else:
+                with open(path) as f:
+                    for statement in split_statements(f.read()):
+                        cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum, applied_at) VALUES (%s, %s, %s, %s)",
+                (version, name, _checksum(path), datetime.datetime.now())
+            )
+            conn.commit()
+            applied.append(name)
+        return applied
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'up'
+    if command == 'status':
+        conn = connect()
+        try:
+            applied = applied_migrations(conn)
+            for version, name, _ in discover_migrations():
+                print(f"{'applied' if version in applied else 'pending'}  {name}")
+        finally:
+            conn.close()
+    elif command == 'up':
+        target = argv[2] if len(argv) > 2 else None
+        names = apply_migrations(target=target)
+        print('\n'.join(f"applied  {name}" for name in names) or "Database is up to date")
+    else:
+        print("Usage: python migrate.py [status | up [VERSION]]")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,70 @@
+-- Baseline schema: the tables init_db() used to create directly.
+-- IF NOT EXISTS keeps this safe on databases created before migrations.
+
+CREATE TABLE IF NOT EXISTS enquiries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255),
+    email VARCHAR(255),
+    message TEXT,
+    ticket_no VARCHAR(50) UNIQUE,
+    expires_at DATETIME,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS quotations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    ticket_no VARCHAR(50) UNIQUE,
+    company VARCHAR(255),
+    name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    delivery VARCHAR(255),
+    message TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS loi_submissions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_name VARCHAR(255),
+    rep_name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    submission_date DATETIME,
+    loi_data TEXT
+);
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    transport VARCHAR(20) NOT NULL,
+    to_email VARCHAR(255) NOT NULL,
+    reply_to VARCHAR(255),
+    subject VARCHAR(255),
+    text_body MEDIUMTEXT,
+    html_body MEDIUMTEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME,
+    INDEX idx_outbox_due (status, next_attempt_at)
+);
+
+CREATE TABLE IF NOT EXISTS retention_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    started_at DATETIME NOT NULL,
+    rows_purged INT NOT NULL,
+    duration_ms INT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS admin_users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(255) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
@@ -0,0 +1,20 @@
+-- Indexes for the queries the app actually runs.
+--
+-- (timestamp, id) / (submission_date, id): admin list pages seek and sort on
+--   these (pagination.fetch_page) and the stats query counts recent rows.
+-- expires_at: the retention job deletes expired rows in expires_at order.
+-- email: looking a customer up by address.
+-- (product, timestamp): per-product stats are answered from the index alone.
+
+CREATE INDEX idx_enquiries_timestamp_id ON enquiries (timestamp, id);
+CREATE INDEX idx_enquiries_expires_at ON enquiries (expires_at);
+CREATE INDEX idx_enquiries_email ON enquiries (email);
+
+CREATE INDEX idx_quotations_timestamp_id ON quotations (timestamp, id);
+CREATE INDEX idx_quotations_expires_at ON quotations (expires_at);
+CREATE INDEX idx_quotations_email ON quotations (email);
+CREATE INDEX idx_quotations_product ON quotations (product, timestamp);
+
+CREATE INDEX idx_loi_submissions_date_id ON loi_submissions (submission_date, id);
+CREATE INDEX idx_loi_submissions_email ON loi_submissions (email);
+CREATE INDEX idx_loi_submissions_product ON loi_submissions (product, submission_date);
@@ -0,0 +1,7 @@
+-- FULLTEXT indexes behind /admin/api/search. Ticket-number prefix matches
+-- use the existing UNIQUE ticket_no indexes and exact email lookups use the
+-- email indexes from 0002.
+
+CREATE FULLTEXT INDEX ft_enquiries ON enquiries (name, email, message);
+CREATE FULLTEXT INDEX ft_quotations ON quotations (company, name, email, product);
+CREATE FULLTEXT INDEX ft_loi_submissions ON loi_submissions (company_name, rep_name, email, product);
@@ -0,0 +1,12 @@
+-- Tombstones for the admin changes feed: deletes leave a row here so a
+-- client holding an older cursor learns which rows to drop. Tombstones
+-- expire themselves through the retention job.
+
+CREATE TABLE deleted_rows (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    resource VARCHAR(32) NOT NULL,
+    row_id INT NOT NULL,
+    deleted_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_deleted_rows_expires_at (expires_at)
+);
@@ -0,0 +1,67 @@
+"""Store loi_data as native JSON and index the fields admins filter on
+
+Older rows hold str(dict), a Python repr, so they are rewritten as JSON
+before the column type changes. Rows that are already valid JSON are left
+alone, which makes the backfill safe to re-run.
+"""
+import ast
+import json
+
+BATCH_SIZE = 500
+
+SCHEMA_CHANGES = [
+    """ALTER TABLE loi_submissions
+        MODIFY loi_data JSON,
+        ADD COLUMN bank_swift_code VARCHAR(64)
+            AS (LEFT(loi_data->>'$.bankSwiftCode', 64)) VIRTUAL,
+        ADD COLUMN delivery_port VARCHAR(255)
+            AS (LEFT(loi_data->>'$.deliveryPort', 255)) VIRTUAL,
+        ADD COLUMN payment_terms VARCHAR(255)
+            AS (LEFT(loi_data->>'$.paymentTerms', 255)) VIRTUAL""",
+    "CREATE INDEX idx_loi_submissions_bank_swift_code ON loi_submissions (bank_swift_code, submission_date)",
+    "CREATE INDEX idx_loi_submissions_delivery_port ON loi_submissions (delivery_port, submission_date)",
+    "CREATE INDEX idx_loi_submissions_payment_terms ON loi_submissions (payment_terms, submission_date)",
+]
+
+
+def to_json(text):
+    """JSON text for a stored loi_data value (repr, JSON or junk)"""
+    if text is None:
+        return None
+    try:
+        json.loads(text)
+        return text
+    except ValueError:
+        pass
+    try:
+        return json.dumps(ast.literal_eval(text), default=str)
+    except (ValueError, SyntaxError):
+        # Keep what was there rather than dropping the submission's data
+        return json.dumps({'unparsed': text})
+
+
+def backfill(conn):
+    cursor = conn.cursor()
+    last_id = 0
+    while True:
+        cursor.execute("SELECT id, loi_data FROM loi_submissions WHERE id > %s ORDER BY id LIMIT %s",
+                       (last_id, BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        updates = []
+        for row_id, text in rows:
+            converted = to_json(text)
+            if converted != text:
+                updates.append((converted, row_id))
+        if updates:
+            cursor.executemany("UPDATE loi_submissions SET loi_data = %s WHERE id = %s", updates)
+        conn.commit()
+        last_id = rows[-1][0]
+
+
+def upgrade(conn):
+    backfill(conn)
+    cursor = conn.cursor()
+    for statement in SCHEMA_CHANGES:
+        cursor.execute(statement)
@@ -0,0 +1,71 @@
+-- Archive tier for submissions. The retention job moves rows out of the
+-- hot tables in batches and into these, where they stay queryable from
+-- the admin API. The hot tables stay unpartitioned: MySQL allows neither
+-- FULLTEXT indexes (0003) nor a UNIQUE key without the partition column
+-- (ticket_no) on a partitioned table. The archives have neither, so they
+-- are compressed and partitioned by month; the retention job splits
+-- p_future into monthly partitions ahead of time and drops whole months
+-- once they are past ARCHIVE_RETENTION_MONTHS.
+
+CREATE TABLE enquiries_archive (
+    id INT NOT NULL,
+    name VARCHAR(255),
+    email VARCHAR(255),
+    message TEXT,
+    ticket_no VARCHAR(50),
+    expires_at DATETIME,
+    timestamp DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_enquiries_archive_timestamp_id (timestamp, id),
+    INDEX idx_enquiries_archive_email (email, timestamp),
+    INDEX idx_enquiries_archive_ticket_no (ticket_no)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE COLUMNS (timestamp) (
+    PARTITION p_before VALUES LESS THAN ('2000-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+CREATE TABLE quotations_archive (
+    id INT NOT NULL,
+    ticket_no VARCHAR(50),
+    company VARCHAR(255),
+    name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    delivery VARCHAR(255),
+    message TEXT,
+    expires_at DATETIME,
+    timestamp DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_quotations_archive_timestamp_id (timestamp, id),
+    INDEX idx_quotations_archive_email (email, timestamp),
+    INDEX idx_quotations_archive_ticket_no (ticket_no)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE COLUMNS (timestamp) (
+    PARTITION p_before VALUES LESS THAN ('2000-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+CREATE TABLE loi_submissions_archive (
+    id INT NOT NULL,
+    company_name VARCHAR(255),
+    rep_name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    loi_data JSON,
+    submission_date DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, submission_date),
+    INDEX idx_loi_submissions_archive_date_id (submission_date, id),
+    INDEX idx_loi_submissions_archive_email (email, submission_date)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE COLUMNS (submission_date) (
+    PARTITION p_before VALUES LESS THAN ('2000-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
@@ -0,0 +1,17 @@
+-- Responses replayed for repeated submissions (idempotency.py), shared by
+-- every worker process. key_hash is a SHA-256 of the client, path and key,
+-- request_hash one of the payload, so a key reused with another body can
+-- be refused. A row without a status is a claim whose request is still
+-- running. Expired rows are purged by the retention job.
+
+CREATE TABLE idempotency_keys (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    key_hash CHAR(64) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status SMALLINT,
+    response_body MEDIUMTEXT,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    UNIQUE INDEX uq_idempotency_keys_key_hash (key_hash),
+    INDEX idx_idempotency_keys_expires_at (expires_at)
+);
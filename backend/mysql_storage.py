@@ -0,0 +1,199 @@
+import datetime
+from contextlib import contextmanager
+
+from db_pool import connect, get_pool, get_replica_pools, replica_lag
+from migrate import apply_migrations
+from replicas import Replica, ReplicaSet
+from search import build_search
+from storage import Storage
+
+# One statement, one scan per table: ROLLUP gives the table total and the
+# per-product breakdown from the same GROUP BY, and the today / last 7 days
+# counts are conditional sums over the same rows. Products are grouped by
+# COALESCE(product, '') so only the ROLLUP row has a NULL product.
+STATS_QUERY = """
+(SELECT 'enquiries' AS resource, NULL AS product, COUNT(*) AS total,
+        SUM(timestamp >= %s) AS today, SUM(timestamp >= %s) AS last_7_days
+ FROM enquiries)
+UNION ALL
+(SELECT 'quotations', COALESCE(product, ''), COUNT(*),
+        SUM(timestamp >= %s), SUM(timestamp >= %s)
+ FROM quotations GROUP BY COALESCE(product, '') WITH ROLLUP)
+UNION ALL
+(SELECT 'loi_submissions', COALESCE(product, ''), COUNT(*),
+        SUM(submission_date >= %s), SUM(submission_date >= %s)
+ FROM loi_submissions GROUP BY COALESCE(product, '') WITH ROLLUP)
+"""
+
+# Each LOI row is rendered as JSON by MySQL, with loi_data embedded as-is, so
+# Python never parses or re-serializes the payloads. Dates use the same
+# HTTP-date format as jsonify. (%% because the query also takes parameters.)
+LOI_DOCUMENT = """id, submission_date, JSON_OBJECT(
+    'id', id, 'company_name', company_name, 'rep_name', rep_name, 'email', email,
+    'phone', phone, 'product', product, 'quantity', quantity,
+    'submission_date', DATE_FORMAT(submission_date, '%%a, %%d %%b %%Y %%H:%%i:%%s GMT'),
+    'loi_data', loi_data
+) AS document"""
+
+# Partitions of an archive table with their upper bounds, e.g.
+# "'2026-07-01 00:00:00'" or "MAXVALUE"
+PARTITIONS_QUERY = """SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL"""
+
+# Catches every row past the last monthly partition
+FUTURE_PARTITION = 'p_future'
+
+
+def month_start(moment):
+    return datetime.datetime(moment.year, moment.month, 1)
+
+
+def next_month(month):
+    return datetime.datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def parse_bound(description):
+    """A partition's upper bound as a datetime, None for MAXVALUE"""
+    if description == 'MAXVALUE':
+        return None
+    return datetime.datetime.fromisoformat(description.strip("'"))
+
+
+def partition_plan(bounds, before, upto):
+    """(partitions to drop, months to add) for a monthly-partitioned archive
+
+    `bounds` maps each partition to its upper bound (None for MAXVALUE).
+    Partitions wholly before `before` are dropped, and every month from
+    `before`'s to `upto`'s not yet below an existing bound gets a partition.
+    """
+    drop = [name for name, bound in bounds.items() if bound is not None and bound <= before]
+    last = max((bound for bound in bounds.values() if bound is not None), default=None)
+    add = []
+    month = month_start(before)
+    while month <= upto:
+        if last is None or next_month(month) > last:
+            add.append(month)
+        month = next_month(month)
+    return drop, add
+
+
+class MySQLStorage(Storage):
+    """The MySQL server behind the shared connection pool"""
+
+    loi_document = LOI_DOCUMENT
+
+    def __init__(self, connect=connect, pool=None, replicas=None):
+        self._connect = connect
+        self._pool = pool
+        self._replicas = replicas
+
+    def connection(self):
+        return (self._pool or get_pool()).get_connection()
+
+    def pool_stats(self):
+        return (self._pool or get_pool()).stats()
+
+    @property
+    def replicas(self):
+        if self._replicas is None:
+            self._replicas = ReplicaSet(Replica(address, pool.get_connection, replica_lag)
+                                        for address, pool in get_replica_pools().items())
+        return self._replicas
+
+    def stream_connection(self):
+        # Unpooled, so a long export never holds a pool slot
+        return self._connect()
+
+    def create_schema(self):
+        # Schema changes live in versioned files under migrations/
+        conn = self._connect()
+        try:
+            apply_migrations(conn)
+        finally:
+            conn.close()
+
+    def seconds_between(self, start, end):
+        return f"TIMESTAMPDIFF(SECOND, {start}, {end})"
+
+    @contextmanager
+    def exclusive(self, name):
+        # A session-level named lock, held by this connection until released
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (name,))
+            if cursor.fetchone()[0] != 1:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+                cursor.fetchone()
+        finally:
+            conn.close()
+
+    @contextmanager
+    def claim_outbox(self, limit, now):
+        conn = self.connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            # SKIP LOCKED lets several workers drain the queue without
+            # delivering the same message twice.
+            cursor.execute(
+                """SELECT * FROM email_outbox
+                WHERE status = 'pending' AND next_attempt_at <= %s
+                ORDER BY id LIMIT %s
+                FOR UPDATE SKIP LOCKED""",
+                (now, limit)
+            )
+            yield cursor, cursor.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+
+    def maintain_archive(self, table, before, upto):
+        # Expired months go as whole partitions, which is a metadata change
+        # rather than a DELETE, and empty months are split off p_future
+        # before rows arrive for them
+        archive = f"{table}_archive"
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(PARTITIONS_QUERY, (archive,))
+            bounds = {name: parse_bound(description) for name, description in cursor.fetchall()}
+            drop, add = partition_plan(bounds, before, upto)
+            if add:
+                months = ', '.join(
+                    f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{next_month(month):%Y-%m-%d}')" for month in add)
+                cursor.execute(f"""ALTER TABLE {archive} REORGANIZE PARTITION {FUTURE_PARTITION} INTO
+                    ({months}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))""")
+            removed = 0
+            if drop:
+                cursor.execute(f"SELECT COUNT(*) FROM {archive} PARTITION ({', '.join(drop)})")
+                removed = cursor.fetchone()[0]
+                cursor.execute(f"ALTER TABLE {archive} DROP PARTITION {', '.join(drop)}")
+            return removed
+        finally:
+            conn.close()
+
+    def stats_rows(self, today, week_ago):
+        conn = self.read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(STATS_QUERY, (today, week_ago) * 3)
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def search_rows(self, text, resources, limit):
+        sql, params = build_search(text, resources, limit)
+        if sql is None:
+            return []
+        conn = self.read_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            conn.close()
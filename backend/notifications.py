@@ -0,0 +1,125 @@
+HTML_TEMPLATE = 'email/notification.html'
+TEXT_TEMPLATE = 'email/notification.txt'
+
+# Compiled templates, filled in once by init_app()
+_templates = {}
+
+
+def init_app(app):
+    """Load and compile the email templates once, at startup
+
+    Holding the compiled Template objects means a render never goes back to
+    the loader (not even for the auto-reload mtime check).
+    """
+    for name in (HTML_TEMPLATE, TEXT_TEMPLATE):
+        _templates[name] = app.jinja_env.get_template(name)
+
+
+def render_notification(subject, heading, sections):
+    """Render both variants; `sections` is [(title, [(label, value), ...])]"""
+    context = {'heading': heading, 'sections': sections}
+    return {
+        'subject': subject,
+        'text_body': _templates[TEXT_TEMPLATE].render(context),
+        'html_body': _templates[HTML_TEMPLATE].render(context),
+    }
+
+
+def contact_notification(name, email, message):
+    return render_notification(
+        "New Contact Form Submission",
+        "New Contact Form Submission",
+        [
+            ("Contact Information", [("Name", name), ("Email", email)]),
+            ("Message", [("Message", message)]),
+        ],
+    )
+
+
+def _bank_rows(data):
+    return [
+        ("Bank Name", data.get('bankName')),
+        ("Bank SWIFT Code", data.get('bankSwiftCode')),
+        ("Bank Address", data.get('bankAddress')),
+        ("Account Name", data.get('accountName')),
+        ("Account Number", data.get('accountNumber')),
+        ("Bank Officer Name", data.get('bankOfficerName')),
+        ("Bank Officer Title", data.get('bankOfficerTitle')),
+        ("Bank Phone", data.get('bankPhone')),
+    ]
+
+
+def quote_notification(ticket_no, data):
+    return render_notification(
+        f"New Quote Request - Ticket #{ticket_no}",
+        "New Quote Request Received",
+        [
+            ("Buyer Information", [
+                ("Company Name", data.get('companyName')),
+                ("Representative Name", data.get('representativeName')),
+                ("Email", data.get('email')),
+                ("Phone", data.get('phone')),
+            ]),
+            ("Product Details", [
+                ("Product", data.get('productName')),
+                ("Quantity", data.get('quantity')),
+                ("Delivery Port", data.get('deliveryPort')),
+                ("Observations", data.get('observations')),
+            ]),
+            ("Payment Details", [("Payment Terms", data.get('paymentTerms'))]),
+            ("Buyer Bank Information", _bank_rows(data)),
+        ],
+    )
+
+
+def loi_notification(data):
+    return render_notification(
+        f"New LOI Submission from {data.get('companyName')}",
+        "New LOI Submission Received",
+        [
+            ("Company Information", [
+                ("Company Name", data.get('companyName')),
+                ("Representative Name", data.get('representativeName')),
+                ("Email", data.get('email')),
+                ("Phone", data.get('phone')),
+                ("Product", data.get('productName')),
+                ("Quantity", data.get('quantity')),
+            ]),
+            ("Bank Information", _bank_rows(data)),
+            ("Additional Information", [
+                ("Observations", data.get('observations')),
+                ("Specifications", data.get('specifications')),
+            ]),
+        ],
+    )
+
+
+def contact_batch_notification(enquiries):
+    """One summary email for a batch of enquiries"""
+    return render_notification(
+        f"{len(enquiries)} New Contact Form Submissions",
+        f"{len(enquiries)} New Contact Form Submissions",
+        [
+            (f"Enquiry {e['ticket_no']}", [("Name", e['name']), ("Email", e['email']), ("Message", e['message'])])
+            for e in enquiries
+        ],
+    )
+
+
+def quote_batch_notification(quotes):
+    """One summary email for a batch of quote requests; items are (ticket_no, data)"""
+    return render_notification(
+        f"{len(quotes)} New Quote Requests",
+        f"{len(quotes)} New Quote Requests Received",
+        [
+            (f"Ticket #{ticket_no}", [
+                ("Company Name", data.get('companyName')),
+                ("Representative Name", data.get('representativeName')),
+                ("Email", data.get('email')),
+                ("Product", data.get('productName')),
+                ("Quantity", data.get('quantity')),
+                ("Delivery Port", data.get('deliveryPort')),
+            ])
+            for ticket_no, data in quotes
+        ],
+    )
@@ -0,0 +1,203 @@
+import datetime
+import logging
+import os
+import threading
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from dotenv import load_dotenv
+# Plain module import: storage imports this module too
+import storage
+from breaker import CircuitOpenError
+from mailer import get_mailer, from_address
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Delivery settings
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '20'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '30'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_BACKOFF_BASE = int(os.getenv('OUTBOX_BACKOFF_BASE', '30'))
+OUTBOX_BACKOFF_MAX = int(os.getenv('OUTBOX_BACKOFF_MAX', '3600'))
+# "thread" runs the worker inside each web process, "off" leaves delivery to
+# a separate `python outbox.py` process.
+OUTBOX_WORKER = os.getenv('OUTBOX_WORKER', 'thread')
+
+
+def enqueue_statement(transport, to_email, subject, text_body=None, html_body=None, reply_to=None):
+    """(sql, params) queueing one email, for the caller to run in its transaction"""
+    return (
+        """INSERT INTO email_outbox
+        (transport, to_email, reply_to, subject, text_body, html_body, next_attempt_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        (transport, to_email, reply_to, subject, text_body, html_body, datetime.datetime.now())
+    )
+
+
+def enqueue_email(cursor, **notification):
+    """Queue an email using the caller's cursor, inside the caller's transaction"""
+    cursor.execute(*enqueue_statement(**notification))
+
+
+def build_message(row):
+    """Build the MIME message for an outbox row"""
+    msg = MIMEMultipart('alternative')
+    msg['From'] = from_address(row['transport'])
+    msg['To'] = row['to_email']
+    if row['reply_to']:
+        msg['Reply-To'] = row['reply_to']
+    msg['Subject'] = row['subject']
+    if row['text_body']:
+        msg.attach(MIMEText(row['text_body'], 'plain'))
+    if row['html_body']:
+        msg.attach(MIMEText(row['html_body'], 'html'))
+    return msg
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before the next attempt, doubling up to the cap"""
+    return min(OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)), OUTBOX_BACKOFF_MAX)
+
+
+def process_batch(limit=OUTBOX_BATCH_SIZE):
+    """Deliver up to `limit` due messages; returns the number handled"""
+    with storage.get_storage().claim_outbox(limit, datetime.datetime.now()) as (cursor, rows):
+        # Send each transport's backlog over its one persistent session
+        errors = {}
+        for transport in {row['transport'] for row in rows}:
+            batch = [row for row in rows if row['transport'] == transport]
+            try:
+                results = get_mailer(transport).send_many([build_message(row) for row in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for row, error in zip(batch, results):
+                errors[row['id']] = error
+
+        for row in rows:
+            attempts = row['attempts'] + 1
+            error = errors[row['id']]
+            if error is None:
+                cursor.execute(
+                    "UPDATE email_outbox SET status = 'sent', attempts = %s, sent_at = %s, last_error = NULL WHERE id = %s",
+                    (attempts, datetime.datetime.now(), row['id'])
+                )
+                continue
+            if isinstance(error, CircuitOpenError):
+                # Never reached the server: wait for the breaker without spending an attempt
+                cursor.execute(
+                    "UPDATE email_outbox SET last_error = %s, next_attempt_at = %s WHERE id = %s",
+                    (str(error), datetime.datetime.now() + datetime.timedelta(seconds=error.retry_after), row['id'])
+                )
+                continue
+            log.warning("Error delivering outbox message %s: %s", row['id'], error)
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                cursor.execute(
+                    "UPDATE email_outbox SET status = 'dead', attempts = %s, last_error = %s WHERE id = %s",
+                    (attempts, str(error), row['id'])
+                )
+            else:
+                retry_at = datetime.datetime.now() + datetime.timedelta(seconds=backoff_delay(attempts))
+                cursor.execute(
+                    "UPDATE email_outbox SET attempts = %s, last_error = %s, next_attempt_at = %s WHERE id = %s",
+                    (attempts, str(error), retry_at, row['id'])
+                )
+    return len(rows)
+
+
+def queue_stats():
+    """Queue depth per status and delivery lag, for the admin view"""
+    store = storage.get_storage()
+    conn = store.connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT status, COUNT(*) AS count FROM email_outbox GROUP BY status")
+        counts = {row['status']: row['count'] for row in cursor.fetchall()}
+
+        # Ids are issued in creation order, so the lowest pending id is the oldest
+        cursor.execute("SELECT created_at FROM email_outbox WHERE status = 'pending' ORDER BY id LIMIT 1")
+        row = cursor.fetchone()
+        oldest = row['created_at'] if row else None
+
+        cursor.execute(
+            f"""SELECT AVG({store.seconds_between('created_at', 'sent_at')}) AS avg_lag
+            FROM email_outbox WHERE status = 'sent' AND sent_at >= %s""",
+            (datetime.datetime.now() - datetime.timedelta(hours=1),)
+        )
+        avg_lag = cursor.fetchone()['avg_lag']
+
+        return {
+            'pending': counts.get('pending', 0),
+            'sent': counts.get('sent', 0),
+            'dead': counts.get('dead', 0),
+            'oldest_pending_age': (datetime.datetime.now() - oldest).total_seconds() if oldest else 0,
+            'avg_delivery_lag_last_hour': float(avg_lag) if avg_lag is not None else None,
+        }
+    finally:
+        conn.close()
+
+
+class OutboxWorker(threading.Thread):
+    """Background thread that drains the outbox"""
+
+    def __init__(self, poll_interval=OUTBOX_POLL_INTERVAL):
+        super().__init__(name='outbox-worker', daemon=True)
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                handled = process_batch()
+            except Exception:
+                log.exception("Error processing email outbox")
+                handled = 0
+            # A full batch means there is more backlog: go round again at once
+            if handled < OUTBOX_BATCH_SIZE:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Start the in-process worker once per process (threads do not survive fork)"""
+    global _worker, _worker_pid
+    if OUTBOX_WORKER != 'thread':
+        return
+    if _worker is not None and _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker is None or _worker_pid != os.getpid():
+            _worker = OutboxWorker()
+            _worker_pid = os.getpid()
+            _worker.start()
+
+
+def wake_worker():
+    """Ask the worker to deliver now instead of at its next poll"""
+    if _worker is not None and _worker_pid == os.getpid():
+        _worker.wake()
+
+
+if __name__ == '__main__':
+    # Standalone delivery process: python outbox.py
+    print("Starting email outbox worker...")
+    worker = OutboxWorker()
+    worker.start()
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,104 @@
+import base64
+import datetime
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed limit, cursor or date filter"""
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor pointing just past the row with this (timestamp, id)"""
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise PaginationError("Invalid cursor")
+
+
+def parse_date(value, name):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise PaginationError(f"Invalid '{name}' date, expected ISO 8601 (YYYY-MM-DD)")
+
+
+def parse_end_date(value, name):
+    """Exclusive upper bound for a 'to' filter; a plain YYYY-MM-DD includes that whole day"""
+    bound = parse_date(value, name)
+    try:
+        datetime.date.fromisoformat(value)
+    except ValueError:
+        return bound  # has a time of day: taken as given
+    return bound + datetime.timedelta(days=1)
+
+
+def parse_page_args(args):
+    """Read limit, cursor and the from/to date range from request args"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError("Invalid limit")
+    if limit < 1:
+        raise PaginationError("Invalid limit")
+
+    cursor = args.get('cursor')
+    date_from = args.get('from')
+    date_to = args.get('to')
+    return {
+        'limit': min(limit, MAX_PAGE_SIZE),
+        'after': decode_cursor(cursor) if cursor else None,
+        'date_from': parse_date(date_from, 'from') if date_from else None,
+        'date_to': parse_end_date(date_to, 'to') if date_to else None,
+    }
+
+
+def fetch_page(cursor, table, ts_column, page, columns='*', filters=None):
+    """Fetch one page, newest first, seeking on (ts_column, id)
+
+    Rows are located by seeking past the cursor rather than with OFFSET, so
+    page N costs the same as page 1. `cursor` must be a dictionary cursor;
+    `table`, `ts_column` and the `filters` keys are trusted identifiers,
+    never user input.
+    """
+    where = []
+    params = []
+    for column, value in (filters or {}).items():
+        where.append(f"{column} = %s")
+        params.append(value)
+    if page['after']:
+        ts, row_id = page['after']
+        where.append(f"({ts_column} < %s OR ({ts_column} = %s AND id < %s))")
+        params.extend([ts, ts, row_id])
+    if page['date_from']:
+        where.append(f"{ts_column} >= %s")
+        params.append(page['date_from'])
+    if page['date_to']:
+        where.append(f"{ts_column} < %s")
+        params.append(page['date_to'])
+
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Fetch one extra row to learn whether another page exists
+    sql += f" ORDER BY {ts_column} DESC, id DESC LIMIT %s"
+    params.append(page['limit'] + 1)
+
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > page['limit']:
+        rows = rows[:page['limit']]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[ts_column], last['id'])
+    return {'items': rows, 'next_cursor': next_cursor}
@@ -0,0 +1,192 @@
+import fcntl
+import hashlib
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import request, jsonify
+
+from db_pool import POOL_SIZE
+
+# "file" shares buckets between worker processes on this host through a
+# small fixed-size file; "memory" keeps them per process; "off" disables.
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'file')
+RATE_LIMIT_FILE = os.getenv('RATE_LIMIT_FILE', os.path.join(tempfile.gettempdir(), 'roodan-ratelimit.bin'))
+RATE_LIMIT_SLOTS = int(os.getenv('RATE_LIMIT_SLOTS', '65536'))
+
+# Sustained rate and burst size, per client IP and for the whole site
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '10'))
+RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', '5'))
+RATE_LIMIT_GLOBAL_PER_MINUTE = float(os.getenv('RATE_LIMIT_GLOBAL_PER_MINUTE', '300'))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv('RATE_LIMIT_GLOBAL_BURST', '60'))
+# Number of proxies in front of the app that append to X-Forwarded-For
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+
+# Submissions handled at once per process; beyond this requests are shed
+# with 503 instead of queueing for a pooled connection.
+MAX_CONCURRENT_SUBMISSIONS = int(os.getenv('MAX_CONCURRENT_SUBMISSIONS', str(POOL_SIZE)))
+
+
+TOO_MANY_REQUESTS = "Too many requests, please try again later"
+SERVER_BUSY = "Server busy, please try again shortly"
+
+
+def take(tokens, updated, rate, burst, cost, now):
+    """Token bucket step: returns (allowed, tokens, retry_after)
+
+    A cost above the burst size could never fit, so it goes through once the
+    bucket is full and leaves it in debt: the client still pays every token,
+    it just pays after the request rather than before.
+    """
+    needed = min(cost, burst)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= needed:
+        return True, tokens - cost, 0
+    return False, tokens, math.ceil((needed - tokens) / rate)
+
+
+class MemoryBackend:
+    """Buckets in a dict; limits apply per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def hit(self, key, rate, burst, cost=1):
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            allowed, tokens, retry_after = take(tokens, updated, rate, burst, cost, now)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > RATE_LIMIT_SLOTS:
+                # Forget buckets idle for an hour; they have long since refilled
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < 3600}
+            return allowed, retry_after
+
+
+class FileBackend:
+    """Buckets in fixed-size slots of a shared file, one byte-range lock each
+
+    A key hashes to a slot holding (fingerprint, tokens, updated). Two keys
+    that share a slot simply take it over from each other, so the file never
+    grows and needs no cleanup.
+    """
+
+    SLOT = struct.Struct('<8sdd')
+
+    def __init__(self, path=RATE_LIMIT_FILE, slots=RATE_LIMIT_SLOTS):
+        self.path = path
+        self.slots = slots
+        self._fd = None
+        self._pid = None
+
+    def _file(self):
+        # Reopen after fork so each process holds its own file description
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def hit(self, key, rate, burst, cost=1):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        fingerprint = digest[:8]
+        offset = int.from_bytes(digest[8:], 'little') % self.slots * self.SLOT.size
+        fd = self._file()
+        fcntl.lockf(fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+        try:
+            now = time.time()
+            raw = os.pread(fd, self.SLOT.size, offset)
+            tokens, updated = burst, now
+            if len(raw) == self.SLOT.size:
+                stored, stored_tokens, stored_updated = self.SLOT.unpack(raw)
+                if stored == fingerprint:
+                    tokens, updated = stored_tokens, stored_updated
+            allowed, tokens, retry_after = take(tokens, updated, rate, burst, cost, now)
+            os.pwrite(fd, self.SLOT.pack(fingerprint, tokens, now), offset)
+            return allowed, retry_after
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+
+
+def make_backend(name=RATE_LIMIT_BACKEND):
+    if name == 'off':
+        return None
+    if name == 'memory':
+        return MemoryBackend()
+    return FileBackend()
+
+
+backend = make_backend()
+_submission_slots = threading.BoundedSemaphore(MAX_CONCURRENT_SUBMISSIONS)
+
+
+def client_ip_from(access_route, remote_addr):
+    """The client address, skipping the hops added by trusted proxies"""
+    if RATE_LIMIT_TRUSTED_PROXIES:
+        # Each trusted proxy appends the address it received from
+        if len(access_route) >= RATE_LIMIT_TRUSTED_PROXIES:
+            return access_route[-RATE_LIMIT_TRUSTED_PROXIES]
+    return remote_addr or 'unknown'
+
+
+def client_ip():
+    return client_ip_from(request.access_route, request.remote_addr)
+
+
+def over_limit(ip, cost=1):
+    """Spend `cost` tokens from the client's and the global bucket
+
+    Returns the seconds to wait if either is empty, otherwise None.
+    """
+    if backend is None:
+        return None
+    allowed, retry_after = backend.hit(f"ip:{ip}", RATE_LIMIT_IP_PER_MINUTE / 60,
+                                       RATE_LIMIT_IP_BURST, cost)
+    if not allowed:
+        return max(1, retry_after)
+    allowed, retry_after = backend.hit("global", RATE_LIMIT_GLOBAL_PER_MINUTE / 60,
+                                       RATE_LIMIT_GLOBAL_BURST, cost)
+    if not allowed:
+        return max(1, retry_after)
+    return None
+
+
+def check_limits(cost=1):
+    """A 429 response if the client or the site is over its limit, else None"""
+    retry_after = over_limit(client_ip(), cost)
+    if retry_after is None:
+        return None
+    response = jsonify({"error": TOO_MANY_REQUESTS})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(cost=None):
+    """Throttle a public endpoint before it touches MySQL or SMTP
+
+    `cost` may be a callable returning how many tokens the request spends
+    (e.g. the item count of a batch). Requests over the per-process
+    concurrency cap are shed with 503 rather than queued.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limited = check_limits(cost() if cost else 1)
+            if limited is not None:
+                return limited
+            if not _submission_slots.acquire(blocking=False):
+                response = jsonify({"error": SERVER_BUSY})
+                response.status_code = 503
+                response.headers['Retry-After'] = '1'
+                return response
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _submission_slots.release()
+        return decorated_function
+    return decorator
@@ -0,0 +1,161 @@
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# A replica further behind the primary than this (seconds) takes no reads
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '5'))
+# How often each replica's lag is measured; reads in between trust the last value
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', '5'))
+# After a submission the client reads from the primary for this long. A
+# replica can trail by REPLICA_MAX_LAG plus however long ago it was checked,
+# so the default covers both.
+READ_YOUR_WRITES_WINDOW = float(os.getenv('READ_YOUR_WRITES_WINDOW',
+                                          str(REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL)))
+
+# Cookie holding the time (epoch seconds) until which reads go to the primary
+READ_YOUR_WRITES_COOKIE = 'read_primary_until'
+# Request header a client sends to read from the primary regardless
+READ_CONSISTENCY_HEADER = 'X-Read-Consistency'
+
+# The replica chosen for the current request, if any
+_current = ContextVar('replica', default=None)
+
+
+class Replica:
+    """A read-only copy of the database and how far it trails the primary
+
+    `connect()` returns a connection whose close() releases it, and
+    `lag(conn)` the seconds behind the primary, or None when replication is
+    not running.
+    """
+
+    def __init__(self, name, connect, lag, max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_LAG_CHECK_INTERVAL):
+        self.name = name
+        self.connection = connect
+        self._measure = lag
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checking = False
+        self._checked_at = None
+        self._lag = None
+        self._last_error = None
+
+    def _check(self):
+        try:
+            conn = self.connection()
+            try:
+                lag, error = self._measure(conn), None
+            finally:
+                conn.close()
+        except Exception as e:
+            lag, error = None, str(e)
+        if lag is None and error is None:
+            error = "replication is not running"
+        if error is not None:
+            log.warning("Replica %s skipped: %s", self.name, error)
+        with self._lock:
+            self._lag = lag
+            self._last_error = error
+            self._checked_at = time.monotonic()
+            self._checking = False
+
+    def usable(self):
+        """True if the last lag check found the replica within max_lag"""
+        with self._lock:
+            due = self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+            # One caller measures; the others use the previous result meanwhile
+            check = due and not self._checking
+            if check:
+                self._checking = True
+        if check:
+            self._check()
+        lag = self._lag
+        return lag is not None and lag <= self.max_lag
+
+    def failed(self, error):
+        """A checkout failed: take no reads until the next lag check"""
+        log.warning("Replica %s failed, reading from the primary: %s", self.name, error)
+        with self._lock:
+            self._lag = None
+            self._last_error = str(error)
+            self._checked_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'lag': self._lag,
+                'usable': self._lag is not None and self._lag <= self.max_lag,
+                'last_error': self._last_error,
+            }
+
+
+class ReplicaSet:
+    """The replicas reads can go to, taken in turn"""
+
+    def __init__(self, replicas=()):
+        self.replicas = list(replicas)
+        self._turn = itertools.count()
+
+    def __len__(self):
+        return len(self.replicas)
+
+    def choose(self):
+        """The next replica within its lag threshold, None if there is none"""
+        count = len(self.replicas)
+        if not count:
+            return None
+        start = next(self._turn)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if replica.usable():
+                return replica
+        return None
+
+    @contextmanager
+    def reading(self):
+        """Send read_connection() in this block to one replica, chosen once
+
+        Every read in the block sees the same copy, so an ETag and the body
+        it describes agree even when replicas trail by different amounts.
+        """
+        token = _current.set(self.choose())
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def snapshot(self):
+        return [replica.snapshot() for replica in self.replicas]
+
+
+def current_replica():
+    return _current.get()
+
+
+def read_your_writes_cookie(now=None):
+    """(name, value, max_age) of the cookie that sends a client's reads to the primary"""
+    until = (now or time.time()) + READ_YOUR_WRITES_WINDOW
+    return READ_YOUR_WRITES_COOKIE, str(math.ceil(until)), math.ceil(READ_YOUR_WRITES_WINDOW)
+
+
+def needs_primary(consistency, cookie, now=None):
+    """True when a read must see writes the client has just made"""
+    if (consistency or '').lower() == 'primary':
+        return True
+    try:
+        return float(cookie) > (now or time.time())
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,154 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from changes import CHANGE_RESOURCES
+from storage import ARCHIVE_COLUMNS, get_storage
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Rows leaving the submission tables are moved to their archive table
+# (see migrations/0006) rather than deleted
+RETENTION_ARCHIVE = os.getenv('RETENTION_ARCHIVE', 'true').lower() in ('1', 'true', 'yes')
+# LOI submissions never expire, but leave the hot table this long after submission
+LOI_ARCHIVE_AFTER_DAYS = int(os.getenv('LOI_ARCHIVE_AFTER_DAYS', '180'))
+# Whole months of archive older than this are dropped
+ARCHIVE_RETENTION_MONTHS = int(os.getenv('ARCHIVE_RETENTION_MONTHS', '24'))
+# Monthly archive partitions are created this far ahead (MySQL)
+ARCHIVE_MONTHS_AHEAD = int(os.getenv('ARCHIVE_MONTHS_AHEAD', '2'))
+
+# Tables with an expiry column, purged by the retention job
+RETENTION_TABLES = {
+    'enquiries': 'expires_at',
+    'quotations': 'expires_at',
+    'deleted_rows': 'expires_at',
+    'idempotency_keys': 'expires_at',
+}
+if RETENTION_ARCHIVE:
+    RETENTION_TABLES['loi_submissions'] = 'submission_date'
+
+# How long after its retention column a row leaves the table
+RETENTION_DELAY = {
+    'loi_submissions': datetime.timedelta(days=LOI_ARCHIVE_AFTER_DAYS),
+}
+
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '500'))
+# Pause between batches so inserts and admin reads can take the locks
+RETENTION_BATCH_PAUSE = float(os.getenv('RETENTION_BATCH_PAUSE', '0.05'))
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', '3600'))
+# "thread" runs the job inside the web process, "off" leaves it to cron
+# calling `python retention.py`.
+RETENTION_SCHEDULER = os.getenv('RETENTION_SCHEDULER', 'thread')
+
+# Named lock so only one worker process purges at a time
+RETENTION_LOCK_NAME = 'roodan_retention'
+
+
+def purge_expired(table, batch_size=RETENTION_BATCH_SIZE, now=None):
+    """Delete or archive expired rows of one table in bounded batches; returns rows purged"""
+    column = RETENTION_TABLES[table]
+    now = (now or datetime.datetime.now()) - RETENTION_DELAY.get(table, datetime.timedelta())
+    archive = RETENTION_ARCHIVE and table in ARCHIVE_COLUMNS
+    purged = 0
+    while True:
+        # Each batch is its own short transaction, so locks are held for
+        # one small DELETE rather than the whole purge. Tables in the change
+        # feed leave a tombstone per deleted row so dashboards holding a
+        # cursor can drop them too.
+        deleted = get_storage().purge_batch(table, column, now, batch_size,
+                                            tombstones=table in CHANGE_RESOURCES, archive=archive)
+        purged += deleted
+        if deleted < batch_size:
+            return purged
+        time.sleep(RETENTION_BATCH_PAUSE)
+
+
+def months_before(moment, months):
+    """The first of the month `months` months before `moment`'s"""
+    index = moment.year * 12 + moment.month - 1 - months
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def maintain_archive(table, now=None):
+    """Drop expired archive months of one table; returns rows removed"""
+    now = now or datetime.datetime.now()
+    return get_storage().maintain_archive(table, months_before(now, ARCHIVE_RETENTION_MONTHS),
+                                          months_before(now, -ARCHIVE_MONTHS_AHEAD))
+
+
+def run_retention():
+    """Purge every table once and record per-table metrics"""
+    storage = get_storage()
+    # Hold the lock for the whole run; other workers skip theirs
+    with storage.exclusive(RETENTION_LOCK_NAME) as acquired:
+        if not acquired:
+            return []
+
+        jobs = [(table, purge_expired, table) for table in RETENTION_TABLES]
+        jobs += [(f"{table}_archive", maintain_archive, table) for table in ARCHIVE_COLUMNS]
+        results = []
+        for name, job, table in jobs:
+            started_at = datetime.datetime.now()
+            start = time.monotonic()
+            rows_purged = job(table)
+            duration_ms = int((time.monotonic() - start) * 1000)
+            storage.record_retention_run(name, started_at, rows_purged, duration_ms)
+            results.append({
+                'table': name,
+                'rows_purged': rows_purged,
+                'duration_ms': duration_ms,
+            })
+        return results
+
+
+def recent_runs(limit=20):
+    return get_storage().recent_retention_runs(limit)
+
+
+class RetentionScheduler(threading.Thread):
+    """Runs the retention job every RETENTION_INTERVAL seconds"""
+
+    def __init__(self, interval=RETENTION_INTERVAL):
+        super().__init__(name='retention-scheduler', daemon=True)
+        self.interval = interval
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                run_retention()
+            except Exception:
+                log.exception("Error running retention job")
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler():
+    """Start the in-process scheduler once per process"""
+    global _scheduler, _scheduler_pid
+    if RETENTION_SCHEDULER != 'thread':
+        return
+    if _scheduler is not None and _scheduler_pid == os.getpid():
+        return
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler_pid != os.getpid():
+            _scheduler = RetentionScheduler()
+            _scheduler_pid = os.getpid()
+            _scheduler.start()
+
+
+if __name__ == '__main__':
+    # One-off run, e.g. from cron: python retention.py
+    for result in run_retention():
+        print(f"{result['table']}: purged {result['rows_purged']} rows in {result['duration_ms']} ms")
@@ -0,0 +1,82 @@
+import re
+
+from storage import get_storage
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# What each resource exposes to search, normalised to the same columns so
+# the per-table queries can be UNIONed and ranked together.
+SEARCH_RESOURCES = {
+    'enquiries': {
+        'table': 'enquiries',
+        'select': "id, ticket_no, NULL AS company, name, email, NULL AS product, timestamp AS created_at",
+        'fulltext': "name, email, message",
+        'ticket': True,
+    },
+    'quotations': {
+        'table': 'quotations',
+        'select': "id, ticket_no, company, name, email, product, timestamp AS created_at",
+        'fulltext': "company, name, email, product",
+        'ticket': True,
+    },
+    'loi_submissions': {
+        'table': 'loi_submissions',
+        'select': "id, NULL AS ticket_no, company_name AS company, rep_name AS name, email, product, submission_date AS created_at",
+        'fulltext': "company_name, rep_name, email, product",
+        'ticket': False,
+    },
+}
+
+TICKET_PATTERN = re.compile(r'^(QUOTE|ENQ)-[0-9A-Z-]*$', re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+$')
+# Characters with a meaning in BOOLEAN MODE; user input must not use them
+BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+# Exact ticket and email matches always outrank relevance scores
+EXACT_MATCH_SCORE = 1000
+
+
+def boolean_query(text):
+    """Every word must match, each as a prefix: 'urea jebel' -> '+urea* +jebel*'"""
+    words = BOOLEAN_OPERATORS.sub(' ', text).split()
+    return ' '.join(f"+{word}*" for word in words)
+
+
+def build_search(text, resources, limit):
+    """Return (sql, params) for one ranked UNION over the chosen resources"""
+    text = text.strip()
+    parts = []
+    params = []
+    for name in resources:
+        spec = SEARCH_RESOURCES[name]
+        head = f"SELECT '{name}' AS resource, {spec['select']}"
+        if TICKET_PATTERN.match(text):
+            if not spec['ticket']:
+                continue
+            # Prefix LIKE on the UNIQUE ticket_no index
+            parts.append(f"({head}, {EXACT_MATCH_SCORE} AS score FROM {spec['table']} "
+                         f"WHERE ticket_no LIKE %s ORDER BY ticket_no LIMIT %s)")
+            params.extend([text.upper() + '%', limit])
+        elif EMAIL_PATTERN.match(text):
+            parts.append(f"({head}, {EXACT_MATCH_SCORE} AS score FROM {spec['table']} "
+                         f"WHERE email = %s ORDER BY id DESC LIMIT %s)")
+            params.extend([text, limit])
+        else:
+            query = boolean_query(text)
+            if not query:
+                continue
+            match = f"MATCH({spec['fulltext']}) AGAINST (%s IN BOOLEAN MODE)"
+            parts.append(f"({head}, {match} AS score FROM {spec['table']} "
+                         f"WHERE {match} ORDER BY score DESC LIMIT %s)")
+            params.extend([query, query, limit])
+    if not parts:
+        return None, None
+    sql = " UNION ALL ".join(parts) + " ORDER BY score DESC, created_at DESC LIMIT %s"
+    params.append(limit)
+    return sql, params
+
+
+def search(text, resources=None, limit=SEARCH_DEFAULT_LIMIT):
+    """Ranked matches across enquiries, quotations and LOI submissions"""
+    return get_storage().search(text, resources or list(SEARCH_RESOURCES), limit)
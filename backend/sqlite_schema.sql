@@ -0,0 +1,210 @@
+-- Schema for the embedded SQLite backend (STORAGE_BACKEND=sqlite): the
+-- tables and indexes of migrations/0001-0006 in SQLite's dialect. Every
+-- statement is idempotent and the whole file runs on initialize(), so a new
+-- migration is mirrored here with IF NOT EXISTS statements.
+--
+-- AUTOINCREMENT matches MySQL in never reusing the id of a deleted row,
+-- which the change feed and ETags rely on. Dates are stored as ISO 8601
+-- text in local time, like MySQL's DATETIME, so they compare in order.
+
+CREATE TABLE IF NOT EXISTS enquiries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255),
+    email VARCHAR(255),
+    message TEXT,
+    ticket_no VARCHAR(50) UNIQUE,
+    expires_at DATETIME,
+    timestamp DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS quotations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_no VARCHAR(50) UNIQUE,
+    company VARCHAR(255),
+    name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    delivery VARCHAR(255),
+    message TEXT,
+    timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
+    expires_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS loi_submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_name VARCHAR(255),
+    rep_name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    submission_date DATETIME,
+    loi_data TEXT CHECK (loi_data IS NULL OR json_valid(loi_data)),
+    bank_swift_code VARCHAR(64)
+        GENERATED ALWAYS AS (substr(json_extract(loi_data, '$.bankSwiftCode'), 1, 64)) VIRTUAL,
+    delivery_port VARCHAR(255)
+        GENERATED ALWAYS AS (substr(json_extract(loi_data, '$.deliveryPort'), 1, 255)) VIRTUAL,
+    payment_terms VARCHAR(255)
+        GENERATED ALWAYS AS (substr(json_extract(loi_data, '$.paymentTerms'), 1, 255)) VIRTUAL
+);
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transport VARCHAR(20) NOT NULL,
+    to_email VARCHAR(255) NOT NULL,
+    reply_to VARCHAR(255),
+    subject VARCHAR(255),
+    text_body TEXT,
+    html_body TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at DATETIME,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    sent_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS retention_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name VARCHAR(64) NOT NULL,
+    started_at DATETIME NOT NULL,
+    rows_purged INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS admin_users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(255) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS deleted_rows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    resource VARCHAR(32) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key_hash CHAR(64) UNIQUE NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status SMALLINT,
+    response_body TEXT,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL
+);
+
+-- Archive tables (0006) are plain tables here; there are no partitions, so
+-- the retention job deletes expired archive rows instead of dropping months.
+
+CREATE TABLE IF NOT EXISTS enquiries_archive (
+    id INTEGER NOT NULL,
+    name VARCHAR(255),
+    email VARCHAR(255),
+    message TEXT,
+    ticket_no VARCHAR(50),
+    expires_at DATETIME,
+    timestamp DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS quotations_archive (
+    id INTEGER NOT NULL,
+    ticket_no VARCHAR(50),
+    company VARCHAR(255),
+    name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    delivery VARCHAR(255),
+    message TEXT,
+    expires_at DATETIME,
+    timestamp DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS loi_submissions_archive (
+    id INTEGER NOT NULL,
+    company_name VARCHAR(255),
+    rep_name VARCHAR(255),
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    product VARCHAR(255),
+    quantity VARCHAR(50),
+    loi_data TEXT,
+    submission_date DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, submission_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON email_outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_deleted_rows_expires_at ON deleted_rows (expires_at);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+
+CREATE INDEX IF NOT EXISTS idx_enquiries_timestamp_id ON enquiries (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_enquiries_expires_at ON enquiries (expires_at);
+CREATE INDEX IF NOT EXISTS idx_enquiries_email ON enquiries (email);
+
+CREATE INDEX IF NOT EXISTS idx_quotations_timestamp_id ON quotations (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_quotations_expires_at ON quotations (expires_at);
+CREATE INDEX IF NOT EXISTS idx_quotations_email ON quotations (email);
+CREATE INDEX IF NOT EXISTS idx_quotations_product ON quotations (product, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_date_id ON loi_submissions (submission_date, id);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_email ON loi_submissions (email);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_product ON loi_submissions (product, submission_date);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_bank_swift_code ON loi_submissions (bank_swift_code, submission_date);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_delivery_port ON loi_submissions (delivery_port, submission_date);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_payment_terms ON loi_submissions (payment_terms, submission_date);
+
+CREATE INDEX IF NOT EXISTS idx_enquiries_archive_timestamp_id ON enquiries_archive (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_enquiries_archive_email ON enquiries_archive (email, timestamp);
+CREATE INDEX IF NOT EXISTS idx_enquiries_archive_ticket_no ON enquiries_archive (ticket_no);
+CREATE INDEX IF NOT EXISTS idx_quotations_archive_timestamp_id ON quotations_archive (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_quotations_archive_email ON quotations_archive (email, timestamp);
+CREATE INDEX IF NOT EXISTS idx_quotations_archive_ticket_no ON quotations_archive (ticket_no);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_archive_date_id ON loi_submissions_archive (submission_date, id);
+CREATE INDEX IF NOT EXISTS idx_loi_submissions_archive_email ON loi_submissions_archive (email, submission_date);
+
+-- Full-text search: FTS5 indexes over the same columns as the FULLTEXT
+-- indexes of 0003, kept in step by triggers (rows are never updated in
+-- place, so inserts and deletes are all they need to follow).
+
+CREATE VIRTUAL TABLE IF NOT EXISTS ft_enquiries USING fts5(
+    name, email, message, content='enquiries', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS ft_enquiries_insert AFTER INSERT ON enquiries BEGIN
+    INSERT INTO ft_enquiries (rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS ft_enquiries_delete AFTER DELETE ON enquiries BEGIN
+    INSERT INTO ft_enquiries (ft_enquiries, rowid, name, email, message)
+    VALUES ('delete', old.id, old.name, old.email, old.message);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS ft_quotations USING fts5(
+    company, name, email, product, content='quotations', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS ft_quotations_insert AFTER INSERT ON quotations BEGIN
+    INSERT INTO ft_quotations (rowid, company, name, email, product)
+    VALUES (new.id, new.company, new.name, new.email, new.product);
+END;
+CREATE TRIGGER IF NOT EXISTS ft_quotations_delete AFTER DELETE ON quotations BEGIN
+    INSERT INTO ft_quotations (ft_quotations, rowid, company, name, email, product)
+    VALUES ('delete', old.id, old.company, old.name, old.email, old.product);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS ft_loi_submissions USING fts5(
+    company_name, rep_name, email, product, content='loi_submissions', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS ft_loi_submissions_insert AFTER INSERT ON loi_submissions BEGIN
+    INSERT INTO ft_loi_submissions (rowid, company_name, rep_name, email, product)
+    VALUES (new.id, new.company_name, new.rep_name, new.email, new.product);
+END;
+CREATE TRIGGER IF NOT EXISTS ft_loi_submissions_delete AFTER DELETE ON loi_submissions BEGIN
+    INSERT INTO ft_loi_submissions (ft_loi_submissions, rowid, company_name, rep_name, email, product)
+    VALUES ('delete', old.id, old.company_name, old.rep_name, old.email, old.product);
+END;
@@ -0,0 +1,313 @@
+import datetime
+import fcntl
+import functools
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from metrics import InstrumentedCursor
+from search import SEARCH_RESOURCES, TICKET_PATTERN, EMAIL_PATTERN, BOOLEAN_OPERATORS, EXACT_MATCH_SCORE
+from storage import Storage
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+# How long a writer waits for another process's write to finish
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+# Idle connections kept open per process for reuse
+SQLITE_MAX_IDLE = int(os.getenv('SQLITE_MAX_IDLE', '8'))
+# Claimed outbox rows are invisible to other workers for this long; if the
+# claiming worker dies they are retried once it has passed
+SQLITE_OUTBOX_LEASE = int(os.getenv('SQLITE_OUTBOX_LEASE', '300'))
+
+# Dates go in as ISO 8601 text and come back as datetimes from DATETIME columns
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_converter('DATETIME', lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+# Same shape as the MySQL document (see mysql_storage.LOI_DOCUMENT), with the
+# HTTP date spelled out since strftime has no day or month names
+LOI_DOCUMENT = """id, submission_date, json_object(
+    'id', id, 'company_name', company_name, 'rep_name', rep_name, 'email', email,
+    'phone', phone, 'product', product, 'quantity', quantity,
+    'submission_date', CASE WHEN submission_date IS NOT NULL THEN
+        substr('SunMonTueWedThuFriSat', 1 + 3 * strftime('%%w', submission_date), 3) || ', ' ||
+        strftime('%%d ', submission_date) ||
+        substr('JanFebMarAprMayJunJulAugSepOctNovDec', 3 * strftime('%%m', submission_date) - 2, 3) ||
+        strftime(' %%Y %%H:%%M:%%S GMT', submission_date) END,
+    'loi_data', json(loi_data)
+) AS document"""
+
+# No ROLLUP: the table totals are separate selects in the same statement
+STATS_QUERY = """
+SELECT 'enquiries', NULL, COUNT(*), SUM(timestamp >= %s), SUM(timestamp >= %s) FROM enquiries
+UNION ALL
+SELECT 'quotations', NULL, COUNT(*), SUM(timestamp >= %s), SUM(timestamp >= %s) FROM quotations
+UNION ALL
+SELECT 'quotations', COALESCE(product, ''), COUNT(*), SUM(timestamp >= %s), SUM(timestamp >= %s)
+FROM quotations GROUP BY COALESCE(product, '')
+UNION ALL
+SELECT 'loi_submissions', NULL, COUNT(*), SUM(submission_date >= %s), SUM(submission_date >= %s)
+FROM loi_submissions
+UNION ALL
+SELECT 'loi_submissions', COALESCE(product, ''), COUNT(*), SUM(submission_date >= %s), SUM(submission_date >= %s)
+FROM loi_submissions GROUP BY COALESCE(product, '')
+"""
+
+_PLACEHOLDER = re.compile(r'%([s%])')
+
+
+@functools.lru_cache(maxsize=256)
+def qmark(sql):
+    """Rewrite MySQL-style %s placeholders (and %% escapes) for sqlite3"""
+    return _PLACEHOLDER.sub(lambda match: '?' if match.group(1) == 's' else '%', sql)
+
+
+def fts_query(text):
+    """Every word must match, each as a prefix: 'urea jebel' -> '"urea"* "jebel"*'"""
+    words = BOOLEAN_OPERATORS.sub(' ', text).split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def build_search(text, resources, limit):
+    """Return (sql, params) for one ranked UNION over the chosen resources
+
+    The same three cases as search.build_search: ticket prefixes and
+    email addresses use their indexes, anything else goes to FTS5.
+    """
+    parts = []
+    params = []
+    for name in resources:
+        spec = SEARCH_RESOURCES[name]
+        table = spec['table']
+        head = f"SELECT '{name}' AS resource, {spec['select']}"
+        if TICKET_PATTERN.match(text):
+            if not spec['ticket']:
+                continue
+            # GLOB is case-sensitive, so it can range-scan the UNIQUE ticket_no index
+            parts.append(f"SELECT * FROM ({head}, {EXACT_MATCH_SCORE} AS score FROM {table} "
+                         f"WHERE ticket_no GLOB %s ORDER BY ticket_no LIMIT %s)")
+            params.extend([text.upper() + '*', limit])
+        elif EMAIL_PATTERN.match(text):
+            parts.append(f"SELECT * FROM ({head}, {EXACT_MATCH_SCORE} AS score FROM {table} "
+                         f"WHERE email = %s ORDER BY id DESC LIMIT %s)")
+            params.extend([text, limit])
+        else:
+            query = fts_query(text)
+            if not query:
+                continue
+            # bm25() is lower for better matches
+            parts.append(f"SELECT * FROM ({head}, rank AS score FROM {table} "
+                         f"JOIN (SELECT rowid AS match_id, -bm25(ft_{table}) AS rank FROM ft_{table} "
+                         f"WHERE ft_{table} MATCH %s) ON match_id = id ORDER BY score DESC LIMIT %s)")
+            params.extend([query, limit])
+    if not parts:
+        return None, None
+    sql = " UNION ALL ".join(parts) + " ORDER BY score DESC, created_at DESC LIMIT %s"
+    params.append(limit)
+    return sql, params
+
+
+class SQLiteCursor:
+    """A sqlite3 cursor that takes %s placeholders and can return dicts"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(qmark(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        self._cursor.executemany(qmark(sql), [tuple(params) for params in seq_params])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+
+class SQLiteConnection:
+    """Handed out by SQLiteStorage; close() returns the handle for reuse"""
+
+    def __init__(self, storage, raw, pooled=True):
+        self._storage = storage
+        self._raw = raw
+        self._pooled = pooled
+        self._released = False
+
+    def cursor(self, dictionary=False, buffered=None):
+        # `buffered` is accepted for mysql.connector compatibility; sqlite3
+        # always steps through results on demand
+        return InstrumentedCursor(SQLiteCursor(self._raw.cursor(), dictionary))
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def is_connected(self):
+        return not self._released
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        if self._pooled:
+            self._storage._release(self._raw)
+        else:
+            self._raw.close()
+
+
+class SQLiteStorage(Storage):
+    """An embedded database file in WAL mode
+
+    WAL lets readers carry on while one writer commits, which is all a
+    single node needs. Writers from several processes queue on the busy
+    timeout rather than failing.
+    """
+
+    for_update = ""
+    insert_ignore = "INSERT OR IGNORE"
+    loi_document = LOI_DOCUMENT
+
+    def __init__(self, path, busy_timeout=SQLITE_BUSY_TIMEOUT, max_idle=SQLITE_MAX_IDLE):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+
+    def _open(self):
+        raw = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        raw.execute("PRAGMA journal_mode = WAL")
+        # In WAL mode NORMAL only risks the last commits on power loss, never corruption
+        raw.execute("PRAGMA synchronous = NORMAL")
+        return raw
+
+    def connection(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Handles inherited across fork belong to the parent
+                self._idle = []
+                self._pid = os.getpid()
+            raw = self._idle.pop() if self._idle else None
+        return SQLiteConnection(self, raw or self._open())
+
+    def stream_connection(self):
+        return SQLiteConnection(self, self._open(), pooled=False)
+
+    def _release(self, raw):
+        try:
+            # Never hand the next caller a half-finished transaction
+            if raw.in_transaction:
+                raw.rollback()
+        except sqlite3.Error:
+            raw.close()
+            return
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append(raw)
+                return
+        raw.close()
+
+    def create_schema(self):
+        raw = self._open()
+        try:
+            with open(SCHEMA_FILE) as f:
+                raw.executescript(f.read())
+        finally:
+            raw.close()
+
+    def begin_write(self, cursor):
+        # Take the write lock before reading, so the rows read cannot change
+        # before this transaction deletes or updates them
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def seconds_between(self, start, end):
+        return f"((julianday({end}) - julianday({start})) * 86400)"
+
+    @contextmanager
+    def exclusive(self, name):
+        with open(f"{self.path}-{name}.lock", 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def claim_outbox(self, limit, now):
+        conn = self.connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            # A database-wide write lock cannot be held while mail is sent,
+            # so claiming moves the rows' next attempt past a lease and
+            # commits at once; results are written in a second transaction.
+            cursor.execute(
+                """UPDATE email_outbox SET next_attempt_at = %s
+                WHERE id IN (SELECT id FROM email_outbox
+                             WHERE status = 'pending' AND next_attempt_at <= %s
+                             ORDER BY id LIMIT %s)
+                RETURNING *""",
+                (now + datetime.timedelta(seconds=SQLITE_OUTBOX_LEASE), now, limit)
+            )
+            rows = sorted(cursor.fetchall(), key=lambda row: row['id'])
+            conn.commit()
+            yield cursor, rows
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats_rows(self, today, week_ago):
+        conn = self.read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(STATS_QUERY, (today, week_ago) * 5)
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def search_rows(self, text, resources, limit):
+        sql, params = build_search(text, resources, limit)
+        if sql is None:
+            return []
+        conn = self.read_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            conn.close()
@@ -0,0 +1,102 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+from storage import get_storage
+
+log = logging.getLogger(__name__)
+
+# How long a snapshot is served before a background refresh is started
+STATS_TTL = float(os.getenv('STATS_TTL', '60'))
+
+RESOURCES = ('enquiries', 'quotations', 'loi_submissions')
+
+
+def _empty_counts():
+    return {'total': 0, 'today': 0, 'last_7_days': 0}
+
+
+def compute_stats():
+    """Run the stats query and shape it into the API response"""
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    week_ago = today - datetime.timedelta(days=6)
+
+    # One statement, one scan per table (see the storage backends). The
+    # snapshot is served for STATS_TTL anyway, so a replica's lag is no loss.
+    storage = get_storage()
+    with storage.replicas.reading():
+        rows = storage.stats_rows(today, week_ago)
+
+    stats = {resource: dict(_empty_counts(), by_product={}) for resource in RESOURCES}
+    del stats['enquiries']['by_product']
+    for resource, product, total, today_count, week_count in rows:
+        counts = {'total': int(total), 'today': int(today_count or 0), 'last_7_days': int(week_count or 0)}
+        if product is None:
+            stats[resource].update(counts)
+        else:
+            stats[resource]['by_product'][product] = counts
+    return stats
+
+
+class StatsCache:
+    """Serves the last stats snapshot in O(1) and refreshes it in the background"""
+
+    def __init__(self, ttl=STATS_TTL, compute=compute_stats):
+        self.ttl = ttl
+        self._compute = compute
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshed_at = 0.0
+        self._refreshing = False
+
+    def _refresh(self):
+        try:
+            snapshot = self._compute()
+            with self._lock:
+                self._snapshot = snapshot
+                self._refreshed_at = time.monotonic()
+        except Exception:
+            log.exception("Error refreshing dashboard stats")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self):
+        with self._lock:
+            snapshot = self._snapshot
+            stale = time.monotonic() - self._refreshed_at > self.ttl
+            start_refresh = stale and snapshot is not None and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+
+        if snapshot is None:
+            # Cold cache: the first caller pays for one query
+            snapshot = self._compute()
+            with self._lock:
+                self._snapshot = snapshot
+                self._refreshed_at = time.monotonic()
+        elif start_refresh:
+            threading.Thread(target=self._refresh, name='stats-refresh', daemon=True).start()
+        return snapshot
+
+    def bump(self, resource, product=None, count=1):
+        """Count new rows immediately instead of waiting for the next refresh"""
+        with self._lock:
+            if self._snapshot is None:
+                return
+            snapshot = {key: dict(value) for key, value in self._snapshot.items()}
+            entry = snapshot[resource]
+            for key in ('total', 'today', 'last_7_days'):
+                entry[key] += count
+            if 'by_product' in entry:
+                by_product = entry['by_product'] = dict(entry['by_product'])
+                counts = dict(by_product.get(product or '', _empty_counts()))
+                for key in counts:
+                    counts[key] += count
+                by_product[product or ''] = counts
+            self._snapshot = snapshot
+
+
+stats_cache = StatsCache()
@@ -0,0 +1,350 @@
+import datetime
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+import changes
+import outbox
+from pagination import fetch_page
+from replicas import ReplicaSet, current_replica
+
+load_dotenv()
+
+# "mysql" uses the pooled MySQL server connection; "sqlite" an embedded
+# database file in WAL mode, for single-node deployments, tests and
+# benchmarks without a server.
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql')
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roodan.db'))
+
+# Columns written for each submission table, in insert order
+INSERT_COLUMNS = {
+    'enquiries': ('name', 'email', 'message', 'ticket_no', 'expires_at'),
+    'quotations': ('ticket_no', 'company', 'name', 'email', 'phone', 'product',
+                   'quantity', 'delivery', 'message', 'expires_at'),
+    'loi_submissions': ('company_name', 'rep_name', 'email', 'phone', 'product', 'quantity',
+                        'submission_date', 'loi_data'),
+}
+
+
+# Rows leaving the hot tables are copied to {table}_archive with these
+# columns; the last is the time the archive is partitioned on by month
+ARCHIVE_COLUMNS = {
+    'enquiries': ('id', 'name', 'email', 'message', 'ticket_no', 'expires_at', 'timestamp'),
+    'quotations': ('id', 'ticket_no', 'company', 'name', 'email', 'phone', 'product',
+                   'quantity', 'delivery', 'message', 'expires_at', 'timestamp'),
+    'loi_submissions': ('id', 'company_name', 'rep_name', 'email', 'phone', 'product', 'quantity',
+                        'loi_data', 'submission_date'),
+}
+
+
+def insert_statement(table, rows):
+    """(sql, params) inserting submission rows (dicts) into `table`"""
+    columns = INSERT_COLUMNS[table]
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    return sql, [tuple(row[column] for column in columns) for row in rows]
+
+
+class Storage:
+    """Every read and write the app makes, behind one interface
+
+    Connections follow DB-API with %s placeholders and accept
+    cursor(dictionary=True), so SQL both engines understand lives here and
+    each engine overrides only what differs.
+    """
+
+    # Appended to a SELECT whose rows the transaction is about to delete
+    for_update = " FOR UPDATE"
+    # An INSERT that skips rows clashing with a unique key
+    insert_ignore = "INSERT IGNORE"
+    # SELECT ... FROM loi_submissions columns: id, submission_date and the
+    # row rendered as a JSON `document` by the database
+    loi_document = None
+    # Where read_connection() can send reads; none unless the engine has replicas
+    replicas = ReplicaSet()
+
+    def connection(self):
+        """A connection for one short unit of work; close() releases it"""
+        raise NotImplementedError
+
+    def read_connection(self):
+        """A connection for reads that tolerate replica lag
+
+        The replica chosen for this request by replicas.reading(), or the
+        primary when none was chosen or it cannot be reached.
+        """
+        replica = current_replica()
+        if replica is not None:
+            try:
+                return replica.connection()
+            except Exception as e:
+                replica.failed(e)
+        return self.connection()
+
+    def stream_connection(self):
+        """A dedicated connection for a long read such as an export"""
+        return self.connection()
+
+    def pool_stats(self):
+        """Connection pool counters; empty for an engine without a pool"""
+        return {}
+
+    def create_schema(self):
+        raise NotImplementedError
+
+    def begin_write(self, cursor):
+        """Start a transaction that reads rows and then changes them"""
+
+    def seconds_between(self, start, end):
+        """SQL expression for the seconds from column `start` to `end`"""
+        raise NotImplementedError
+
+    @contextmanager
+    def exclusive(self, name):
+        """Yield True if this process now holds the named lock, False if another does"""
+        raise NotImplementedError
+        yield
+
+    @contextmanager
+    def claim_outbox(self, limit, now):
+        """Yield (cursor, due rows) for one worker; the cursor's writes commit on exit"""
+        raise NotImplementedError
+        yield
+
+    def stats_rows(self, today, week_ago):
+        """(resource, product, total, today, last_7_days) rows; product None is the table total"""
+        raise NotImplementedError
+
+    def search_rows(self, text, resources, limit):
+        raise NotImplementedError
+
+    def initialize(self):
+        """Bring the schema up to date and create the first admin user"""
+        self.create_schema()
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM admin_users")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("INSERT INTO admin_users (username, password) VALUES (%s, %s)",
+                               ("admin", "password123"))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def check_login(self, username, password):
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM admin_users WHERE username = %s AND password = %s",
+                           (username, password))
+            return cursor.fetchone() is not None
+        finally:
+            conn.close()
+
+    def insert(self, table, rows, notification=None):
+        """Insert submission rows and queue their notification in one transaction"""
+        sql, params = insert_statement(table, rows)
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            # executemany turns this into a single multi-row INSERT on MySQL
+            cursor.executemany(sql, params)
+            if notification:
+                outbox.enqueue_email(cursor, **notification)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def list_page(self, table, ts_column, page, columns='*', filters=None):
+        conn = self.read_connection()
+        try:
+            return fetch_page(conn.cursor(dictionary=True), table, ts_column, page,
+                              columns=columns, filters=filters)
+        finally:
+            conn.close()
+
+    def loi_page(self, page, filters=None):
+        """One page of LOI submissions as JSON document strings"""
+        result = self.list_page('loi_submissions', 'submission_date', page,
+                                columns=self.loi_document, filters=filters)
+        result['items'] = [row['document'] for row in result['items']]
+        return result
+
+    def recent_quotations(self, limit=50):
+        conn = self.read_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM quotations ORDER BY timestamp DESC LIMIT %s", (limit,))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def find_quotation(self, column, value):
+        """The quotation whose `column` ('id' or 'ticket_no') equals `value`, or None"""
+        if column not in ('id', 'ticket_no'):
+            raise ValueError(f"Cannot look quotations up by {column}")
+        conn = self.read_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT * FROM quotations WHERE {column} = %s", (value,))
+            return cursor.fetchone()
+        finally:
+            conn.close()
+
+    def search(self, text, resources, limit):
+        """Ranked matches across the chosen resources (see search.py)"""
+        rows = self.search_rows(text.strip(), resources, limit)
+        for row in rows:
+            row['score'] = float(row['score'])
+        return rows
+
+    def purge_batch(self, table, column, now, limit, tombstones=False, archive=False):
+        """Delete up to `limit` rows whose `column` is before `now`; returns rows deleted
+
+        With `tombstones` each deleted row is noted for the change feed, and
+        with `archive` it is first copied to {table}_archive, both in the
+        same transaction.
+        """
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            self.begin_write(cursor)
+            cursor.execute(
+                f"SELECT id FROM {table} WHERE {column} < %s ORDER BY {column} LIMIT %s{self.for_update}",
+                (now, limit)
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if ids:
+                id_list = ', '.join(['%s'] * len(ids))
+                if archive:
+                    columns = ARCHIVE_COLUMNS[table]
+                    # The archive's partitioning column cannot be NULL
+                    selected = columns[:-1] + (f"COALESCE({columns[-1]}, %s)",)
+                    archived_at = datetime.datetime.now()
+                    cursor.execute(
+                        f"""INSERT INTO {table}_archive ({', '.join(columns)}, archived_at)
+                        SELECT {', '.join(selected)}, %s FROM {table} WHERE id IN ({id_list})""",
+                        [archived_at, archived_at] + ids
+                    )
+                if tombstones:
+                    changes.record_tombstones(cursor, table, ids)
+                cursor.execute(f"DELETE FROM {table} WHERE id IN ({id_list})", ids)
+            conn.commit()
+            return len(ids)
+        finally:
+            conn.close()
+
+    def maintain_archive(self, table, before, upto):
+        """Remove archived rows from before `before`; returns rows removed
+
+        `upto` is the latest time the archive must be ready to take rows for
+        (MySQL creates its monthly partitions ahead of time).
+        """
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {table}_archive WHERE {ARCHIVE_COLUMNS[table][-1]} < %s", (before,))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def archive_page(self, table, page, filters=None):
+        """One page of {table}_archive, newest first"""
+        result = self.list_page(f"{table}_archive", ARCHIVE_COLUMNS[table][-1], page, filters=filters)
+        for row in result['items']:
+            if row.get('loi_data') is not None:
+                row['loi_data'] = json.loads(row['loi_data'])
+        return result
+
+    def record_retention_run(self, table, started_at, rows_purged, duration_ms):
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO retention_runs (table_name, started_at, rows_purged, duration_ms)
+                VALUES (%s, %s, %s, %s)""",
+                (table, started_at, rows_purged, duration_ms)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def claim_idempotency_key(self, key_hash, request_hash, now, lease_until):
+        """Claim a key for a request about to run; returns (claimed, existing row)
+
+        An expired row, an old response or a claim whose request never
+        finished, is replaced. The row is None when the holder released the
+        key between the insert and the read; the caller tries again.
+        """
+        conn = self.connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("DELETE FROM idempotency_keys WHERE key_hash = %s AND expires_at <= %s", (key_hash, now))
+            cursor.execute(
+                f"""{self.insert_ignore} INTO idempotency_keys (key_hash, request_hash, created_at, expires_at)
+                VALUES (%s, %s, %s, %s)""",
+                (key_hash, request_hash, now, lease_until)
+            )
+            if cursor.rowcount == 1:
+                conn.commit()
+                return True, None
+            cursor.execute("SELECT request_hash, status, response_body FROM idempotency_keys WHERE key_hash = %s",
+                           (key_hash,))
+            row = cursor.fetchone()
+            conn.commit()
+            return False, row
+        finally:
+            conn.close()
+
+    def finish_idempotency_key(self, key_hash, status=None, response_body=None, expires_at=None):
+        """Store the response for a claimed key, or release the claim when there is none"""
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            if response_body is None:
+                cursor.execute("DELETE FROM idempotency_keys WHERE key_hash = %s AND status IS NULL", (key_hash,))
+            else:
+                cursor.execute(
+                    "UPDATE idempotency_keys SET status = %s, response_body = %s, expires_at = %s WHERE key_hash = %s",
+                    (status, response_body, expires_at, key_hash)
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def recent_retention_runs(self, limit=20):
+        conn = self.connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM retention_runs ORDER BY id DESC LIMIT %s", (limit,))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+
+def make_storage(name=STORAGE_BACKEND):
+    if name == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(SQLITE_PATH)
+    if name == 'mysql':
+        from mysql_storage import MySQLStorage
+        return MySQLStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """The configured backend, created on first use (never at import)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = make_storage()
+    return _storage
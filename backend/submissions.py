@@ -0,0 +1,115 @@
+import logging
+
+from admin import enquiry_row, quotation_row, loi_row, record_rows, generate_ticket_no
+from breaker import CircuitOpenError
+from mailer import TRANSPORT_NOTIFICATION, TRANSPORT_SMTP
+from notifications import contact_notification, quote_notification, loi_notification
+
+log = logging.getLogger(__name__)
+
+# Where enquiry and quote request notifications are sent
+RECIPIENT_EMAIL = "test@roodan.ae"
+
+
+class InvalidSubmission(ValueError):
+    """Raised for a payload the endpoint must reject with 400"""
+
+
+class Submission:
+    """A checked payload: rows to insert, the email to queue and the reply
+
+    Built the same way for the Flask views (app.py) and the ASGI entry
+    point (asgi.py), so both serve one request/response contract.
+    """
+
+    def __init__(self, table, rows, products, notification, reply, failure):
+        self.table = table
+        self.rows = rows
+        self.products = products
+        self.notification = notification
+        self.reply = reply
+        self.failure = failure
+
+
+def contact(data):
+    name = data.get('name')
+    email = data.get('email')
+    message = data.get('message')
+
+    if not all([name, email, message]):
+        raise InvalidSubmission("Missing required fields")
+
+    # Record the enquiry and queue the notification in one transaction;
+    # the outbox worker delivers it after we have responded.
+    notification = dict(
+        contact_notification(name, email, message),
+        transport=TRANSPORT_NOTIFICATION,
+        to_email=RECIPIENT_EMAIL,
+        reply_to=email,
+    )
+    return Submission('enquiries', [enquiry_row(name, email, message)], [None], notification,
+                      {"message": "Message sent successfully"}, "Failed to record enquiry")
+
+
+def quote_request(data):
+    # Map incoming keys to expected keys
+    company = data.get('companyName', '')
+    name = data.get('representativeName', '')
+    email = data.get('email', '')
+    phone = data.get('phone', '')
+    product = data.get('productName', '')
+    quantity = data.get('quantity', '')
+    delivery = data.get('deliveryPort', '')
+    observations = data.get('observations', '')
+
+    # Allocate the ticket number up front so it can go into the email
+    ticket_no = generate_ticket_no('QUOTE')
+    # The ticket number only: the payload holds contact details
+    log.debug("Received quote request", extra={'fields': {'ticket_no': ticket_no}})
+
+    notification = dict(
+        quote_notification(ticket_no, data),
+        transport=TRANSPORT_NOTIFICATION,
+        to_email=RECIPIENT_EMAIL,
+        reply_to=email,
+    )
+    row = quotation_row(company, name, email, phone, product, quantity, delivery, observations, ticket_no)
+    return Submission('quotations', [row], [product], notification,
+                      {"message": "Quote request submitted successfully", "ticket_no": ticket_no},
+                      "Failed to record quotation request")
+
+
+def loi_submission(data):
+    # LOIs have no ticket number, and the payload holds bank details
+    log.debug("Received LOI submission")
+
+    # The entire payload is stored as JSON for future reference
+    row = loi_row(data.get('companyName'), data.get('representativeName'), data.get('email'),
+                  data.get('phone'), data.get('productName'), data.get('quantity'), data)
+
+    # The confirmation email goes to the submitter; without an address there
+    # is no one to confirm to, and the LOI is still recorded
+    notification = None
+    if data.get('email'):
+        notification = dict(
+            loi_notification(data),
+            transport=TRANSPORT_SMTP,
+            to_email=data.get('email'),
+        )
+    return Submission('loi_submissions', [row], [row['product']], notification,
+                      {"message": "LOI submission recorded successfully"}, "Failed to record LOI submission")
+
+
+def record(submission):
+    """Store a submission and queue its email; False if that failed
+
+    CircuitOpenError propagates, so the caller can answer 503 rather than 500.
+    """
+    try:
+        record_rows(submission.table, submission.rows, submission.products, submission.notification)
+        return True
+    except CircuitOpenError:
+        raise
+    except Exception:
+        log.exception("Error recording %s", submission.table)
+        return False
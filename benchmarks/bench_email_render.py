@@ -0,0 +1,140 @@
+"""Per-render cost of the notification emails: Jinja templates vs the old f-strings
+
+    python benchmarks/bench_email_render.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from flask import Flask  # noqa: E402
+
+import notifications  # noqa: E402
+
+SAMPLE = {
+    'companyName': 'Makedonia Trading & Co', 'representativeName': 'Jens Marson',
+    'email': 'buyer@example.com', 'phone': '+971 4 000 0000', 'productName': 'Urea 46%',
+    'quantity': '25,000 MT', 'deliveryPort': 'Jebel Ali', 'observations': 'Monthly shipments <FOB>',
+    'paymentTerms': 'SBLC', 'bankName': 'Example Bank', 'bankSwiftCode': 'EXAMAEAD',
+    'bankAddress': 'Dubai', 'accountName': 'Makedonia', 'accountNumber': '0123456789',
+    'bankOfficerName': 'A. Officer', 'bankOfficerTitle': 'Manager', 'bankPhone': '+971 4 111 1111',
+}
+
+
+def legacy_quote_bodies(ticket_no, data):
+    """The quote-request email as app.py built it before the templates"""
+    company = data.get('companyName', '')
+    name = data.get('representativeName', '')
+    email = data.get('email', '')
+    phone = data.get('phone', '')
+    product = data.get('productName', '')
+    quantity = data.get('quantity', '')
+    delivery = data.get('deliveryPort', '')
+    observations = data.get('observations', '')
+    payment_terms = data.get('paymentTerms', '')
+    bank_name = data.get('bankName', '')
+    bank_swift_code = data.get('bankSwiftCode', '')
+    bank_address = data.get('bankAddress', '')
+    account_name = data.get('accountName', '')
+    account_number = data.get('accountNumber', '')
+    bank_officer_name = data.get('bankOfficerName', '')
+    bank_officer_title = data.get('bankOfficerTitle', '')
+    bank_phone = data.get('bankPhone', '')
+    subject = f"New Quote Request - Ticket #{ticket_no}"
+    html_content = f"""
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; }}
+                table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
+                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+                th {{ background-color: #f2f2f2; }}
+                h2 {{ color: #333; }}
+            </style>
+        </head>
+        <body>
+            <h1>New Quote Request Received</h1>
+            <h2>Buyer Information</h2>
+            <table>
+                <tr><th>Field</th><th>Value</th></tr>
+                <tr><td>Company Name</td><td>{company or 'N/A'}</td></tr>
+                <tr><td>Representative Name</td><td>{name or 'N/A'}</td></tr>
+                <tr><td>Email</td><td>{email or 'N/A'}</td></tr>
+                <tr><td>Phone</td><td>{phone or 'N/A'}</td></tr>
+            </table>
+            <h2>Product Details</h2>
+            <table>
+                <tr><th>Field</th><th>Value</th></tr>
+                <tr><td>Product</td><td>{product or 'N/A'}</td></tr>
+                <tr><td>Quantity</td><td>{quantity or 'N/A'}</td></tr>
+                <tr><td>Delivery Port</td><td>{delivery or 'N/A'}</td></tr>
+                <tr><td>Observations</td><td>{observations or 'N/A'}</td></tr>
+            </table>
+            <h2>Payment Details</h2>
+            <table>
+                <tr><th>Field</th><th>Value</th></tr>
+                <tr><td>Payment Terms</td><td>{payment_terms or 'N/A'}</td></tr>
+            </table>
+            <h2>Buyer Bank Information</h2>
+            <table>
+                <tr><th>Field</th><th>Value</th></tr>
+                <tr><td>Bank Name</td><td>{bank_name or 'N/A'}</td></tr>
+                <tr><td>Bank SWIFT Code</td><td>{bank_swift_code or 'N/A'}</td></tr>
+                <tr><td>Bank Address</td><td>{bank_address or 'N/A'}</td></tr>
+                <tr><td>Account Name</td><td>{account_name or 'N/A'}</td></tr>
+                <tr><td>Account Number</td><td>{account_number or 'N/A'}</td></tr>
+                <tr><td>Bank Officer Name</td><td>{bank_officer_name or 'N/A'}</td></tr>
+                <tr><td>Bank Officer Title</td><td>{bank_officer_title or 'N/A'}</td></tr>
+                <tr><td>Bank Phone</td><td>{bank_phone or 'N/A'}</td></tr>
+            </table>
+        </body>
+        </html>
+        """
+    plain_text = f"""
+        New Quote Request Received:
+
+        Buyer Information:
+        - Company Name: {company or 'N/A'}
+        - Representative Name: {name or 'N/A'}
+        - Email: {email or 'N/A'}
+        - Phone: {phone or 'N/A'}
+
+        Product Details:
+        - Product: {product or 'N/A'}
+        - Quantity: {quantity or 'N/A'}
+        - Delivery Port: {delivery or 'N/A'}
+        - Observations: {observations or 'N/A'}
+
+        Payment Details:
+        - Payment Terms: {payment_terms or 'N/A'}
+
+        Buyer Bank Information:
+        - Bank Name: {bank_name or 'N/A'}
+        - Bank SWIFT Code: {bank_swift_code or 'N/A'}
+        - Bank Address: {bank_address or 'N/A'}
+        - Account Name: {account_name or 'N/A'}
+        - Account Number: {account_number or 'N/A'}
+        - Bank Officer Name: {bank_officer_name or 'N/A'}
+        - Bank Officer Title: {bank_officer_title or 'N/A'}
+        - Bank Phone: {bank_phone or 'N/A'}
+        """
+    return subject, plain_text, html_content
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.abspath(notifications.__file__)), 'templates'))
+    notifications.init_app(app)
+
+    cases = [
+        ('f-string (legacy)', lambda: legacy_quote_bodies('QUOTE-20250501-AB123', SAMPLE)),
+        ('jinja template', lambda: notifications.quote_notification('QUOTE-20250501-AB123', SAMPLE)),
+    ]
+    for label, render in cases:
+        best = min(timeit.repeat(render, number=iterations, repeat=5))
+        print(f"{label:20s} {best / iterations * 1e6:8.2f} us/render")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Search latency on a large synthetic dataset
+
+Seeds MYSQL_DB (use a throwaway database) up to --rows quote requests,
+enquiries and LOI submissions, then times a mix of /admin/api/search
+queries and checks p95 against the target.
+
+    python backend/migrate.py up
+    python benchmarks/bench_search.py --rows 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from db_pool import connect  # noqa: E402
+from search import search  # noqa: E402
+
+SEARCH_LATENCY_TARGET_MS = 50
+
+PRODUCTS = ['Urea', 'Sugar ICUMSA 45', 'Soya Bean Oil', 'Olive Oil', 'Rice', 'Ghee',
+            'Chicken Paws', 'Beef', 'Coffee', 'Diesel EN590', 'Jet Fuel A1', 'Sunflower Oil']
+WORDS = ['Adama', 'Makedonia', 'Pamela', 'Kunal', 'Tilmann', 'Jens', 'Marson', 'Schillinger',
+         'Global', 'Trading', 'Holdings', 'Foods', 'Energy', 'Logistics', 'Import', 'Export']
+
+
+def seed(rows, chunk=5000):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM quotations")
+    existing = cursor.fetchone()[0]
+    start = datetime.datetime(2024, 1, 1)
+    rng = random.Random(42)
+    for offset in range(existing, rows, chunk):
+        batch = range(offset, min(offset + chunk, rows))
+        people = [(n, f"{rng.choice(WORDS)} {rng.choice(WORDS)}", f"{rng.choice(WORDS)} {rng.choice(WORDS)} LLC",
+                   rng.choice(PRODUCTS), start + datetime.timedelta(seconds=30 * n)) for n in batch]
+        cursor.executemany(
+            "INSERT INTO quotations (ticket_no, company, name, email, product, timestamp, expires_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [(f"QUOTE-{ts:%Y%m%d}-{n:07d}", company, name, f"buyer{n}@example.com", product, ts,
+              ts + datetime.timedelta(days=7)) for n, name, company, product, ts in people])
+        cursor.executemany(
+            "INSERT INTO enquiries (ticket_no, name, email, message, timestamp, expires_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [(f"ENQ-{ts:%Y%m%d}-{n:07d}", name, f"buyer{n}@example.com", f"Price for {product}?", ts,
+              ts + datetime.timedelta(days=30)) for n, name, company, product, ts in people])
+        cursor.executemany(
+            "INSERT INTO loi_submissions (company_name, rep_name, email, product, submission_date, loi_data) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [(company, name, f"buyer{n}@example.com", product, ts, '{}') for n, name, company, product, ts in people])
+        conn.commit()
+        print(f"seeded {batch.stop}/{rows}", end='\r', flush=True)
+    conn.close()
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    queries = ['QUOTE-2024', 'QUOTE-20240315', 'buyer12345@example.com', 'makedonia',
+               'adama trading', 'urea', 'olive oil', 'kunal foods']
+    worst_p95 = 0.0
+    for text in queries:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            search(text, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p50 = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        worst_p95 = max(worst_p95, p95)
+        print(f"{text:28s} p50 {p50:7.2f} ms   p95 {p95:7.2f} ms")
+
+    verdict = 'OK' if worst_p95 <= SEARCH_LATENCY_TARGET_MS else 'OVER TARGET'
+    print(f"worst p95 {worst_p95:.2f} ms (target {SEARCH_LATENCY_TARGET_MS} ms): {verdict}")
+    return 0 if worst_p95 <= SEARCH_LATENCY_TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
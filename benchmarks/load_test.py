@@ -0,0 +1,552 @@
+"""Load test for the submission endpoints and the admin lists
+
+Runs the app in-process behind a real HTTP server and drives each endpoint
+in turn at a fixed concurrency. Mail goes to a local SMTP sink (with
+optional per-message latency). The database is a throwaway MySQL database
+(--db mysql, uses the MYSQL_* settings), a fresh SQLite file in a temporary
+directory (--db sqlite) or an in-memory stand-in that answers every query
+after --db-latency ms (--db standin). The stand-in models round-trip
+latency, not SQL cost, and no mail is delivered with it because the outbox
+table is not stored.
+
+--server asgi serves the three submission endpoints from asgi.py under
+uvicorn instead of the Flask app under a threaded WSGI server, to compare
+the two at the same concurrency.
+
+    (cd backend && flask --app app init-db)   # throwaway MYSQL_DB only
+    python benchmarks/load_test.py --db mysql --concurrency 16 --duration 20
+    python benchmarks/load_test.py --db sqlite
+    python benchmarks/load_test.py --db sqlite --server asgi --concurrency 64
+    python benchmarks/load_test.py --db standin --save benchmarks/baselines/standin.json
+    python benchmarks/load_test.py --db standin --compare benchmarks/baselines/standin.json
+
+Reports p50/p95/p99 latency and requests/sec per endpoint, with the share
+of server time spent in the database, and SMTP delivery times from the
+sink. --compare exits non-zero when a metric regresses past --threshold.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, BACKEND)
+
+ENDPOINTS = ['contact', 'quote', 'loi', 'admin-enquiries', 'admin-quotations', 'admin-loi', 'admin-stats']
+# The paths asgi.py serves
+ASGI_ENDPOINTS = ['contact', 'quote', 'loi']
+
+# Metrics compared against a baseline, and whether bigger is better
+COMPARED = {'p50_ms': False, 'p95_ms': False, 'p99_ms': False, 'rps': True}
+
+
+# --- SMTP sink -------------------------------------------------------------
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        started = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250-sink")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command.startswith("AUTH"):
+                self.reply("235 authenticated")
+            elif command.startswith("MAIL"):
+                started = time.perf_counter()
+                self.reply("250 ok")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(self.server.latency)
+                self.server.record((time.perf_counter() - started) * 1000)
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Accepts any mail; each message is held `latency` seconds before 250"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.latency = latency
+        self.connections = 0
+        self.message_ms = []
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        with self._lock:
+            self.message_ms.append(ms)
+
+
+# --- Database stand-in and timing -----------------------------------------
+
+_timing = threading.local()
+
+
+def _add_db_time(seconds):
+    _timing.db = getattr(_timing, 'db', 0.0) + seconds
+
+
+class TimedCursor:
+    """Adds the time spent in every cursor call to the current request"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name not in ('execute', 'executemany', 'fetchone', 'fetchall', 'fetchmany'):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                _add_db_time(time.perf_counter() - start)
+        return timed
+
+
+class TimedConnection:
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self._raw.commit()
+        finally:
+            _add_db_time(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class StandInCursor:
+    # Enough canned answers for login, data versions and advisory locks
+    ANSWERS = [('admin_users', {'id': 1, 'username': 'admin'}), ('GET_LOCK', (1,)), ('MAX(id)', (0, 0))]
+
+    def __init__(self, latency, dictionary=False):
+        self.latency = latency
+        self.dictionary = dictionary
+        self.rowcount = 0
+        self._sql = ''
+
+    def execute(self, sql, params=None):
+        time.sleep(self.latency)
+        self._sql = sql
+        self.rowcount = 0 if sql.lstrip().upper().startswith('SELECT') else 1
+
+    def executemany(self, sql, seq_params):
+        self.execute(sql)
+
+    def fetchone(self):
+        for needle, row in self.ANSWERS:
+            if needle in self._sql:
+                return row
+        return None
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, size=1):
+        return []
+
+    def close(self):
+        pass
+
+
+class StandInConnection:
+    """Answers every statement after a fixed delay"""
+
+    in_transaction = False
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def cursor(self, dictionary=False, buffered=None):
+        return StandInCursor(self.latency, dictionary)
+
+    def commit(self):
+        time.sleep(self.latency)
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+# --- App under test ------------------------------------------------------------
+
+def configure_environment(args, smtp_port):
+    """Point mail at the sink; everything else can still be overridden"""
+    os.environ.update({
+        'SMTP_TLS': 'false',
+        'EMAIL_HOST': '127.0.0.1', 'EMAIL_PORT': str(smtp_port),
+        'EMAIL_USER': 'bench@roodan.local', 'EMAIL_PASSWORD': 'bench',
+        'SMTP_SERVER': '127.0.0.1', 'SMTP_PORT': str(smtp_port),
+        'SMTP_USERNAME': 'bench@roodan.local', 'SMTP_PASSWORD': 'bench',
+        'FROM_EMAIL': 'bench@roodan.local',
+    })
+    os.environ.setdefault('RATE_LIMIT_BACKEND', 'off')
+    os.environ.setdefault('RETENTION_SCHEDULER', 'off')
+    os.environ.setdefault('IDEMPOTENCY_HASH_PAYLOADS', 'false')
+    os.environ.setdefault('OUTBOX_WORKER', 'off' if args.db == 'standin' else 'thread')
+    if args.db == 'standin':
+        # The stand-in replaces the synchronous pool, so asgi.py must use it too
+        os.environ.setdefault('ASGI_DB_DRIVER', 'threads')
+    if args.db == 'sqlite':
+        os.environ['STORAGE_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='roodan-bench-'), 'bench.db')
+
+
+def setup_database(args):
+    import db_pool
+
+    if args.db == 'sqlite':
+        from storage import get_storage
+        storage = get_storage()
+        open_raw = storage._open
+        storage._open = lambda: TimedConnection(open_raw())
+        storage.initialize()
+    elif args.db == 'standin':
+        connect = lambda: TimedConnection(StandInConnection(args.db_latency / 1000))  # noqa: E731
+        db_pool._pool = db_pool.ConnectionPool(connect=connect)
+    else:
+        connect = lambda: TimedConnection(db_pool.connect())  # noqa: E731
+        db_pool._pool = db_pool.ConnectionPool(connect=connect)
+
+
+def start_app(args, server_stats):
+    from werkzeug.serving import make_server
+    from flask import request
+    from app import app
+
+    setup_database(args)
+
+    @app.before_request
+    def start_timer():
+        _timing.db = 0.0
+        _timing.started = time.perf_counter()
+
+    @app.after_request
+    def record_timer(response):
+        started = getattr(_timing, 'started', None)
+        if started is not None:
+            entry = server_stats.setdefault(request.endpoint, {'server_ms': [], 'db_ms': []})
+            entry['server_ms'].append((time.perf_counter() - started) * 1000)
+            entry['db_ms'].append(_timing.db * 1000)
+        return response
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ASGIServer:
+    """uvicorn on a background thread, with make_server's server_port and shutdown()"""
+
+    def __init__(self, application):
+        import uvicorn
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.server_port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(application, lifespan='on', log_level='error',
+                                                     access_log=False))
+        self._thread = threading.Thread(target=self._server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.05)
+
+    def shutdown(self):
+        self._server.should_exit = True
+        self._thread.join(10)
+
+
+def start_asgi_app(args, server_stats):
+    """The submission endpoints on asgi.py; the database is not timed per request there"""
+    setup_database(args)
+    from asgi import application
+
+    async def timed_application(scope, receive, send):
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        if scope['type'] == 'http':
+            entry = server_stats.setdefault(scope['path'], {'server_ms': [], 'db_ms': []})
+            entry['server_ms'].append((time.perf_counter() - started) * 1000)
+
+    return ASGIServer(timed_application)
+
+
+# --- Load generation ------------------------------------------------------------
+
+_sequence = itertools.count()
+
+
+def submission(kind):
+    n = next(_sequence)
+    common = {'email': f"buyer{n}@example.com", 'companyName': f"Company {n}",
+              'representativeName': f"Buyer {n}", 'phone': '+971500000000',
+              'productName': 'Urea', 'quantity': '12500 MT'}
+    if kind == 'contact':
+        return '/api/contact', {'name': f"Buyer {n}", 'email': common['email'], 'message': f"Price for urea? #{n}"}
+    if kind == 'quote':
+        return '/api/quote-request', dict(common, deliveryPort='Jebel Ali', paymentTerms='LC at sight')
+    return '/api/loi-submission', dict(common, bankName='Bank', bankSwiftCode='ABCDAEAD', observations=str(n))
+
+
+ADMIN_PATHS = {
+    'admin-enquiries': '/admin/api/enquiries?limit=50',
+    'admin-quotations': '/admin/api/quotations?limit=50',
+    'admin-loi': '/admin/api/loi-submissions?limit=50',
+    'admin-stats': '/admin/api/stats',
+}
+
+
+def request_once(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        response.read()
+        return response
+    finally:
+        conn.close()
+
+
+def admin_cookie(port, username, password):
+    body = urllib.parse.urlencode({'username': username, 'password': password})
+    response = request_once(port, 'POST', '/admin/login', body,
+                            {'Content-Type': 'application/x-www-form-urlencoded'})
+    cookie = response.getheader('Set-Cookie')
+    if response.status != 302 or not cookie:
+        raise SystemExit("Admin login failed; run `flask --app app init-db` or pass --admin-user/--admin-password")
+    return cookie.split(';', 1)[0]
+
+
+def run_phase(port, endpoint, concurrency, duration, cookie):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            if endpoint in ADMIN_PATHS:
+                method, path, body, headers = 'GET', ADMIN_PATHS[endpoint], None, {'Cookie': cookie}
+            else:
+                path, payload = submission(endpoint)
+                method, body, headers = 'POST', json.dumps(payload), {'Content-Type': 'application/json'}
+            start = time.perf_counter()
+            try:
+                status = request_once(port, method, path, body, headers).status
+            except OSError:
+                status = 'error'
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies, statuses, elapsed, server):
+    server = server or {'server_ms': [], 'db_ms': []}
+    server_total = sum(server['server_ms'])
+    return {
+        'requests': len(latencies),
+        'statuses': statuses,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'server_mean_ms': round(server_total / len(server['server_ms']), 2) if server['server_ms'] else None,
+        'db_share': round(sum(server['db_ms']) / server_total, 3) if server_total and server['db_ms'] else None,
+    }
+
+
+def wait_for_outbox(timeout):
+    from outbox import queue_stats
+    deadline = time.monotonic() + timeout
+    stats = queue_stats()
+    while stats['pending'] and time.monotonic() < deadline:
+        time.sleep(0.5)
+        stats = queue_stats()
+    return stats
+
+
+# --- Reporting and baselines -------------------------------------------------
+
+def print_report(results):
+    print(f"{'endpoint':<18}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'db %':>7}  statuses")
+    for name, r in results['endpoints'].items():
+        db = f"{r['db_share'] * 100:.0f}" if r['db_share'] is not None else '-'
+        print(f"{name:<18}{r['requests']:>8}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{db:>7}  "
+              + ', '.join(f"{k}:{v}" for k, v in sorted(r['statuses'].items())))
+    smtp = results['smtp']
+    if smtp['messages']:
+        print(f"smtp: {smtp['messages']} messages over {smtp['connections']} sessions, "
+              f"p50 {smtp['p50_ms']} ms, p95 {smtp['p95_ms']} ms per message, "
+              f"{smtp['pending_after_drain']} still queued")
+    else:
+        print("smtp: no messages delivered (outbox worker off or stand-in database)")
+
+
+def machine():
+    """Where the numbers came from; a baseline only compares on like hardware"""
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next(line.split(':', 1)[1].strip() for line in f if line.startswith('model name'))
+    except (OSError, StopIteration):
+        pass
+    return {'cpu': cpu or platform.machine(), 'cpus': os.cpu_count(), 'os': platform.platform(),
+            'python': platform.python_version()}
+
+
+def compare(results, baseline, threshold):
+    """Print per-metric changes; return the list of regressions"""
+    regressions = []
+    print(f"\n{'endpoint':<18}{'metric':<9}{'baseline':>10}{'now':>10}{'change':>9}")
+    for name, current in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before[metric], current[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = change < -threshold if higher_is_better else change > threshold
+            marker = '  REGRESSION' if worse else ''
+            print(f"{name:<18}{metric:<9}{old:>10}{new:>10}{change * 100:>8.1f}%{marker}")
+            if worse:
+                regressions.append((name, metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', choices=['mysql', 'sqlite', 'standin'], default='standin')
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                        help="asgi serves only the submission endpoints, with uvicorn")
+    parser.add_argument('--db-latency', type=float, default=1.0, help="stand-in latency per statement, ms")
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help="sink latency per message, ms")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument('--endpoints', help="comma-separated; default all the server handles")
+    parser.add_argument('--admin-user', default='admin')
+    parser.add_argument('--admin-password', default='password123')
+    parser.add_argument('--drain-timeout', type=float, default=60.0)
+    parser.add_argument('--save', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to diff against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.smtp_latency / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    configure_environment(args, sink.server_address[1])
+
+    server_stats = {}
+    if args.server == 'asgi':
+        server = start_asgi_app(args, server_stats)
+        endpoints = args.endpoints.split(',') if args.endpoints else ASGI_ENDPOINTS
+    else:
+        server = start_app(args, server_stats)
+        endpoints = args.endpoints.split(',') if args.endpoints else ENDPOINTS
+    port = server.server_port
+    endpoints = [name.strip() for name in endpoints if name.strip()]
+    cookie = None
+    if any(name in ADMIN_PATHS for name in endpoints):
+        cookie = admin_cookie(port, args.admin_user, args.admin_password)
+
+    results = {'config': {k: getattr(args, k) for k in ('db', 'server', 'db_latency', 'smtp_latency',
+                                                        'concurrency', 'duration')},
+               'machine': machine(),
+               'endpoints': {}}
+    for name in endpoints:
+        server_stats.clear()
+        latencies, statuses, elapsed = run_phase(port, name, args.concurrency, args.duration, cookie)
+        view = next((stats for key, stats in server_stats.items() if key != 'admin.login'), None)
+        results['endpoints'][name] = summarize(latencies, statuses, elapsed, view)
+        print(f"{name}: {len(latencies)} requests", file=sys.stderr)
+
+    pending = wait_for_outbox(args.drain_timeout)['pending'] if args.db != 'standin' else 0
+    results['smtp'] = {
+        'messages': len(sink.message_ms),
+        'connections': sink.connections,
+        'p50_ms': round(percentile(sink.message_ms, 50), 2),
+        'p95_ms': round(percentile(sink.message_ms, 95), 2),
+        'pending_after_drain': pending,
+    }
+    server.shutdown()
+
+    print_report(results)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('machine') and baseline['machine'] != results['machine']:
+            print(f"warning: baseline was recorded on {baseline['machine']}, not this machine", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
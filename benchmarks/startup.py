@@ -0,0 +1,96 @@
+"""Worker cold start: time to import app.py and asgi.py in a fresh interpreter
+
+Each sample is a new Python process, so nothing is cached in sys.modules;
+the OS file cache is warm after the first run, as it is for a worker
+restarted by the process manager. The imports must not open a database or
+mail connection (test/test_startup.py checks that), so no server is needed.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --save benchmarks/baselines/startup.json
+    python benchmarks/startup.py --compare benchmarks/baselines/startup.json
+
+Exits non-zero when a median is over --target seconds, or, with --compare,
+when it regresses past --threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from load_test import machine
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+MODULES = ['app', 'asgi']
+# Worker cold-start budget for importing either entry point
+STARTUP_TARGET_SECONDS = 2.0
+
+TIME_IMPORT = '''
+import sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(time.perf_counter() - start)
+'''
+
+
+def time_import(module):
+    env = dict(os.environ, AUTO_MIGRATE='')
+    result = subprocess.run([sys.executable, '-c', TIME_IMPORT, module], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=60, check=True)
+    return float(result.stdout.splitlines()[-1])
+
+
+def measure(module, runs):
+    time_import(module)  # warm the file cache
+    samples = [time_import(module) for _ in range(runs)]
+    return {
+        'runs': runs,
+        'median_s': round(statistics.median(samples), 4),
+        'max_s': round(max(samples), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--target', type=float, default=STARTUP_TARGET_SECONDS)
+    parser.add_argument('--save', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to diff against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    results = {'config': {'runs': args.runs}, 'machine': machine(),
+               'modules': {module: measure(module, args.runs) for module in MODULES}}
+
+    print(f"{'module':<8}{'median s':>10}{'max s':>10}")
+    for module, r in results['modules'].items():
+        print(f"{module:<8}{r['median_s']:>10}{r['max_s']:>10}")
+    failed = [module for module, r in results['modules'].items() if r['median_s'] > args.target]
+    for module in failed:
+        print(f"{module}: median import time is over the {args.target}s target", file=sys.stderr)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('machine') and baseline['machine'] != results['machine']:
+            print(f"warning: baseline was recorded on {baseline['machine']}, not this machine", file=sys.stderr)
+        for module, r in results['modules'].items():
+            before = baseline['modules'].get(module)
+            if not before:
+                continue
+            change = (r['median_s'] - before['median_s']) / before['median_s']
+            marker = '  REGRESSION' if change > args.threshold else ''
+            print(f"{module:<8}median {before['median_s']} -> {r['median_s']} ({change * 100:+.1f}%){marker}")
+            if marker:
+                failed.append(module)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
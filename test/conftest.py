@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# The backend is a flat set of modules (app.py, admin.py, ...) run from its
+# own directory, so make them importable the same way here.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+import idempotency  # noqa: E402
+import outbox  # noqa: E402
+import ratelimit  # noqa: E402
+import retention  # noqa: E402
+import storage  # noqa: E402
+from sqlite_storage import SQLiteStorage  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    """A fresh SQLite database as the app's storage, with no background work
+
+    Rate limiting is off, idempotency keys are kept in-process, and the
+    outbox worker and retention scheduler are never started.
+    """
+    store = SQLiteStorage(str(tmp_path / 'roodan.db'))
+    store.initialize()
+    monkeypatch.setattr(storage, '_storage', store)
+    monkeypatch.setattr(ratelimit, 'backend', None)
+    monkeypatch.setattr(idempotency, 'store', idempotency.IdempotencyStore())
+    monkeypatch.setattr(outbox, 'OUTBOX_WORKER', 'off')
+    monkeypatch.setattr(retention, 'RETENTION_SCHEDULER', 'off')
+    return store
+
+
+@pytest.fixture
+def client(sqlite_storage):
+    """A Flask test client logged in to the admin"""
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+
+import asgi
+import idempotency
+import ratelimit
+from app import app
+from breaker import CircuitOpenError, UNAVAILABLE
+from pagination import parse_page_args
+from replicas import Replica, ReplicaSet, READ_YOUR_WRITES_COOKIE
+
+CONTACT = {'name': 'Buyer', 'email': 'buyer@example.com', 'message': 'Urea prices please'}
+
+
+@pytest.fixture
+def db(sqlite_storage, monkeypatch):
+    monkeypatch.setattr(asgi, 'idempotency_store', idempotency.store)
+    monkeypatch.setattr(asgi, 'make_database', lambda: asgi.ThreadedDatabase(2))
+    yield sqlite_storage
+    asyncio.run(asgi.shutdown())
+
+
+def call(method, path, body=b'', headers=()):
+    """Run one request through the ASGI app; returns (status, headers, body)"""
+    async def run():
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+                 'client': ('127.0.0.1', 40000),
+                 'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+        await asgi.application(scope, receive, send)
+        return sent
+
+    start, *chunks = asyncio.run(run())
+    return (start['status'], {name.decode(): value.decode() for name, value in start['headers']},
+            b''.join(chunk.get('body', b'') for chunk in chunks))
+
+
+def post(path, payload, headers=()):
+    return call('POST', path, json.dumps(payload).encode(), [('Content-Type', 'application/json'), *headers])
+
+
+def test_contact_matches_the_flask_view(db):
+    status, headers, body = post('/api/contact', CONTACT)
+    flask = app.test_client().post('/api/contact', json=dict(CONTACT, message='Sulphur prices please'))
+
+    assert (status, body) == (flask.status_code, flask.data)
+    assert headers['content-type'] == 'application/json'
+    items = db.list_page('enquiries', 'timestamp', parse_page_args({}))['items']
+    assert [row['message'] for row in items] == ['Sulphur prices please', 'Urea prices please']
+    with db.claim_outbox(10, datetime.datetime.now()) as (cursor, rows):
+        assert len(rows) == 2
+
+
+def test_errors_match_the_flask_view(db):
+    client = app.test_client()
+    status, _, body = post('/api/contact', {'name': 'Buyer'})
+    flask = client.post('/api/contact', json={'name': 'Buyer'})
+    assert (status, body) == (400, flask.data)
+
+    status, _, body = call('POST', '/api/contact', b'{oops', [('Content-Type', 'application/json')])
+    flask = client.post('/api/contact', data=b'{oops', content_type='application/json')
+    assert (status, body) == (flask.status_code, flask.data)
+
+    status, _, body = call('POST', '/api/contact', b'name=x', [('Content-Type', 'application/x-www-form-urlencoded')])
+    flask = client.post('/api/contact', data=b'name=x', content_type='application/x-www-form-urlencoded')
+    assert (status, body) == (flask.status_code, flask.data)
+
+
+def test_quote_request_returns_its_ticket(db):
+    status, _, body = post('/api/quote-request', {'companyName': 'Makedonia', 'email': 'buyer@example.com',
+                                                  'productName': 'Urea'})
+    ticket_no = json.loads(body)['ticket_no']
+    assert status == 200
+    assert db.find_quotation('ticket_no', ticket_no)['company'] == 'Makedonia'
+
+
+def test_repeated_submission_is_replayed(db, monkeypatch):
+    monkeypatch.setattr(asgi, 'idempotency_store', idempotency.DatabaseIdempotencyStore())
+    first = post('/api/contact', CONTACT, [('Idempotency-Key', 'abc')])
+    second = post('/api/contact', CONTACT, [('Idempotency-Key', 'abc')])
+    assert second[0] == 200 and second[2] == first[2]
+    assert second[1]['idempotent-replayed'] == 'true'
+    assert len(db.list_page('enquiries', 'timestamp', parse_page_args({}))['items']) == 1
+
+    reused = post('/api/contact', dict(CONTACT, message='Sulphur prices please'), [('Idempotency-Key', 'abc')])
+    assert reused[0] == 422 and json.loads(reused[2]) == {"error": idempotency.KEY_REUSED}
+
+
+def test_rate_limit_and_load_shedding(db, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'backend', ratelimit.MemoryBackend())
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_IP_BURST', 1)
+    assert post('/api/contact', CONTACT)[0] == 200
+    status, headers, body = post('/api/contact', dict(CONTACT, message='again'))
+    assert status == 429 and 'retry-after' in headers
+
+    monkeypatch.setattr(asgi, 'ASGI_MAX_CONCURRENT', 0)
+    assert post('/api/contact', CONTACT)[0] == 503
+
+
+def test_submission_pins_reads_to_the_primary_when_there_are_replicas(db, monkeypatch):
+    assert 'set-cookie' not in post('/api/contact', CONTACT)[1]
+    monkeypatch.setattr(db, 'replicas', ReplicaSet([Replica('replica', db.connection, lambda conn: 0)]))
+    status, headers, _ = post('/api/contact', CONTACT)
+    assert status == 200 and headers['set-cookie'].startswith(READ_YOUR_WRITES_COOKIE + '=')
+
+
+def test_other_paths_and_preflight(db):
+    assert call('GET', '/admin/api/enquiries')[0] == 404
+    assert call('GET', '/api/contact')[0] == 405
+    status, headers, _ = call('OPTIONS', '/api/contact', headers=[('Origin', 'https://roodan.ae')])
+    assert status == 200 and headers['access-control-allow-origin'] == 'https://roodan.ae'
+
+
+def test_open_breaker_answers_503(db, monkeypatch):
+    class DownDatabase:
+        async def start(self):
+            pass
+
+        async def insert(self, table, rows, notification=None):
+            raise CircuitOpenError('mysql', 7)
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(asgi, 'make_database', DownDatabase)
+    status, headers, body = post('/api/contact', CONTACT)
+    assert (status, headers['retry-after']) == (503, '7')
+    assert json.loads(body) == {'error': UNAVAILABLE}
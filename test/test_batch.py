@@ -0,0 +1,90 @@
+import pytest
+
+from app import app, split_batch, batch_response
+from sqlite_storage import SQLiteConnection, SQLiteCursor
+
+
+def test_split_batch_rejects_invalid_items_individually():
+    with app.test_request_context():
+        (valid, results), error = split_batch(
+            {'items': [{'name': 'A', 'email': 'a@example.com', 'message': 'hi'}, {'name': 'B'}, 'oops']},
+            ['name', 'email', 'message'])
+        assert error is None
+        assert [index for index, _ in valid] == [0]
+        assert results[1] == {'index': 1, 'status': 'rejected', 'error': 'Missing required fields: email, message'}
+        assert results[2]['status'] == 'rejected'
+
+        response, status = batch_response(valid, results, ['ENQ-20250501-AAAAA'])
+        body = response.get_json()
+        assert status == 200
+        assert body['accepted'] == 1 and body['rejected'] == 2
+        assert body['results'][0] == {'index': 0, 'status': 'accepted', 'ticket_no': 'ENQ-20250501-AAAAA'}
+
+
+def test_split_batch_rejects_empty_and_oversized_batches():
+    with app.test_request_context():
+        assert split_batch([], ['name'])[1][1] == 400
+        assert split_batch([{'name': 'x'}] * 1000, ['name'])[1][1] == 400
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Every executemany and commit made through SQLite connections"""
+    seen = []
+    executemany, commit = SQLiteCursor.executemany, SQLiteConnection.commit
+
+    def spy_executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        seen.append(('executemany', sql.split('(')[0].strip(), len(seq_params)))
+        return executemany(self, sql, seq_params)
+
+    def spy_commit(self):
+        seen.append(('commit',))
+        return commit(self)
+
+    monkeypatch.setattr(SQLiteCursor, 'executemany', spy_executemany)
+    monkeypatch.setattr(SQLiteConnection, 'commit', spy_commit)
+    return seen
+
+
+def rows(store, sql):
+    conn = store.connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('path, good, table', [
+    ('/api/contact/batch', {'name': 'Buyer', 'email': 'buyer@example.com', 'message': 'Urea prices please'},
+     'enquiries'),
+    ('/api/quote-request/batch', {'companyName': 'Company', 'email': 'buyer@example.com', 'productName': 'Urea'},
+     'quotations'),
+])
+def test_batch_is_stored_in_one_insert_with_one_summary_email(sqlite_storage, writes, path, good, table):
+    items = [dict(good, email=f"buyer{n}@example.com") for n in range(3)] + [{'email': 'nobody@example.com'}]
+    response = app.test_client().post(path, json={'items': items})
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['accepted'] == 3 and body['rejected'] == 1
+    assert [result['status'] for result in body['results']] == ['accepted'] * 3 + ['rejected']
+    assert body['results'][3]['error'].startswith('Missing required fields')
+
+    assert writes == [('executemany', f"INSERT INTO {table}", 3), ('commit',)]
+    stored = rows(sqlite_storage, f"SELECT ticket_no, email FROM {table} ORDER BY id")
+    assert [row['ticket_no'] for row in stored] == [result['ticket_no'] for result in body['results'][:3]]
+    assert [row['email'] for row in stored] == [f"buyer{n}@example.com" for n in range(3)]
+
+    [email] = rows(sqlite_storage, "SELECT subject FROM email_outbox")
+    assert email['subject'].startswith('3 New')
+
+
+def test_batch_with_nothing_valid_stores_nothing(sqlite_storage, writes):
+    response = app.test_client().post('/api/contact/batch', json=[{'name': 'Buyer'}, 'oops'])
+    assert response.status_code == 400
+    assert response.get_json()['accepted'] == 0
+    assert writes == []
+    assert rows(sqlite_storage, "SELECT id FROM email_outbox") == []
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+import breaker
+from breaker import CircuitBreaker, CircuitOpenError
+
+
+def outage(e):
+    return isinstance(e, OSError)
+
+
+def fail(b, error=OSError("connection refused")):
+    with pytest.raises(type(error)):
+        with b.call(outage):
+            raise error
+
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    b = CircuitBreaker('db', failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        fail(b)
+    with b.call(outage):
+        pass  # a success resets the count
+    for _ in range(3):
+        fail(b)
+
+    with pytest.raises(CircuitOpenError) as raised:
+        with b.call(outage):
+            pytest.fail("an open breaker must not run the call")
+    assert 1 <= raised.value.retry_after <= 60
+    assert b.snapshot()['state'] == breaker.OPEN
+    assert b.snapshot()['rejected'] == 1
+
+
+def test_other_errors_do_not_count():
+    b = CircuitBreaker('db', failure_threshold=1, reset_timeout=60)
+    with pytest.raises(ValueError):
+        with b.call(outage):
+            raise ValueError("duplicate key")
+    assert b.snapshot()['state'] == breaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    b = CircuitBreaker('db', failure_threshold=1, reset_timeout=0.05)
+    fail(b)
+    time.sleep(0.06)
+
+    b.allow()  # the probe
+    assert b.snapshot()['state'] == breaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        b.allow()  # everyone else still fails fast
+    b.success()
+    assert b.snapshot()['state'] == breaker.CLOSED
+
+
+def test_failed_probe_reopens():
+    b = CircuitBreaker('db', failure_threshold=1, reset_timeout=0.05)
+    fail(b)
+    time.sleep(0.06)
+    fail(b)
+    assert b.snapshot()['state'] == breaker.OPEN
+    assert b.snapshot()['times_opened'] == 2
+    with pytest.raises(CircuitOpenError):
+        b.allow()
+
+
+def test_health_reports_breakers(monkeypatch):
+    from app import app
+
+    monkeypatch.setattr(breaker, '_breakers', {'example': CircuitBreaker('example', failure_threshold=1)})
+    client = app.test_client()
+    assert client.get('/health').get_json()['breakers']['example'] == {
+        'state': 'closed', 'consecutive_failures': 0, 'times_opened': 0, 'rejected': 0, 'last_error': None}
+
+    breaker.get_breaker('example').failure(OSError("timed out"))
+    body = client.get('/health').get_json()
+    assert body['status'] == 'degraded'
+    assert body['breakers']['example']['state'] == 'open'
+    assert body['breakers']['example']['last_error'] == 'timed out'
+
+
+def test_submission_gets_503_while_the_database_breaker_is_open(monkeypatch):
+    import storage
+    from app import app
+
+    class DownStorage:
+        def claim_idempotency_key(self, *args):
+            raise CircuitOpenError('mysql', 12)
+
+        def insert(self, table, rows, notification=None):
+            raise CircuitOpenError('mysql', 12)
+
+    monkeypatch.setattr(storage, '_storage', DownStorage())
+    monkeypatch.setattr('ratelimit.backend', None)
+    response = app.test_client().post('/api/contact', json={'name': 'Buyer', 'email': 'buyer@example.com',
+                                                            'message': 'Urea prices please'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '12'
+    assert response.get_json() == {'error': breaker.UNAVAILABLE}
+
+
+@pytest.mark.parametrize('path, item', [
+    ('/api/contact/batch', {'name': 'Buyer', 'email': 'buyer@example.com', 'message': 'Urea prices please'}),
+    ('/api/quote-request/batch', {'companyName': 'Company', 'email': 'buyer@example.com', 'productName': 'Urea'}),
+])
+def test_batch_gets_503_while_the_database_breaker_is_open(monkeypatch, path, item):
+    import idempotency
+    import storage
+    from app import app
+
+    class DownStorage:
+        def insert(self, table, rows, notification=None):
+            raise CircuitOpenError('mysql', 12)
+
+    monkeypatch.setattr(storage, '_storage', DownStorage())
+    monkeypatch.setattr(idempotency, 'store', idempotency.IdempotencyStore())
+    monkeypatch.setattr('ratelimit.backend', None)
+    response = app.test_client().post(path, json=[item, item])
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '12'
+    assert response.get_json() == {'error': breaker.UNAVAILABLE}
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import admin
+import changes
+from changes import encode_cursor, decode_cursor, ChangesCursorError
+
+
+def test_cursor_round_trip():
+    positions = {'enquiries': 3, 'quotations': 10, 'loi_submissions': 0, 'deleted': 7}
+    assert decode_cursor(encode_cursor(positions)) == positions
+
+
+def test_bad_cursor_is_rejected():
+    with pytest.raises(ChangesCursorError):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(ChangesCursorError):
+        decode_cursor(encode_cursor({'enquiries': 1}))
+
+
+def test_stream_sends_deltas_with_resumable_ids(monkeypatch):
+    deltas = iter([
+        {'inserted': {'enquiries': [{'id': 4}]}, 'deleted': [], 'cursor': 'c1', 'has_more': False, 'empty': False},
+        {'inserted': {}, 'deleted': [], 'cursor': 'c1', 'has_more': False, 'empty': True},
+    ])
+    seen = []
+
+    def fake_changes_since(cursor_token):
+        seen.append(cursor_token)
+        return next(deltas)
+
+    monkeypatch.setattr(changes, 'changes_since', fake_changes_since)
+    monkeypatch.setattr(changes, 'SSE_POLL_INTERVAL', 0)
+    monkeypatch.setattr(changes, 'SSE_HEARTBEAT_INTERVAL', 0)
+
+    stream = changes.stream_changes('c0', json.dumps)
+    assert next(stream) == "retry: 3000\n\n"
+    event = next(stream)
+    assert event.startswith("id: c1\nevent: changes\ndata: ")
+    assert json.loads(event.split('data: ', 1)[1])['inserted']['enquiries'] == [{'id': 4}]
+    assert next(stream) == ": heartbeat\n\n"
+    assert seen == ['c0', 'c1']
+
+
+def test_dashboard_polls_unless_sse_is_asked_for(client, monkeypatch):
+    body = client.get('/admin/dashboard').get_data(as_text=True)
+    assert 'const liveUpdates = "poll";' in body
+
+    monkeypatch.setattr(admin, 'DASHBOARD_LIVE_UPDATES', 'sse')
+    body = client.get('/admin/dashboard').get_data(as_text=True)
+    assert 'const liveUpdates = "sse";' in body
@@ -0,0 +1,67 @@
+import gzip
+
+from flask import Flask, jsonify
+
+from conditional import etagged, compress_response
+
+
+def make_client(version, size=10):
+    calls = []
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route('/api/items')
+    @etagged(lambda: version[0])
+    def items():
+        calls.append(1)
+        return jsonify({"items": ["x" * size]})
+
+    @app.route('/api/stats')
+    @etagged()
+    def stats():
+        return jsonify({"total": version[0]})
+
+    return app.test_client(), calls
+
+
+def test_unchanged_version_skips_the_view():
+    version = [1]
+    client, calls = make_client(version)
+    first = client.get('/api/items')
+    etag = first.headers['ETag']
+    again = client.get('/api/items', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert len(calls) == 1
+
+    version[0] = 2
+    changed = client.get('/api/items', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+
+def test_body_digest_etag_without_version():
+    version = [1]
+    client, _ = make_client(version)
+    etag = client.get('/api/stats').headers['ETag']
+    assert client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 304
+    version[0] = 2
+    assert client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_large_bodies_are_gzipped_with_their_own_etag():
+    client, _ = make_client([1], size=5000)
+    plain = client.get('/api/items')
+    compressed = client.get('/api/items', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    revalidated = client.get('/api/items', headers={'Accept-Encoding': 'gzip',
+                                                     'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_small_bodies_are_not_compressed():
+    client, _ = make_client([1], size=10)
+    response = client.get('/api/items', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
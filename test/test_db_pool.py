@@ -0,0 +1,137 @@
+import os
+import threading
+
+import mysql.connector
+import pytest
+
+import breaker
+import db_pool
+from breaker import CircuitBreaker, CircuitOpenError
+from db_pool import ConnectionPool, PoolTimeoutError, unavailable
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.pings = 0
+        self.alive = True
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise OSError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    return ConnectionPool(connect=connect, **kwargs), created
+
+
+def test_connections_are_reused():
+    pool, created = make_pool(size=2, timeout=1)
+    conn = pool.get_connection()
+    conn.close()
+    pool.get_connection().close()
+    assert len(created) == 1
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['in_use'] == 0
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, timeout=0.05)
+    held = pool.get_connection()
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection()
+    assert pool.stats()['timeouts'] == 1
+    held.close()
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(size=1, timeout=2)
+    held = pool.get_connection()
+    threading.Timer(0.05, held.close).start()
+    conn = pool.get_connection()
+    assert conn._raw is created[0]
+    assert pool.stats()['waits'] == 1
+    conn.close()
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool, created = make_pool(size=1)
+    with pool.get_connection() as conn:
+        conn._raw.in_transaction = True
+    assert created[0].rollbacks == 1
+
+
+def test_failed_health_check_replaces_connection():
+    pool, created = make_pool(size=1, ping_interval=0)
+    pool.get_connection().close()
+    created[0].alive = False
+    pool.get_connection().close()
+    assert len(created) == 2
+    assert created[0].closed
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_stale_connections_are_recycled():
+    pool, created = make_pool(size=1, recycle=0.01)
+    pool.get_connection().close()
+    threading.Event().wait(0.02)
+    pool.get_connection().close()
+    assert len(created) == 2
+    assert pool.stats()['recycled'] == 1
+
+
+def test_pool_is_reset_after_fork():
+    pool, created = make_pool(size=1)
+    pool.get_connection().close()
+    pool._pid = os.getpid() + 1  # pretend this pool was inherited from a parent
+    pool.get_connection().close()
+    assert len(created) == 2
+    # The inherited socket must not be closed from the child
+    assert not created[0].closed
+
+
+def test_open_breaker_fails_checkouts_fast():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        raise OSError("connection refused")
+
+    pool = ConnectionPool(connect=connect, size=2, timeout=5, breaker=CircuitBreaker('mysql', failure_threshold=2))
+    for _ in range(2):
+        with pytest.raises(OSError):
+            pool.get_connection()
+    with pytest.raises(CircuitOpenError):
+        pool.get_connection()
+    assert len(attempts) == 2
+    assert pool.stats()['in_use'] == 0
+
+
+def test_lost_connection_during_a_statement_counts_as_an_outage():
+    assert unavailable(mysql.connector.errors.OperationalError("Lost connection", errno=2013))
+    assert not unavailable(mysql.connector.errors.IntegrityError("Duplicate entry", errno=1062))
+
+
+def test_sqlite_pool_stats_create_no_mysql_pool(client, monkeypatch):
+    monkeypatch.setattr(db_pool, '_pool', None)
+    monkeypatch.setattr(breaker, '_breakers', {})
+    assert client.get('/admin/api/pool-stats').get_json() == {'replicas': []}
+    assert db_pool._pool is None
+    assert 'mysql' not in client.get('/health').get_json()['breakers']
@@ -0,0 +1,69 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def db(sqlite_storage):
+    conn = sqlite_storage.connection()
+    try:
+        cursor = conn.cursor()
+        for day in (30, 31):
+            cursor.execute(
+                "INSERT INTO enquiries (name, email, message, ticket_no, timestamp) VALUES (%s, %s, %s, %s, %s)",
+                (f"Buyer {day}", 'buyer@example.com', 'Urea prices please', f"ENQ-202601{day}-00001",
+                 datetime.datetime(2026, 1, day, 18, 30)))
+        conn.commit()
+    finally:
+        conn.close()
+    return sqlite_storage
+
+
+def test_export_needs_a_login(db):
+    response = app.test_client().get('/admin/api/export/enquiries')
+    assert response.status_code == 302
+    assert '/admin/login' in response.headers['Location']
+
+
+def test_ndjson_streams_every_resource(db, client):
+    response = client.get('/admin/api/export/all')
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(row['_type'], row['name']) for row in rows] == [('enquiries', 'Buyer 30'), ('enquiries', 'Buyer 31')]
+
+
+def test_csv_has_a_header_and_one_line_per_row(db, client):
+    response = client.get('/admin/api/export/enquiries?format=csv')
+    assert response.mimetype == 'text/csv'
+    header, *rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert header[:4] == ['id', 'name', 'email', 'message']
+    assert [row[1] for row in rows] == ['Buyer 30', 'Buyer 31']
+
+
+def test_date_filters_include_the_whole_to_day(db, client):
+    def names(query):
+        body = client.get(f"/admin/api/export/enquiries?{query}").get_data(as_text=True)
+        return [json.loads(line)['name'] for line in body.splitlines()]
+
+    assert names('to=2026-01-31') == ['Buyer 30', 'Buyer 31']
+    assert names('to=2026-01-30') == ['Buyer 30']
+    assert names('from=2026-01-31') == ['Buyer 31']
+    assert names('to=2026-01-31T12:00:00') == ['Buyer 30']  # a time of day is taken as given
+
+
+def test_empty_csv_still_has_its_header(db, client):
+    body = client.get('/admin/api/export/quotations?format=csv').get_data(as_text=True)
+    assert list(csv.reader(io.StringIO(body)))[0][:3] == ['id', 'ticket_no', 'company']
+
+
+def test_export_rejects_bad_requests(db, client):
+    assert client.get('/admin/api/export/nope').status_code == 404
+    assert client.get('/admin/api/export/enquiries?format=xml').status_code == 400
+    assert client.get('/admin/api/export/all?format=csv').status_code == 400
+    assert client.get('/admin/api/export/enquiries?to=31/01/2026').status_code == 400
@@ -0,0 +1,100 @@
+import itertools
+
+from flask import Flask, jsonify
+
+import idempotency
+import retention
+from idempotency import DatabaseIdempotencyStore, IdempotencyStore, idempotent
+
+
+def make_client(monkeypatch, status=200):
+    monkeypatch.setattr(idempotency, 'store', IdempotencyStore(ttl=60, max_entries=10))
+    tickets = itertools.count(1)
+    app = Flask(__name__)
+
+    @app.route('/api/quote-request', methods=['POST'])
+    @idempotent
+    def quote_request():
+        return jsonify({"ticket_no": f"QUOTE-{next(tickets)}"}), status
+
+    return app.test_client()
+
+
+def test_repeated_key_replays_the_original_ticket(monkeypatch):
+    client = make_client(monkeypatch)
+    first = client.post('/api/quote-request', json={'a': 1}, headers={'Idempotency-Key': 'k1'})
+    retry = client.post('/api/quote-request', json={'a': 1}, headers={'Idempotency-Key': 'k1'})
+    assert first.get_json() == retry.get_json() == {"ticket_no": "QUOTE-1"}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_key_reused_with_another_payload_is_refused(monkeypatch):
+    client = make_client(monkeypatch)
+    client.post('/api/quote-request', json={'a': 1}, headers={'Idempotency-Key': 'k1'})
+    reused = client.post('/api/quote-request', json={'a': 2}, headers={'Idempotency-Key': 'k1'})
+    assert reused.status_code == 422
+    assert reused.get_json() == {"error": idempotency.KEY_REUSED}
+
+
+def test_keys_are_scoped_to_the_client(monkeypatch):
+    client = make_client(monkeypatch)
+    first = client.post('/api/quote-request', json={'a': 1}, headers={'Idempotency-Key': 'k1'},
+                        environ_base={'REMOTE_ADDR': '192.0.2.1'})
+    other = client.post('/api/quote-request', json={'a': 1}, headers={'Idempotency-Key': 'k1'},
+                        environ_base={'REMOTE_ADDR': '192.0.2.2'})
+    assert first.get_json() == {"ticket_no": "QUOTE-1"}
+    assert other.get_json() == {"ticket_no": "QUOTE-2"}
+    assert 'Idempotent-Replayed' not in other.headers
+
+
+def test_identical_payload_without_key_is_deduplicated(monkeypatch):
+    client = make_client(monkeypatch)
+    first = client.post('/api/quote-request', json={'a': 1, 'b': 2})
+    retry = client.post('/api/quote-request', json={'b': 2, 'a': 1})
+    other = client.post('/api/quote-request', json={'a': 3})
+    assert first.get_json() == retry.get_json()
+    assert other.get_json() == {"ticket_no": "QUOTE-2"}
+
+
+def test_failures_are_not_remembered(monkeypatch):
+    client = make_client(monkeypatch, status=500)
+    client.post('/api/quote-request', json={'a': 1})
+    assert len(idempotency.store) == 0
+
+
+def test_store_is_bounded():
+    store = IdempotencyStore(ttl=60, max_entries=3)
+    for n in range(5):
+        store.begin(n)
+        store.finish(n, {'n': n}, 200)
+    assert len(store) == 3
+    assert store.begin(0)[0] == 'run'
+    assert store.begin(4) == ('replay', ({'n': 4}, 200))
+
+
+def test_database_store_is_shared_between_workers(sqlite_storage):
+    first, second = DatabaseIdempotencyStore(ttl=60), DatabaseIdempotencyStore(ttl=60)
+    assert first.begin('k1', 'payload') == ('run', None)
+    first.finish('k1', {'ticket_no': 'QUOTE-1'}, 200)
+
+    assert second.begin('k1', 'payload') == ('replay', ({'ticket_no': 'QUOTE-1'}, 200))
+    assert second.begin('k1', 'another payload') == ('mismatch', None)
+
+
+def test_database_store_releases_failed_and_lapsed_claims(sqlite_storage):
+    store = DatabaseIdempotencyStore(ttl=60, lease=60, poll_interval=0)
+    assert store.begin('k1', 'payload') == ('run', None)
+    store.finish('k1')  # the request failed
+    assert store.begin('k1', 'payload') == ('run', None)
+
+    # A worker that died holding a claim blocks retries only until its lease ends
+    lapsed = DatabaseIdempotencyStore(ttl=60, lease=-1)
+    assert lapsed.begin('k2', 'payload') == ('run', None)
+    assert store.begin('k2', 'payload') == ('run', None)
+
+
+def test_expired_responses_are_purged_by_retention(sqlite_storage):
+    store = DatabaseIdempotencyStore(ttl=-1)
+    store.begin('k1', 'payload')
+    store.finish('k1', {'ticket_no': 'QUOTE-1'}, 200)
+    assert retention.purge_expired('idempotency_keys') == 1
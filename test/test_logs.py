@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import queue
+import sys
+
+from flask import Flask
+
+import app as backend_app  # noqa: F401  (compiles the notification templates)
+import logs
+from logs import JSONFormatter, NonBlockingQueueHandler, redact
+from submissions import quote_request
+
+
+def test_sensitive_fields_are_redacted_at_any_depth():
+    payload = {'companyName': 'Acme', 'accountNumber': '123', 'bank': {'bankSwiftCode': 'ABCD', 'bankName': 'B'},
+               'items': [{'password': 'x'}]}
+    assert redact(payload) == {'companyName': 'Acme', 'accountNumber': '[REDACTED]', 'bank': '[REDACTED]',
+                               'items': [{'password': '[REDACTED]'}]}
+    loi = {'bankName': 'B', 'bankAddress': 'A', 'bankOfficerName': 'O', 'bankPhone': 'P', 'product': 'Urea'}
+    assert redact(loi) == {'bankName': '[REDACTED]', 'bankAddress': '[REDACTED]', 'bankOfficerName': '[REDACTED]',
+                           'bankPhone': '[REDACTED]', 'product': 'Urea'}
+
+
+def test_messages_and_tracebacks_are_redacted():
+    try:
+        raise ValueError("Bad LOI {'bankName': 'First Bank', 'iban': 'AE07 0331', 'product': 'Urea'}")
+    except ValueError:
+        exc_info = sys.exc_info()
+    record = logging.makeLogRecord({'name': 'app', 'levelno': logging.ERROR, 'levelname': 'ERROR',
+                                    'msg': "Login failed for password=%s token: %s", 'args': ('hunter2', '"abc d"'),
+                                    'exc_info': exc_info, 'fields': {'error': 'accountNumber=123'}})
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry['msg'] == "Login failed for password=[REDACTED] token: [REDACTED]"
+    assert "'bankName': [REDACTED], 'iban': [REDACTED], 'product': 'Urea'" in entry['exc']
+    assert 'First Bank' not in entry['exc'] and 'AE07' not in entry['exc']
+    assert entry['error'] == 'accountNumber=[REDACTED]'
+
+
+def test_submissions_log_ticket_numbers_not_payloads(caplog):
+    with caplog.at_level(logging.DEBUG, logger='submissions'):
+        submission = quote_request({'companyName': 'Acme', 'email': 'buyer@example.com', 'productName': 'Urea'})
+    [record] = [r for r in caplog.records if r.name == 'submissions']
+    assert record.fields == {'ticket_no': submission.reply['ticket_no']}
+
+
+def test_records_are_formatted_as_json_lines():
+    record = logging.makeLogRecord({'name': 'app', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': "Received %s", 'args': ('quote',),
+                                    'fields': {'payload': {'accountNumber': '123'}}, 'request_id': 'r1'})
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry['msg'] == "Received quote"
+    assert entry['request_id'] == 'r1'
+    assert entry['payload'] == {'accountNumber': '[REDACTED]'}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(maxsize=1)
+    handler._listener_pid = os.getpid()  # no writer thread, so nothing drains
+    handler.queue = queue.Queue(1)
+    record = logging.makeLogRecord({'msg': 'x'})
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 1
+
+
+def test_request_id_is_echoed_and_access_line_logged(caplog):
+    app = Flask(__name__)
+    logs.init_app(app)
+
+    @app.route('/api/contact')
+    def contact():
+        return 'ok'
+
+    client = app.test_client()
+    with caplog.at_level(logging.INFO, logger='access'):
+        response = client.get('/api/contact', headers={'X-Request-ID': 'abc-123'})
+    assert response.headers['X-Request-ID'] == 'abc-123'
+    [record] = [r for r in caplog.records if r.name == 'access']
+    assert record.fields['status'] == 200 and record.fields['route'] == '/api/contact'
+    assert client.get('/api/contact', headers={'X-Request-ID': 'bad id!'}).headers['X-Request-ID'] != 'bad id!'
@@ -0,0 +1,192 @@
+import smtplib
+import socket
+import socketserver
+import threading
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+import mailer
+from breaker import CircuitBreaker, CircuitOpenError
+from mailer import Mailer
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.connections = 0
+        self.messages = 0
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSink()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def message(n):
+    msg = MIMEText(f"body {n}")
+    msg['From'] = 'noreply@roodan.ae'
+    msg['To'] = 'test@roodan.ae'
+    msg['Subject'] = f"message {n}"
+    return msg
+
+
+def test_session_is_reused_across_sends(sink):
+    m = Mailer('127.0.0.1', sink.server_address[1], None, None)
+    for n in range(3):
+        m.send(message(n))
+    assert sink.messages == 3
+    assert sink.connections == 1
+    m.close()
+
+
+def test_send_many_uses_one_connection(sink):
+    m = Mailer('127.0.0.1', sink.server_address[1], None, None)
+    results = m.send_many([message(n) for n in range(5)])
+    assert results == [None] * 5
+    assert sink.connections == 1
+    m.close()
+
+
+def test_dropped_session_is_replaced(sink, monkeypatch):
+    monkeypatch.setattr(mailer, 'SMTP_NOOP_INTERVAL', 0)
+    m = Mailer('127.0.0.1', sink.server_address[1], None, None)
+    m.send(message(1))
+    dropped = m._server
+    dropped.sock.shutdown(socket.SHUT_RDWR)  # the connection drops between sends
+    m.send(message(2))
+    assert sink.messages == 2
+    assert m.connects == 2
+    assert dropped.sock is None  # closed, not just forgotten
+    m.close()
+
+
+class RejectingHandler(SMTPHandler):
+    """Refuses every message once it has been sent"""
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command == "DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.reply("554 message rejected")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+def test_rejected_message_is_not_resent():
+    server = SMTPSink()
+    server.RequestHandlerClass = RejectingHandler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        m = Mailer('127.0.0.1', server.server_address[1], None, None)
+        with pytest.raises(smtplib.SMTPDataError):
+            m.send(message(1))
+        assert server.connections == 1
+        m.send_many([message(2)])
+        assert server.connections == 1  # the session is still good for the next message
+        m.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class StallingHandler(SMTPHandler):
+    """Accepts the session but never answers DATA"""
+
+    def handle(self):
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line or line.strip().upper() == b"DATA":
+                self.server.stalled.wait(10)
+                return
+            self.reply("250 ok")
+
+
+def test_total_timeout_bounds_a_stalled_send():
+    server = SMTPSink()
+    server.RequestHandlerClass = StallingHandler
+    server.stalled = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        m = Mailer('127.0.0.1', server.server_address[1], None, None, send_timeout=30, total_timeout=0.3)
+        started = time.monotonic()
+        with pytest.raises(OSError):
+            m.send(message(1))
+        assert time.monotonic() - started < 2
+    finally:
+        server.stalled.set()
+        server.shutdown()
+        server.server_close()
+
+
+def test_breaker_fails_fast_once_the_server_is_down():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]  # nothing listens here once closed
+    m = Mailer('127.0.0.1', port, None, None, breaker=CircuitBreaker('mail', failure_threshold=2))
+    for _ in range(2):
+        with pytest.raises(ConnectionRefusedError):
+            m.send(message(1))
+    with pytest.raises(CircuitOpenError):
+        m.send(message(2))
+
+
+def test_only_dead_sessions_are_retried():
+    assert mailer.retryable(smtplib.SMTPServerDisconnected("gone"))
+    assert mailer.retryable(ConnectionResetError())
+    assert mailer.retryable(smtplib.SMTPSenderRefused(421, b'too many messages', 'noreply@roodan.ae'))
+    assert not mailer.retryable(smtplib.SMTPRecipientsRefused({'x@example.com': (550, b'no such user')}))
+    assert not mailer.retryable(smtplib.SMTPDataError(554, b'rejected'))
+
+
+def test_refused_recipient_is_not_an_outage():
+    assert not mailer.unavailable(smtplib.SMTPRecipientsRefused({'x@example.com': (550, b'no such user')}))
+    assert mailer.unavailable(smtplib.SMTPServerDisconnected("gone"))
+    assert mailer.unavailable(TimeoutError())
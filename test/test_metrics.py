@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+
+from flask import Flask
+
+import metrics
+from metrics import Registry, describe_query
+
+
+def test_describe_query():
+    assert describe_query("SELECT * FROM quotations WHERE id = %s") == ('quotations', 'SELECT')
+    assert describe_query("\n INSERT INTO email_outbox (a) VALUES (%s)") == ('email_outbox', 'INSERT')
+    assert describe_query("(SELECT 'enquiries', COUNT(*) FROM enquiries) UNION ALL (...)") == ('enquiries', 'SELECT')
+
+
+def test_snapshots_from_every_worker_are_summed(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'registry', Registry())
+    monkeypatch.setattr(metrics, '_snapshot_name', None)
+
+    other = Registry()
+    other.observe('smtp_send_duration_seconds', 0.2, {'transport': 'smtp', 'outcome': 'ok'})
+    (tmp_path / f"{os.getppid()}-1.json").write_text(json.dumps(other.snapshot()))
+    metrics.observe('smtp_send_duration_seconds', 0.003, transport='smtp', outcome='ok')
+
+    text = metrics.render()
+    labels = 'outcome="ok",transport="smtp"'
+    assert f'smtp_send_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'smtp_send_duration_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'smtp_send_duration_seconds_count{{{labels}}} 2' in text
+    assert '# TYPE db_query_duration_seconds histogram' in text
+
+
+def test_timed_labels_errors(monkeypatch):
+    monkeypatch.setattr(metrics, 'registry', Registry())
+    try:
+        with metrics.timed('db_query_duration_seconds', table='quotations', operation='SELECT'):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    [(name, labels, _, _, count)] = metrics.registry.snapshot()
+    assert ('outcome', 'error') in labels and count == 1
+
+
+def test_metrics_endpoint_requires_a_token(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', None)
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'secret')
+    monkeypatch.setattr(metrics, 'registry', Registry())
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    metrics.init_app(app)
+
+    @app.route('/api/contact')
+    def contact():
+        return 'ok'
+
+    client = app.test_client()
+    client.get('/api/contact')
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/contact",status="200"} 1' in response.text
+
+
+def test_snapshots_of_exited_workers_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'registry', Registry())
+    monkeypatch.setattr(metrics, '_snapshot_name', None)
+
+    exited = subprocess.Popen(['true'])
+    exited.wait()
+    other = Registry()
+    other.observe('smtp_send_duration_seconds', 0.2, {'transport': 'smtp', 'outcome': 'ok'})
+    (tmp_path / f"{exited.pid}-1.json").write_text(json.dumps(other.snapshot()))
+
+    assert metrics.collect() == {}
+    assert [path.name for path in tmp_path.iterdir()] == [metrics._snapshot_name]
+
+    metrics._remove_snapshot()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,154 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from migrate import discover_migrations, split_statements, apply_migrations, load_python_migration
+
+# Every migration after the baseline must say which queries it speeds up:
+# (query, index the optimizer should pick once the migration is applied).
+EXPLAIN_CHECKS = {
+    '0002': [
+        ("SELECT * FROM enquiries ORDER BY timestamp DESC, id DESC LIMIT 51",
+         'idx_enquiries_timestamp_id'),
+        ("SELECT * FROM quotations WHERE timestamp < '2025-03-01' ORDER BY timestamp DESC, id DESC LIMIT 51",
+         'idx_quotations_timestamp_id'),
+        ("SELECT * FROM loi_submissions ORDER BY submission_date DESC, id DESC LIMIT 51",
+         'idx_loi_submissions_date_id'),
+        ("SELECT id FROM quotations WHERE expires_at < '2025-01-03' ORDER BY expires_at LIMIT 500",
+         'idx_quotations_expires_at'),
+        ("SELECT id FROM enquiries WHERE expires_at < '2025-01-03' ORDER BY expires_at LIMIT 500",
+         'idx_enquiries_expires_at'),
+        ("SELECT * FROM quotations WHERE email = 'buyer7@example.com'",
+         'idx_quotations_email'),
+        ("SELECT * FROM loi_submissions WHERE email = 'buyer7@example.com'",
+         'idx_loi_submissions_email'),
+    ],
+    '0003': [
+        ("SELECT id FROM quotations WHERE MATCH(company, name, email, product) AGAINST ('+compan*' IN BOOLEAN MODE)",
+         'ft_quotations'),
+        ("SELECT id FROM enquiries WHERE MATCH(name, email, message) AGAINST ('+name*' IN BOOLEAN MODE)",
+         'ft_enquiries'),
+        ("SELECT id FROM loi_submissions WHERE MATCH(company_name, rep_name, email, product) AGAINST ('+product*' IN BOOLEAN MODE)",
+         'ft_loi_submissions'),
+    ],
+    '0004': [
+        ("SELECT id FROM deleted_rows WHERE expires_at < '2025-01-03' ORDER BY expires_at LIMIT 500",
+         'idx_deleted_rows_expires_at'),
+    ],
+    '0005': [
+        ("SELECT id FROM loi_submissions WHERE bank_swift_code = 'ABCDUS33' ORDER BY submission_date DESC LIMIT 51",
+         'idx_loi_submissions_bank_swift_code'),
+        ("SELECT id FROM loi_submissions WHERE delivery_port = 'Jebel Ali' ORDER BY submission_date DESC LIMIT 51",
+         'idx_loi_submissions_delivery_port'),
+    ],
+    '0006': [
+        ("SELECT * FROM quotations_archive WHERE email = 'buyer7@example.com' ORDER BY timestamp DESC LIMIT 51",
+         'idx_quotations_archive_email'),
+        ("SELECT * FROM enquiries_archive WHERE ticket_no = 'ENQ-7'",
+         'idx_enquiries_archive_ticket_no'),
+    ],
+    '0007': [
+        ("SELECT request_hash, status, response_body FROM idempotency_keys WHERE key_hash = 'a'",
+         'uq_idempotency_keys_key_hash'),
+        ("SELECT id FROM idempotency_keys WHERE expires_at < '2025-01-03' ORDER BY expires_at LIMIT 500",
+         'idx_idempotency_keys_expires_at'),
+    ],
+}
+
+
+def test_migrations_are_ordered_and_unique():
+    versions = [version for version, _, _ in discover_migrations()]
+    assert versions == sorted(versions)
+    assert versions[0] == '0001'
+
+
+def test_every_migration_has_an_explain_check():
+    versions = [version for version, _, _ in discover_migrations()][1:]
+    assert sorted(EXPLAIN_CHECKS) == versions
+
+
+def test_loi_backfill_converts_python_reprs():
+    path = next(path for version, _, path in discover_migrations() if version == '0005')
+    module = load_python_migration(path)
+
+    assert json.loads(module.to_json(str({'bankSwiftCode': 'ABCDUS33', 'quantity': 5}))) == \
+        {'bankSwiftCode': 'ABCDUS33', 'quantity': 5}
+    assert module.to_json('{"a": 1}') == '{"a": 1}'
+    assert json.loads(module.to_json('not a dict {')) == {'unparsed': 'not a dict {'}
+
+
+def test_split_statements_drops_comments():
+    sql = "-- comment; with a semicolon\nCREATE INDEX a ON t (x);\n\nCREATE INDEX b ON t (y);\n"
+    assert split_statements(sql) == ["CREATE INDEX a ON t (x)", "CREATE INDEX b ON t (y)"]
+
+
+# The EXPLAIN checks need a throwaway MySQL database: every table in
+# MYSQL_TEST_DB is dropped before each check.
+requires_mysql = pytest.mark.skipif(not os.getenv('MYSQL_TEST_DB'), reason="MYSQL_TEST_DB not set")
+
+
+@pytest.fixture
+def test_db():
+    import mysql.connector
+    conn = mysql.connector.connect(
+        host=os.getenv('MYSQL_TEST_HOST', '127.0.0.1'),
+        port=int(os.getenv('MYSQL_TEST_PORT', '3306')),
+        user=os.getenv('MYSQL_TEST_USER', 'root'),
+        password=os.getenv('MYSQL_TEST_PASSWORD', ''),
+        database=os.getenv('MYSQL_TEST_DB'),
+    )
+    cursor = conn.cursor()
+    cursor.execute("SHOW TABLES")
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE `{table}`")
+    yield conn
+    conn.close()
+
+
+def seed(conn, rows=2000):
+    start = datetime.datetime(2025, 1, 1)
+    cursor = conn.cursor()
+    for n in range(rows):
+        ts = start + datetime.timedelta(hours=n)
+        cursor.execute(
+            "INSERT INTO enquiries (name, email, message, ticket_no, expires_at, timestamp) VALUES (%s, %s, %s, %s, %s, %s)",
+            (f"Name {n}", f"buyer{n}@example.com", "Hello", f"ENQ-{n}", ts + datetime.timedelta(days=30), ts))
+        cursor.execute(
+            "INSERT INTO quotations (ticket_no, company, name, email, product, expires_at, timestamp) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (f"QUOTE-{n}", f"Company {n}", f"Name {n}", f"buyer{n}@example.com", f"Product {n % 12}",
+             ts + datetime.timedelta(days=7), ts))
+        cursor.execute(
+            "INSERT INTO loi_submissions (company_name, rep_name, email, product, submission_date, loi_data) VALUES (%s, %s, %s, %s, %s, %s)",
+            (f"Company {n}", f"Name {n}", f"buyer{n}@example.com", f"Product {n % 12}", ts, "{}"))
+    conn.commit()
+    for table in ('enquiries', 'quotations', 'loi_submissions'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+
+
+def chosen_index(conn, query):
+    import mysql.connector
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("EXPLAIN " + query)
+    except mysql.connector.Error:
+        # e.g. MATCH() before its FULLTEXT index exists
+        return None
+    return cursor.fetchall()[0]['key']
+
+
+@requires_mysql
+@pytest.mark.parametrize('version', sorted(EXPLAIN_CHECKS))
+def test_migration_explain_before_and_after(test_db, version):
+    previous = f"{int(version) - 1:04d}"
+    apply_migrations(test_db, target=previous)
+    seed(test_db)
+
+    before = {query: chosen_index(test_db, query) for query, _ in EXPLAIN_CHECKS[version]}
+    apply_migrations(test_db, target=version)
+
+    for query, index in EXPLAIN_CHECKS[version]:
+        assert before[query] != index, query
+        assert chosen_index(test_db, query) == index, query
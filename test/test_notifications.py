@@ -0,0 +1,18 @@
+import app  # noqa: F401  (compiles the templates via notifications.init_app)
+from notifications import contact_notification, quote_notification
+
+
+def test_html_variant_is_escaped_and_text_variant_is_not():
+    rendered = contact_notification('Jens <script>', 'buyer@example.com', 'Price & terms?')
+    assert 'Jens &lt;script&gt;' in rendered['html_body']
+    assert 'Price &amp; terms?' in rendered['html_body']
+    assert '- Name: Jens <script>' in rendered['text_body']
+    assert '- Message: Price & terms?' in rendered['text_body']
+
+
+def test_missing_fields_render_as_na_in_both_variants():
+    rendered = quote_notification('QUOTE-20250501-AB123', {'companyName': 'Makedonia'})
+    assert rendered['subject'] == 'New Quote Request - Ticket #QUOTE-20250501-AB123'
+    assert '<tr><td>Bank SWIFT Code</td><td>N/A</td></tr>' in rendered['html_body']
+    assert '- Bank SWIFT Code: N/A' in rendered['text_body']
+    assert '- Company Name: Makedonia' in rendered['text_body']
@@ -0,0 +1,153 @@
+import datetime
+
+import pytest
+
+import outbox
+from breaker import CircuitOpenError
+from mailer import TRANSPORT_NOTIFICATION
+
+
+def test_backoff_doubles_up_to_cap():
+    delays = [outbox.backoff_delay(n) for n in range(1, 20)]
+    assert delays[0] == outbox.OUTBOX_BACKOFF_BASE
+    assert delays[1] == outbox.OUTBOX_BACKOFF_BASE * 2
+    assert max(delays) == outbox.OUTBOX_BACKOFF_MAX
+
+
+def test_build_message_has_both_parts_and_reply_to():
+    row = {
+        'transport': TRANSPORT_NOTIFICATION,
+        'to_email': 'test@roodan.ae',
+        'reply_to': 'buyer@example.com',
+        'subject': 'New Quote Request',
+        'text_body': 'plain',
+        'html_body': '<p>html</p>',
+    }
+    msg = outbox.build_message(row)
+    assert msg['Reply-To'] == 'buyer@example.com'
+    assert [part.get_content_type() for part in msg.get_payload()] == ['text/plain', 'text/html']
+
+
+def test_open_breaker_defers_without_spending_an_attempt(sqlite_storage, monkeypatch):
+    sqlite_storage.insert('enquiries', [{'name': 'Buyer', 'email': 'buyer@example.com', 'message': 'hi',
+                                         'ticket_no': 'ENQ-20250501-00001',
+                                         'expires_at': datetime.datetime(2100, 1, 1)}],
+                          {'transport': TRANSPORT_NOTIFICATION, 'to_email': 'test@roodan.ae',
+                           'subject': 'New enquiry'})
+
+    class DownMailer:
+        def send_many(self, messages):
+            return [CircuitOpenError('mail:notification', 30)] * len(messages)
+
+    monkeypatch.setattr(outbox, 'get_mailer', lambda transport: DownMailer())
+    assert outbox.process_batch() == 1
+
+    conn = sqlite_storage.connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM email_outbox")
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    assert (row['status'], row['attempts']) == ('pending', 0)
+    retry_in = (row['next_attempt_at'] - datetime.datetime.now()).total_seconds()
+    assert 20 < retry_in <= 30
+
+
+def count(store, table):
+    conn = store.connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_loi_without_an_email_is_recorded_without_a_confirmation(sqlite_storage):
+    from app import app
+
+    response = app.test_client().post('/api/loi-submission', json={'companyName': 'Makedonia',
+                                                                   'productName': 'Urea'})
+    assert response.status_code == 200
+    assert count(sqlite_storage, 'loi_submissions') == 1
+    assert count(sqlite_storage, 'email_outbox') == 0
+
+
+NOTIFICATION = {'transport': TRANSPORT_NOTIFICATION, 'to_email': 'test@roodan.ae', 'subject': 'New enquiry',
+                'text_body': 'plain'}
+
+
+def enquiry(ticket_no='ENQ-20250501-00001'):
+    return {'name': 'Buyer', 'email': 'buyer@example.com', 'message': 'hi', 'ticket_no': ticket_no,
+            'expires_at': datetime.datetime(2100, 1, 1)}
+
+
+def outbox_row(store):
+    conn = store.connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM email_outbox")
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+class Mailer:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    def send_many(self, messages):
+        self.sent.extend(messages)
+        return [self.error] * len(messages)
+
+
+def test_delivered_message_is_marked_sent(sqlite_storage, monkeypatch):
+    sqlite_storage.insert('enquiries', [enquiry()], NOTIFICATION)
+    mailer = Mailer()
+    monkeypatch.setattr(outbox, 'get_mailer', lambda transport: mailer)
+
+    assert outbox.process_batch() == 1
+    row = outbox_row(sqlite_storage)
+    assert (row['status'], row['attempts'], row['last_error']) == ('sent', 1, None)
+    assert row['sent_at'] is not None
+    assert [msg['To'] for msg in mailer.sent] == ['test@roodan.ae']
+    assert outbox.process_batch() == 0
+
+
+def test_failed_delivery_is_retried_with_backoff(sqlite_storage, monkeypatch):
+    sqlite_storage.insert('enquiries', [enquiry()], NOTIFICATION)
+    monkeypatch.setattr(outbox, 'get_mailer', lambda transport: Mailer(OSError("connection reset")))
+
+    assert outbox.process_batch() == 1
+    row = outbox_row(sqlite_storage)
+    assert (row['status'], row['attempts'], row['last_error']) == ('pending', 1, 'connection reset')
+    retry_in = (row['next_attempt_at'] - datetime.datetime.now()).total_seconds()
+    assert outbox.OUTBOX_BACKOFF_BASE - 10 < retry_in <= outbox.OUTBOX_BACKOFF_BASE
+    assert outbox.process_batch() == 0  # not due yet
+
+
+def test_message_is_dead_lettered_after_the_last_attempt(sqlite_storage, monkeypatch):
+    sqlite_storage.insert('enquiries', [enquiry()], NOTIFICATION)
+    monkeypatch.setattr(outbox, 'get_mailer', lambda transport: Mailer(OSError("mailbox unavailable")))
+    monkeypatch.setattr(outbox, 'OUTBOX_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(outbox, 'backoff_delay', lambda attempts: 0)
+
+    assert outbox.process_batch() == 1
+    assert outbox_row(sqlite_storage)['status'] == 'pending'
+    assert outbox.process_batch() == 1
+    row = outbox_row(sqlite_storage)
+    assert (row['status'], row['attempts']) == ('dead', 2)
+    assert outbox.process_batch() == 0
+
+
+def test_rows_and_email_commit_together(sqlite_storage):
+    # The duplicate ticket number fails the insert: no email is queued
+    with pytest.raises(Exception):
+        sqlite_storage.insert('enquiries', [enquiry(), enquiry()], NOTIFICATION)
+    # The email cannot be queued (to_email is NOT NULL): the rows are rolled back
+    with pytest.raises(Exception):
+        sqlite_storage.insert('enquiries', [enquiry()], dict(NOTIFICATION, to_email=None))
+    assert count(sqlite_storage, 'enquiries') == 0
+    assert count(sqlite_storage, 'email_outbox') == 0
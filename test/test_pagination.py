@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from pagination import encode_cursor, decode_cursor, parse_page_args, fetch_page, PaginationError, MAX_PAGE_SIZE
+
+
+class RecordingCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = None
+
+    def execute(self, sql, params):
+        self.executed = (sql, params)
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_cursor_round_trip():
+    ts = datetime.datetime(2025, 5, 1, 12, 30, 5)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+
+
+def test_bad_cursor_and_limit_are_rejected():
+    with pytest.raises(PaginationError):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(PaginationError):
+        parse_page_args({'limit': 'ten'})
+    assert parse_page_args({'limit': '100000'})['limit'] == MAX_PAGE_SIZE
+
+
+def test_fetch_page_seeks_past_cursor_and_returns_next_cursor():
+    ts = datetime.datetime(2025, 5, 1)
+    rows = [{'id': n, 'timestamp': ts} for n in (9, 8, 7)]
+    cursor = RecordingCursor(rows)
+    page = parse_page_args({'limit': '2', 'cursor': encode_cursor(ts, 10), 'from': '2025-01-01'})
+
+    result = fetch_page(cursor, 'enquiries', 'timestamp', page)
+
+    sql, params = cursor.executed
+    assert "timestamp < %s OR (timestamp = %s AND id < %s)" in sql
+    assert "OFFSET" not in sql
+    assert params[-1] == 3  # limit + 1 probe row
+    assert [row['id'] for row in result['items']] == [9, 8]
+    assert decode_cursor(result['next_cursor']) == (ts, 8)
+
+
+def test_last_page_has_no_next_cursor():
+    cursor = RecordingCursor([{'id': 1, 'timestamp': datetime.datetime(2025, 5, 1)}])
+    result = fetch_page(cursor, 'enquiries', 'timestamp', parse_page_args({}))
+    assert result['next_cursor'] is None
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+import outbox
+import ratelimit
+import retention
+import storage
+from ratelimit import FileBackend, MemoryBackend, rate_limited, take
+from sqlite_storage import SQLiteStorage
+
+
+def test_bucket_refills_at_its_rate():
+    allowed, tokens, _ = take(1, 0, rate=1, burst=5, cost=1, now=0)
+    assert allowed and tokens == 0
+    allowed, tokens, retry_after = take(0, 0, rate=0.5, burst=5, cost=1, now=1)
+    assert not allowed and retry_after == 1
+    assert take(0, 0, rate=1, burst=5, cost=1, now=100)[1] == 4
+
+
+def test_cost_above_the_burst_is_charged_in_full():
+    allowed, tokens, _ = take(5, 0, rate=1, burst=5, cost=20, now=0)
+    assert allowed and tokens == -15
+    allowed, tokens, retry_after = take(tokens, 0, rate=1, burst=5, cost=1, now=10)
+    assert not allowed and tokens == -5 and retry_after == 6
+
+
+def test_file_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'buckets.bin')
+    first, second = FileBackend(path, slots=64), FileBackend(path, slots=64)
+    assert first.hit('ip:1', rate=0.001, burst=2) == (True, 0)
+    assert second.hit('ip:1', rate=0.001, burst=2) == (True, 0)
+    allowed, retry_after = first.hit('ip:1', rate=0.001, burst=2)
+    assert not allowed and retry_after > 0
+    assert second.hit('ip:2', rate=0.001, burst=2)[0]
+
+
+def make_client(monkeypatch, gate=None):
+    monkeypatch.setattr(ratelimit, 'backend', MemoryBackend())
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_IP_BURST', 2)
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_IP_PER_MINUTE', 1)
+    monkeypatch.setattr(ratelimit, '_submission_slots', threading.BoundedSemaphore(1))
+    app = Flask(__name__)
+
+    @app.route('/api/contact', methods=['POST'])
+    @rate_limited()
+    def contact():
+        if gate:
+            gate.wait(5)
+        return jsonify({"message": "ok"}), 200
+
+    return app.test_client()
+
+
+def test_per_ip_limit_returns_429_with_retry_after(monkeypatch):
+    client = make_client(monkeypatch)
+    assert client.post('/api/contact').status_code == 200
+    assert client.post('/api/contact').status_code == 200
+    limited = client.post('/api/contact')
+    assert limited.status_code == 429
+    assert int(limited.headers['Retry-After']) >= 1
+    other = client.post('/api/contact', environ_base={'REMOTE_ADDR': '10.0.0.9'})
+    assert other.status_code == 200
+
+
+def test_requests_over_the_concurrency_cap_are_shed(monkeypatch):
+    gate = threading.Event()
+    client = make_client(monkeypatch, gate)
+    slow = threading.Thread(target=client.post, args=('/api/contact',))
+    slow.start()
+    try:
+        while ratelimit._submission_slots._value:
+            time.sleep(0.01)
+        shed = client.post('/api/contact', environ_base={'REMOTE_ADDR': '10.0.0.9'})
+        assert shed.status_code == 503
+    finally:
+        gate.set()
+        slow.join()
+
+
+@pytest.mark.parametrize('shape', ['list', 'items'])
+def test_batches_are_charged_per_record(shape, tmp_path, monkeypatch):
+    from app import app
+
+    store = SQLiteStorage(str(tmp_path / 'roodan.db'))
+    store.initialize()
+    monkeypatch.setattr(storage, '_storage', store)
+    monkeypatch.setattr(outbox, 'OUTBOX_WORKER', 'off')
+    monkeypatch.setattr(retention, 'RETENTION_SCHEDULER', 'off')
+    monkeypatch.setattr(ratelimit, 'backend', MemoryBackend())
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_IP_BURST', 5)
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_IP_PER_MINUTE', 1)
+
+    records = [{'name': f"Buyer {n}", 'email': 'buyer@example.com', 'message': 'hi'} for n in range(10)]
+    payload = records if shape == 'list' else {'items': records}
+    client = app.test_client()
+    assert client.post('/api/contact/batch', json=payload).status_code == 200
+    limited = client.post('/api/contact/batch', json=payload)
+    assert limited.status_code == 429
+    # Ten records from a burst of five: five tokens of debt plus the five the next batch needs
+    assert int(limited.headers['Retry-After']) > 500
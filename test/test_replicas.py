@@ -0,0 +1,112 @@
+"""Read routing against two databases: a primary and a replica that trails it"""
+import pytest
+
+import replicas
+from db_pool import replica_lag
+from replicas import Replica, ReplicaSet, READ_CONSISTENCY_HEADER
+from sqlite_storage import SQLiteStorage
+
+
+def enquiry(name):
+    return {'name': name, 'email': 'buyer@example.com', 'message': 'Urea prices please',
+            'ticket_no': None, 'expires_at': None}
+
+
+@pytest.fixture
+def databases(sqlite_storage, tmp_path):
+    primary = sqlite_storage
+    replica = SQLiteStorage(str(tmp_path / 'replica.db'))
+    replica.initialize()
+    # Not replicated, so each copy's rows show which one served a read
+    primary.insert('enquiries', [enquiry('On the primary')])
+    replica.insert('enquiries', [enquiry('On the replica')])
+
+    lag = {'seconds': 0}
+    primary.replicas = ReplicaSet([Replica('replica', replica.connection, lambda conn: lag['seconds'],
+                                           max_lag=5, check_interval=0)])
+    return primary, replica, lag
+
+
+def served_by(client, **headers):
+    return [row['name'] for row in client.get('/admin/api/enquiries', headers=headers).get_json()['items']]
+
+
+def test_admin_reads_go_to_a_replica_within_the_lag_threshold(databases, client):
+    primary, replica, lag = databases
+    assert served_by(client) == ['On the replica']
+    assert client.get('/admin/api/search?q=replica').get_json()['results'][0]['name'] == 'On the replica'
+
+    lag['seconds'] = 30
+    assert served_by(client) == ['On the primary']
+    lag['seconds'] = None  # replication stopped
+    assert served_by(client) == ['On the primary']
+
+
+def test_client_can_ask_for_the_primary(databases, client):
+    assert served_by(client, **{READ_CONSISTENCY_HEADER: 'primary'}) == ['On the primary']
+
+
+def test_submitter_reads_its_own_write(databases, client):
+    response = client.post('/api/contact', json={'name': 'Just submitted', 'email': 'buyer@example.com',
+                                                 'message': 'Sulphur prices please'})
+    assert response.status_code == 200
+    assert replicas.READ_YOUR_WRITES_COOKIE in response.headers['Set-Cookie']
+    assert served_by(client) == ['Just submitted', 'On the primary']
+
+    client.delete_cookie(replicas.READ_YOUR_WRITES_COOKIE)
+    assert served_by(client) == ['On the replica']
+
+
+def test_unreachable_replica_falls_back_to_the_primary(databases, client):
+    primary, replica, lag = databases
+
+    def down():
+        raise OSError("connection refused")
+
+    primary.replicas = ReplicaSet([Replica('replica', down, lambda conn: 0, check_interval=0)])
+    assert served_by(client) == ['On the primary']
+    [snapshot] = client.get('/admin/api/pool-stats').get_json()['replicas']
+    assert snapshot['usable'] is False and snapshot['last_error'] == 'connection refused'
+
+
+def test_replicas_are_taken_in_turn_skipping_lagging_ones():
+    class Connection:
+        def close(self):
+            pass
+
+    def replica(name, lag):
+        return Replica(name, Connection, lambda conn: lag, max_lag=5, check_interval=0)
+
+    choices = ReplicaSet([replica('a', 1), replica('b', 60), replica('c', 2)])
+    assert [choices.choose().name for _ in range(4)] == ['a', 'c', 'c', 'a']
+    assert ReplicaSet().choose() is None
+
+
+def test_needs_primary():
+    assert replicas.needs_primary('primary', None)
+    assert replicas.needs_primary(None, '2000', now=1000)
+    assert not replicas.needs_primary(None, '1000', now=2000)
+    assert not replicas.needs_primary(None, 'garbage')
+
+
+def test_mysql_replica_lag():
+    class Cursor:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def execute(self, sql):
+            pass
+
+        def fetchall(self):
+            return self.rows
+
+    class Connection:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def cursor(self, dictionary=False):
+            return Cursor(self.rows)
+
+    assert replica_lag(Connection([{'Seconds_Behind_Source': 3}])) == 3
+    assert replica_lag(Connection([{'Seconds_Behind_Master': None}])) is None
+    assert replica_lag(Connection([])) is None
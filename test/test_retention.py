@@ -0,0 +1,114 @@
+import datetime
+import threading
+
+import retention
+from mysql_storage import parse_bound, partition_plan
+from pagination import parse_page_args
+
+
+def test_partition_plan_drops_expired_months_and_adds_ahead():
+    bounds = {
+        'p_before': datetime.datetime(2000, 1, 1),
+        'p202411': datetime.datetime(2024, 12, 1),
+        'p202412': datetime.datetime(2025, 1, 1),
+        'p_future': None,
+    }
+    drop, add = partition_plan(bounds, datetime.datetime(2024, 12, 1), datetime.datetime(2025, 2, 1))
+    assert drop == ['p_before', 'p202411']
+    assert add == [datetime.datetime(2025, 1, 1), datetime.datetime(2025, 2, 1)]
+
+
+def test_partition_plan_for_a_new_archive():
+    drop, add = partition_plan({'p_before': datetime.datetime(2000, 1, 1), 'p_future': None},
+                               datetime.datetime(2024, 11, 1), datetime.datetime(2025, 1, 15))
+    assert drop == ['p_before']
+    assert add == [datetime.datetime(2024, 11, 1), datetime.datetime(2024, 12, 1), datetime.datetime(2025, 1, 1)]
+
+
+def test_parse_bound():
+    assert parse_bound("'2026-07-01 00:00:00'") == datetime.datetime(2026, 7, 1)
+    assert parse_bound('MAXVALUE') is None
+
+
+def test_months_before():
+    assert retention.months_before(datetime.datetime(2026, 2, 14), 24) == datetime.datetime(2024, 2, 1)
+    assert retention.months_before(datetime.datetime(2026, 11, 30), -2) == datetime.datetime(2027, 1, 1)
+
+
+def test_run_archives_old_submissions_and_records_every_table(sqlite_storage):
+    old = datetime.datetime.now() - datetime.timedelta(days=retention.LOI_ARCHIVE_AFTER_DAYS + 1)
+    for submitted in (old, datetime.datetime.now()):
+        sqlite_storage.insert('loi_submissions', [{
+            'company_name': 'Company', 'rep_name': 'Rep', 'email': 'rep@example.com', 'phone': None,
+            'product': 'Urea', 'quantity': '500 MT', 'submission_date': submitted, 'loi_data': '{}'}])
+
+    results = {result['table']: result['rows_purged'] for result in retention.run_retention()}
+    assert results['loi_submissions'] == 1
+    assert results['loi_submissions_archive'] == 0
+    assert len(sqlite_storage.list_page('loi_submissions', 'submission_date', parse_page_args({}))['items']) == 1
+    assert len(sqlite_storage.archive_page('loi_submissions', parse_page_args({}))['items']) == 1
+    assert {run['table_name'] for run in sqlite_storage.recent_retention_runs()} == set(results)
+
+
+def enquiries(store, *expiries):
+    store.insert('enquiries', [{'name': f"Buyer {n}", 'email': 'buyer@example.com', 'message': 'Urea prices please',
+                                'ticket_no': f"ENQ-20260101-{n:05d}", 'expires_at': expires_at}
+                               for n, expires_at in enumerate(expiries)])
+
+
+def remaining(store, table):
+    return [row['name'] for row in store.list_page(table, 'timestamp', parse_page_args({}))['items']]
+
+
+def test_purge_takes_only_rows_expired_before_the_cutoff(sqlite_storage):
+    now = datetime.datetime(2026, 3, 1, 12, 0)
+    second = datetime.timedelta(seconds=1)
+    enquiries(sqlite_storage, now - second, now, now + second, None)
+
+    assert retention.purge_expired('enquiries', now=now) == 1
+    assert sorted(remaining(sqlite_storage, 'enquiries')) == ['Buyer 1', 'Buyer 2', 'Buyer 3']
+
+
+def test_purge_works_in_batches_of_the_configured_size(sqlite_storage, monkeypatch):
+    monkeypatch.setattr(retention, 'RETENTION_BATCH_PAUSE', 0)
+    batches = []
+    purge_batch = sqlite_storage.purge_batch
+
+    def counted(table, column, now, limit, **kwargs):
+        deleted = purge_batch(table, column, now, limit, **kwargs)
+        batches.append((limit, deleted))
+        return deleted
+
+    monkeypatch.setattr(sqlite_storage, 'purge_batch', counted)
+    enquiries(sqlite_storage, *[datetime.datetime(2026, 1, 1)] * 5)
+
+    assert retention.purge_expired('enquiries', batch_size=2, now=datetime.datetime(2026, 3, 1)) == 5
+    assert batches == [(2, 2), (2, 2), (2, 1)]
+    assert remaining(sqlite_storage, 'enquiries') == []
+
+
+def test_a_second_run_is_skipped_while_one_holds_the_lock(sqlite_storage, monkeypatch):
+    enquiries(sqlite_storage, datetime.datetime(2000, 1, 1))
+    started, finish = threading.Event(), threading.Event()
+    purge_batch = sqlite_storage.purge_batch
+
+    def slow(*args, **kwargs):
+        started.set()
+        finish.wait(5)
+        return purge_batch(*args, **kwargs)
+
+    monkeypatch.setattr(sqlite_storage, 'purge_batch', slow)
+    first = []
+    runner = threading.Thread(target=lambda: first.extend(retention.run_retention()))
+    runner.start()
+    try:
+        assert started.wait(5)
+        assert retention.run_retention() == []
+    finally:
+        finish.set()
+        runner.join(5)
+
+    assert {result['table']: result['rows_purged'] for result in first}['enquiries'] == 1
+    # The lock is free again once the first run ends
+    monkeypatch.setattr(sqlite_storage, 'purge_batch', purge_batch)
+    assert retention.run_retention() != []
@@ -0,0 +1,37 @@
+import pytest
+
+from search import boolean_query, build_search
+
+
+def test_boolean_query_strips_operators_and_prefixes_words():
+    assert boolean_query('urea  jebel') == '+urea* +jebel*'
+    assert boolean_query('-"olive" +(oil)*') == '+olive* +oil*'
+    assert boolean_query('++--') == ''
+
+
+def test_ticket_numbers_use_prefix_match_on_ticket_tables_only():
+    sql, params = build_search('quote-20250501', ['quotations', 'loi_submissions'], 10)
+    assert 'ticket_no LIKE %s' in sql
+    assert 'loi_submissions' not in sql
+    assert params[0] == 'QUOTE-20250501%'
+
+
+def test_email_uses_exact_lookup_and_words_use_fulltext():
+    sql, params = build_search('buyer@example.com', ['enquiries'], 10)
+    assert 'email = %s' in sql and 'MATCH' not in sql
+
+    sql, params = build_search('makedonia urea', ['quotations', 'enquiries'], 10)
+    assert sql.count('IN BOOLEAN MODE') == 4
+    assert sql.count('UNION ALL') == 1
+    assert params[0] == '+makedonia* +urea*'
+
+
+@pytest.mark.parametrize('limit', ['0', '-5', 'ten'])
+def test_search_rejects_a_limit_below_one(client, limit):
+    response = client.get(f"/admin/api/search?q=urea&limit={limit}")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid limit"}
+
+
+def test_search_caps_the_limit(client):
+    assert client.get('/admin/api/search?q=urea&limit=100000').get_json() == {"results": []}
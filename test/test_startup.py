@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+# How long the imports take is tracked by benchmarks/startup.py, not here.
+# Run in a fresh interpreter so the imports are really the first ones. Every
+# way the app opens a database or mail connection is replaced with one that
+# records the call and fails.
+IMPORT_APP = '''
+import json, smtplib, socket, sqlite3, sys
+import mysql.connector
+
+calls = []
+
+def refuse(name):
+    def connect(*args, **kwargs):
+        calls.append(name)
+        raise OSError(f"{name} called at import time")
+    return connect
+
+mysql.connector.connect = refuse('mysql.connector.connect')
+sqlite3.connect = refuse('sqlite3.connect')
+smtplib.SMTP.connect = refuse('smtplib.SMTP.connect')
+socket.create_connection = refuse('socket.create_connection')
+
+import app, asgi, db_pool, storage
+print(json.dumps({'calls': calls, 'pool': db_pool._pool is not None, 'storage': storage._storage is not None}))
+'''
+
+
+@pytest.mark.parametrize('backend', ['mysql', 'sqlite'])
+def test_app_import_touches_no_database_or_mail_server(backend):
+    env = dict(os.environ, AUTO_MIGRATE='', STORAGE_BACKEND=backend)
+    result = subprocess.run([sys.executable, '-c', IMPORT_APP], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    # The pool and storage are created on first use, so neither exists yet
+    assert json.loads(result.stdout.splitlines()[-1]) == {'calls': [], 'pool': False, 'storage': False}
@@ -0,0 +1,48 @@
+import threading
+
+from stats import StatsCache
+
+
+def snapshot(total=0):
+    return {
+        'enquiries': {'total': total, 'today': 0, 'last_7_days': 0},
+        'quotations': {'total': 0, 'today': 0, 'last_7_days': 0, 'by_product': {}},
+        'loi_submissions': {'total': 0, 'today': 0, 'last_7_days': 0, 'by_product': {}},
+    }
+
+
+def test_cached_snapshot_is_served_without_recomputing():
+    calls = []
+    cache = StatsCache(ttl=60, compute=lambda: calls.append(1) or snapshot(5))
+    assert cache.get()['enquiries']['total'] == 5
+    assert cache.get()['enquiries']['total'] == 5
+    assert len(calls) == 1
+
+
+def test_bump_counts_new_rows_per_product():
+    cache = StatsCache(ttl=60, compute=snapshot)
+    before = cache.get()
+    cache.bump('quotations', 'Urea')
+    cache.bump('quotations', 'Urea')
+    after = cache.get()
+    assert after['quotations']['total'] == 2
+    assert after['quotations']['by_product']['Urea'] == {'total': 2, 'today': 2, 'last_7_days': 2}
+    # Snapshots already handed out are never mutated
+    assert before['quotations']['total'] == 0
+
+
+def test_stale_snapshot_is_refreshed_in_background():
+    refreshed = threading.Event()
+    totals = iter([1, 2])
+
+    def compute():
+        value = snapshot(next(totals))
+        if value['enquiries']['total'] == 2:
+            refreshed.set()
+        return value
+
+    cache = StatsCache(ttl=0, compute=compute)
+    assert cache.get()['enquiries']['total'] == 1
+    # The stale value is returned at once while the refresh runs
+    assert cache.get()['enquiries']['total'] == 1
+    assert refreshed.wait(2)
@@ -0,0 +1,211 @@
+"""Conformance tests: every storage backend must pass the same checks
+
+SQLite always runs; MySQL runs against MYSQL_TEST_DB (dropped first) when set.
+"""
+import datetime
+import json
+import os
+
+import pytest
+
+from pagination import parse_page_args
+from sqlite_storage import SQLiteStorage
+
+NOTIFICATION = {'transport': 'notification', 'to_email': 'sales@roodan.ae', 'subject': 'New enquiry',
+                'text_body': 'plain', 'html_body': '<p>html</p>', 'reply_to': None}
+
+
+def mysql_storage():
+    if not os.getenv('MYSQL_TEST_DB'):
+        pytest.skip("MYSQL_TEST_DB not set")
+    import mysql.connector
+    from db_pool import ConnectionPool
+    from mysql_storage import MySQLStorage
+
+    def connect():
+        return mysql.connector.connect(
+            host=os.getenv('MYSQL_TEST_HOST', '127.0.0.1'),
+            port=int(os.getenv('MYSQL_TEST_PORT', '3306')),
+            user=os.getenv('MYSQL_TEST_USER', 'root'),
+            password=os.getenv('MYSQL_TEST_PASSWORD', ''),
+            database=os.getenv('MYSQL_TEST_DB'),
+            autocommit=False,
+        )
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SHOW TABLES")
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE `{table}`")
+    conn.close()
+    return MySQLStorage(connect=connect, pool=ConnectionPool(connect=connect))
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def storage(request, tmp_path):
+    store = SQLiteStorage(str(tmp_path / 'roodan.db')) if request.param == 'sqlite' else mysql_storage()
+    store.initialize()
+    return store
+
+
+def enquiry(n, expires_at=None):
+    return {'name': f"Name {n}", 'email': f"buyer{n}@example.com", 'message': "Urea prices please",
+            'ticket_no': f"ENQ-20250501-{n:05d}",
+            'expires_at': expires_at or datetime.datetime(2100, 1, 1)}
+
+
+def quotation(n, product='Urea'):
+    return {'ticket_no': f"QUOTE-20250501-{n:05d}", 'company': f"Makedonia Trading {n}", 'name': f"Name {n}",
+            'email': f"buyer{n}@example.com", 'phone': None, 'product': product, 'quantity': '500 MT',
+            'delivery': 'Jebel Ali', 'message': None, 'expires_at': datetime.datetime(2100, 1, 1)}
+
+
+def test_login_uses_the_seeded_admin(storage):
+    assert storage.check_login('admin', 'password123')
+    assert not storage.check_login('admin', 'wrong')
+
+
+def test_list_pages_are_newest_first_and_seek_past_the_cursor(storage):
+    storage.insert('enquiries', [enquiry(n) for n in range(5)])
+
+    first = storage.list_page('enquiries', 'timestamp', parse_page_args({'limit': '3'}))
+    assert [row['ticket_no'] for row in first['items']] == [enquiry(n)['ticket_no'] for n in (4, 3, 2)]
+    assert isinstance(first['items'][0]['timestamp'], datetime.datetime)
+
+    second = storage.list_page('enquiries', 'timestamp',
+                               parse_page_args({'limit': '3', 'cursor': first['next_cursor']}))
+    assert [row['ticket_no'] for row in second['items']] == [enquiry(n)['ticket_no'] for n in (1, 0)]
+    assert second['next_cursor'] is None
+
+
+def test_notification_is_queued_and_claimed_once(storage):
+    storage.insert('enquiries', [enquiry(1)], NOTIFICATION)
+    now = datetime.datetime.now() + datetime.timedelta(seconds=1)
+
+    with storage.claim_outbox(10, now) as (cursor, rows):
+        assert [row['to_email'] for row in rows] == ['sales@roodan.ae']
+        cursor.execute("UPDATE email_outbox SET status = 'sent', sent_at = %s WHERE id = %s",
+                       (now, rows[0]['id']))
+    with storage.claim_outbox(10, now) as (cursor, rows):
+        assert rows == []
+
+
+def test_failed_insert_commits_nothing(storage):
+    duplicate = [enquiry(1), enquiry(1)]
+    with pytest.raises(Exception):
+        storage.insert('enquiries', duplicate, NOTIFICATION)
+
+    assert storage.list_page('enquiries', 'timestamp', parse_page_args({}))['items'] == []
+    with storage.claim_outbox(10, datetime.datetime.now() + datetime.timedelta(days=1)) as (cursor, rows):
+        assert rows == []
+
+
+def test_loi_documents_embed_the_payload_and_filter_on_it(storage):
+    submitted = datetime.datetime(2025, 5, 1, 9, 30, 15)
+    for n, swift in enumerate(['NBADAEAA', 'EBILAEAD']):
+        storage.insert('loi_submissions', [{
+            'company_name': f"Company {n}", 'rep_name': 'Rep', 'email': 'rep@example.com', 'phone': None,
+            'product': 'Urea', 'quantity': '500 MT', 'submission_date': submitted,
+            'loi_data': json.dumps({'bankSwiftCode': swift, 'deliveryPort': 'Jebel Ali'}),
+        }])
+
+    page = storage.loi_page(parse_page_args({}), {'bank_swift_code': 'EBILAEAD'})
+    documents = [json.loads(item) for item in page['items']]
+    assert len(documents) == 1
+    assert documents[0]['company_name'] == 'Company 1'
+    assert documents[0]['submission_date'] == 'Thu, 01 May 2025 09:30:15 GMT'
+    assert documents[0]['loi_data'] == {'bankSwiftCode': 'EBILAEAD', 'deliveryPort': 'Jebel Ali'}
+
+
+def test_search_by_ticket_email_and_words(storage):
+    storage.insert('quotations', [quotation(1), quotation(2, product='Sulphur')])
+    storage.insert('enquiries', [enquiry(3)])
+
+    rows = storage.search('quote-20250501-0000', ['quotations', 'enquiries'], 10)
+    assert sorted(row['ticket_no'] for row in rows) == ['QUOTE-20250501-00001', 'QUOTE-20250501-00002']
+
+    rows = storage.search('buyer3@example.com', ['quotations', 'enquiries'], 10)
+    assert [(row['resource'], row['ticket_no']) for row in rows] == [('enquiries', 'ENQ-20250501-00003')]
+
+    rows = storage.search('makedonia sulph', ['quotations', 'enquiries'], 10)
+    assert [row['ticket_no'] for row in rows] == ['QUOTE-20250501-00002']
+    assert isinstance(rows[0]['score'], float)
+
+
+def test_purge_deletes_in_batches_and_leaves_tombstones(storage):
+    expired = datetime.datetime(2020, 1, 1)
+    storage.insert('enquiries', [enquiry(n, expires_at=expired) for n in range(3)] + [enquiry(9)])
+    now = datetime.datetime.now()
+
+    assert storage.purge_batch('enquiries', 'expires_at', now, 2, tombstones=True) == 2
+    assert storage.purge_batch('enquiries', 'expires_at', now, 2, tombstones=True) == 1
+    assert storage.purge_batch('enquiries', 'expires_at', now, 2, tombstones=True) == 0
+
+    remaining = storage.list_page('enquiries', 'timestamp', parse_page_args({}))['items']
+    assert [row['ticket_no'] for row in remaining] == [enquiry(9)['ticket_no']]
+    conn = storage.connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM deleted_rows WHERE resource = %s", ('enquiries',))
+        assert cursor.fetchone()[0] == 3
+    finally:
+        conn.close()
+
+
+def test_archived_rows_move_to_the_archive_table_and_expire_there(storage):
+    expired = datetime.datetime(2020, 1, 1)
+    storage.insert('enquiries', [enquiry(n, expires_at=expired) for n in range(3)] + [enquiry(9)])
+
+    assert storage.purge_batch('enquiries', 'expires_at', datetime.datetime.now(), 10,
+                               tombstones=True, archive=True) == 3
+    assert len(storage.list_page('enquiries', 'timestamp', parse_page_args({}))['items']) == 1
+    archived = storage.archive_page('enquiries', parse_page_args({}))['items']
+    assert sorted(row['ticket_no'] for row in archived) == [enquiry(n)['ticket_no'] for n in range(3)]
+    filtered = storage.archive_page('enquiries', parse_page_args({}), {'email': 'buyer1@example.com'})
+    assert [row['ticket_no'] for row in filtered['items']] == [enquiry(1)['ticket_no']]
+
+    # Nothing archived this month is removed until the month is past
+    now = datetime.datetime.now()
+    month = datetime.datetime(now.year, now.month, 1)
+    assert storage.maintain_archive('enquiries', month, now + datetime.timedelta(days=62)) == 0
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    assert storage.maintain_archive('enquiries', next_month, now + datetime.timedelta(days=62)) == 3
+    assert storage.archive_page('enquiries', parse_page_args({}))['items'] == []
+
+
+def test_archived_loi_keeps_its_payload(storage):
+    storage.insert('loi_submissions', [{
+        'company_name': 'Company', 'rep_name': 'Rep', 'email': 'rep@example.com', 'phone': None,
+        'product': 'Urea', 'quantity': '500 MT', 'submission_date': datetime.datetime(2025, 5, 1),
+        'loi_data': json.dumps({'bankSwiftCode': 'NBADAEAA'}),
+    }])
+    assert storage.purge_batch('loi_submissions', 'submission_date', datetime.datetime(2025, 6, 1), 10,
+                               archive=True) == 1
+    [row] = storage.archive_page('loi_submissions', parse_page_args({}))['items']
+    assert row['loi_data'] == {'bankSwiftCode': 'NBADAEAA'}
+    assert row['company_name'] == 'Company'
+
+
+def test_stats_rows_give_totals_and_per_product_counts(storage):
+    storage.insert('quotations', [quotation(1), quotation(2), quotation(3, product='Sulphur')])
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    rows = {(resource, product): (int(total), int(day or 0))
+            for resource, product, total, day, week in storage.stats_rows(today, today - datetime.timedelta(days=6))}
+    assert rows[('quotations', None)] == (3, 3)
+    assert rows[('quotations', 'Urea')] == (2, 2)
+    assert rows[('quotations', 'Sulphur')] == (1, 1)
+    assert rows[('enquiries', None)] == (0, 0)
+
+
+def test_exclusive_lock_is_held_by_one_caller(storage):
+    with storage.exclusive('roodan_test') as first:
+        with storage.exclusive('roodan_test') as second:
+            assert first and not second
+    with storage.exclusive('roodan_test') as again:
+        assert again
+
+
+def test_retention_runs_are_listed_newest_first(storage):
+    storage.record_retention_run('enquiries', datetime.datetime(2025, 5, 1), 3, 12)
+    storage.record_retention_run('quotations', datetime.datetime(2025, 5, 1), 0, 4)
+    assert [run['table_name'] for run in storage.recent_retention_runs()] == ['quotations', 'enquiries']